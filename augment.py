@@ -0,0 +1,197 @@
+# augment.py
+"""
+Synthetic labeled landmark samples generated from recorded ones.
+
+Recording is slow (data_collection runs at human speed with breaks), so
+training can instead draw from an endless stream of randomly perturbed copies
+of the recorded hands. Every batch is produced with a few array operations on
+(B, 21, 3) arrays, relative to each hand's wrist:
+
+  - mirror:      x -> -x, i.e. the same pose made by the other hand. Finger
+                 identity and depth order are unchanged, so are the labels.
+  - depth flip:  z -> -z, the pose seen from the other side of the hand. The
+                 finger on top is now underneath: top_finger and bottom_finger
+                 are swapped. Off by default: the default feature vector (and
+                 every geometry group but geometry.Z_SIGNED_GROUPS) is
+                 identical for both sides, so flipped samples would only add
+                 contradicting labels. augment_features refuses it unless a
+                 z-signed group is among the extracted features.
+  - rotation:    about a random axis by up to max_rotation radians
+  - scale:       uniform factor in [1 - scale, 1 + scale]
+  - depth scale: z only, in [1 - depth_scale, 1 + depth_scale], as MediaPipe's
+                 depth estimate is its least reliable coordinate
+  - jitter:      Gaussian noise per coordinate, `jitter` times the hand size
+
+The first five are folded into one 3x3 matrix per sample, so a batch costs one
+gather, one matmul and one noise draw. The stream is reproducible for a given
+seed. Its batches are views of buffers reused for the next batch, so nothing
+is materialized beyond one batch; augment_features fills a preallocated
+feature matrix directly from it:
+
+    augmenter = Augmenter(max_rotation=0.3)
+    for points, labels in augmenter.stream(source_points, source_labels, seed=0):
+        ...                                   # (B, 21, 3), LABEL_COLUMNS arrays
+    X, labels = augment_features(source_points, source_labels, 1000000, seed=0)
+
+    python augment.py overlap_dataset --samples 1000000
+"""
+import numpy as np
+from feature_cache import LABEL_COLUMNS, find_sessions, read_session_arrays
+from feature_extraction import extract_features_batch, num_features
+from geometry import Z_SIGNED_GROUPS
+
+DEFAULT_BATCH_SIZE = 8192
+
+def load_source(data_dir="overlap_dataset", sessions=None):
+    """
+    (points (N, 21, 3), labels) of every session in data_dir (or the given
+    session paths), in the sample order of feature_cache.load_cached_dataset.
+    """
+    paths = list(sessions) if sessions is not None else find_sessions(data_dir)
+    arrays = [read_session_arrays(path) for path in paths]
+    if not arrays:
+        return np.empty((0, 21, 3)), {name: np.empty(0, dtype=np.int8) for name in LABEL_COLUMNS}
+    points = np.concatenate([points for points, _ in arrays])
+    labels = {name: np.concatenate([labels[name] for _, labels in arrays]) for name in LABEL_COLUMNS}
+    return points, labels
+
+def random_rotations(rng, n, max_angle):
+    """(n, 3, 3) rotations about uniformly random axes by angles uniform in [-max_angle, max_angle]."""
+    axes = rng.standard_normal((n, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    angles = rng.uniform(-max_angle, max_angle, n)
+    cos, sin = np.cos(angles), np.sin(angles)
+    # Rodrigues: R = cos I + sin [a]x + (1 - cos) a a^T
+    rotations = (1 - cos)[:, None, None] * axes[:, :, None] * axes[:, None, :]
+    rotations[:, [0, 1, 2], [0, 1, 2]] += cos[:, None]
+    x, y, z = (sin * axes[:, i] for i in range(3))
+    rotations[:, 0, 1] -= z
+    rotations[:, 0, 2] += y
+    rotations[:, 1, 0] += z
+    rotations[:, 1, 2] -= x
+    rotations[:, 2, 0] -= y
+    rotations[:, 2, 1] += x
+    return rotations
+
+class Augmenter:
+    """
+    Random perturbations of recorded hands; mirror and depth_flip are the
+    probabilities of applying each flip to a sample, the others the ranges
+    described above. All default to mild values that keep the labels valid;
+    depth_flip defaults to 0 (see above).
+    """
+    def __init__(self, max_rotation=np.radians(20), scale=0.15, depth_scale=0.3, jitter=0.01,
+                 mirror=0.5, depth_flip=0.0):
+        self.max_rotation = max_rotation
+        self.scale = scale
+        self.depth_scale = depth_scale
+        self.jitter = jitter
+        self.mirror = mirror
+        self.depth_flip = depth_flip
+
+    def transforms(self, rng, n):
+        """
+        (n, 3, 3) matrices applied to wrist-relative row vectors, and the (n,)
+        mask of depth-flipped samples whose labels must be swapped.
+        """
+        flips = np.ones((n, 3))
+        flips[rng.random(n) < self.mirror, 0] = -1.0
+        flipped = rng.random(n) < self.depth_flip
+        flips[flipped, 2] = -1.0
+        stretch = np.ones((n, 3))
+        stretch *= rng.uniform(1 - self.scale, 1 + self.scale, n)[:, None]
+        stretch[:, 2] *= rng.uniform(1 - self.depth_scale, 1 + self.depth_scale, n)
+        # p' = stretch * (R (flips * p)), as row vectors: p' = p @ (flips[:, None] * R^T * stretch).
+        matrices = random_rotations(rng, n, self.max_rotation).transpose(0, 2, 1)
+        matrices *= flips[:, :, None]
+        matrices *= stretch[:, None, :]
+        return matrices, flipped
+
+    def stream(self, points, labels, batch_size=DEFAULT_BATCH_SIZE, seed=None, limit=None):
+        """
+        Yield (points (B, 21, 3), labels) batches of augmented samples drawn
+        uniformly from the source hands, endlessly or until `limit` samples.
+        labels holds the LABEL_COLUMNS arrays for the batch. The yielded arrays
+        are overwritten by the next batch; copy them to keep them.
+        """
+        source = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 21, 3)
+        if not len(source):
+            return
+        source_labels = {name: np.asarray(labels[name]) for name in LABEL_COLUMNS}
+        wrists = source[:, :1].copy()
+        relative = source - wrists
+        # Jitter is relative to each hand's size, so near and far hands get the same noise.
+        sizes = np.sqrt((relative * relative).sum(axis=2)).max(axis=1)
+        rng = np.random.default_rng(seed)
+        if limit is not None:
+            batch_size = min(batch_size, limit)
+
+        gathered = np.empty((batch_size, 21, 3))
+        out = np.empty((batch_size, 21, 3))
+        noise = np.empty((batch_size, 21, 3))
+        batch_labels = {name: np.empty(batch_size, dtype=source_labels[name].dtype) for name in LABEL_COLUMNS}
+        produced = 0
+        while limit is None or produced < limit:
+            n = batch_size if limit is None else min(batch_size, limit - produced)
+            index = rng.integers(0, len(source), n)
+            matrices, flipped = self.transforms(rng, n)
+            relative.take(index, axis=0, out=gathered[:n])
+            np.matmul(gathered[:n], matrices, out=out[:n])
+            rng.standard_normal(out=noise[:n])
+            noise[:n] *= (self.jitter * sizes.take(index))[:, None, None]
+            out[:n] += noise[:n]
+            out[:n] += wrists.take(index, axis=0)
+
+            for name in LABEL_COLUMNS:
+                source_labels[name].take(index, out=batch_labels[name][:n])
+            top, bottom = batch_labels["top_finger"][:n], batch_labels["bottom_finger"][:n]
+            top[flipped], bottom[flipped] = bottom[flipped], top[flipped]
+
+            produced += n
+            yield out[:n], {name: column[:n] for name, column in batch_labels.items()}
+
+def augment_features(points, labels, n, seed=None, augmenter=None, extra_groups=(),
+                     batch_size=DEFAULT_BATCH_SIZE, out=None):
+    """
+    Feature matrix (n, num_features(extra_groups)) and LABEL_COLUMNS labels of
+    n augmented samples, written batch by batch into `out` when given (e.g.
+    the tail of a preallocated training matrix).
+    """
+    augmenter = augmenter or Augmenter()
+    if augmenter.depth_flip and not set(extra_groups) & set(Z_SIGNED_GROUPS):
+        raise ValueError(f"depth_flip swaps top and bottom finger labels, but no feature in the vector "
+                         f"changes with it; add one of {Z_SIGNED_GROUPS} to extra_groups")
+    X = out if out is not None else np.empty((n, num_features(extra_groups)))
+    all_labels = {name: np.empty(n, dtype=np.asarray(labels[name]).dtype) for name in LABEL_COLUMNS}
+    start = 0
+    for batch, batch_labels in augmenter.stream(points, labels, batch_size, seed, limit=n):
+        stop = start + len(batch)
+        X[start:stop] = extract_features_batch(batch, extra_groups)
+        for name in LABEL_COLUMNS:
+            all_labels[name][start:stop] = batch_labels[name]
+        start = stop
+    return X, all_labels
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Generate augmented landmark samples and report the throughput.")
+    parser.add_argument("data_dir", nargs="?", default="overlap_dataset")
+    parser.add_argument("--samples", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--features", action="store_true", help="Also extract features from every batch")
+    args = parser.parse_args()
+
+    points, labels = load_source(args.data_dir)
+    print(f"{len(points)} source samples")
+    augmenter = Augmenter()
+    start = time.perf_counter()
+    if args.features:
+        X, _ = augment_features(points, labels, args.samples, args.seed, augmenter, batch_size=args.batch_size)
+    else:
+        for _ in augmenter.stream(points, labels, args.batch_size, args.seed, limit=args.samples):
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"{args.samples} samples in {elapsed:.2f}s ({60 * args.samples / elapsed / 1e6:.1f}M samples/min)")
@@ -0,0 +1,225 @@
+# batch_extract.py
+"""
+Offline landmark extraction over recorded videos and image folders.
+
+Every input is split into shards of consecutive frames that are processed by a
+pool of worker processes, each holding one persistent MediaPipe Hands instance.
+Results are reassembled in input order and appended to a JSON Lines session in
+the same sample schema data_collection writes (plus "source" and "frame").
+The samples are unlabeled: instruction, top_finger and bottom_finger are
+empty, so convert_sessions needs --unlabeled to keep them, and they have to
+be labeled before they can be used for training.
+
+Progress is kept in a manifest next to the output; rerunning the same command
+skips finished shards. An existing output without a manifest is not from an
+earlier run and is never overwritten unless --force is given:
+
+    python batch_extract.py videos/*.mp4 frames_dir/ -o extracted/videos.jsonl
+    python convert_sessions.py extracted/videos.jsonl --format lmk --unlabeled
+
+With --tracking, every shard gets a fresh Hands graph, so MediaPipe's
+tracking state never carries over from one video or shard into another.
+"""
+import json
+import multiprocessing
+import os
+import time
+import cv2
+from pipeline import ImageFolderSource
+from session_writer import SessionWriter
+
+DEFAULT_SHARD_SIZE = 500   # Frames per shard
+MANIFEST_SUFFIX = ".manifest.json"
+
+# Per-process state, created once by _init_worker.
+_hands = None
+_hands_options = None
+
+def count_frames(path):
+    """Return the number of frames in a video file or image folder."""
+    if os.path.isdir(path):
+        return len(ImageFolderSource(path).paths)
+    cap = cv2.VideoCapture(path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+def iter_frames(path, start, end):
+    """Yield (frame_index, frame) for frames start..end-1 of a video file or image folder."""
+    if os.path.isdir(path):
+        for index, image_path in enumerate(ImageFolderSource(path).paths[start:end], start):
+            frame = cv2.imread(image_path)
+            if frame is not None:
+                yield index, frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    for index in range(start, end):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        yield index, frame
+    cap.release()
+
+def make_shards(paths, shard_size=DEFAULT_SHARD_SIZE):
+    """Split every input into (path, start, end) frame ranges, in input order."""
+    shards = []
+    for path in paths:
+        total = count_frames(path)
+        for start in range(0, total, shard_size):
+            shards.append((path, start, min(start + shard_size, total)))
+    return shards
+
+def shard_key(shard):
+    path, start, end = shard
+    return f"{os.path.abspath(path)}:{start}-{end}"
+
+def _make_hands():
+    import mediapipe as mp
+    return mp.solutions.hands.Hands(**_hands_options)
+
+def _init_worker(static_image_mode, max_num_hands, min_detection_confidence):
+    global _hands, _hands_options
+    # Workers already run in parallel; keep OpenCV from spawning its own threads.
+    cv2.setNumThreads(1)
+    _hands_options = {
+        "static_image_mode": static_image_mode,
+        "max_num_hands": max_num_hands,
+        "min_detection_confidence": min_detection_confidence,
+    }
+    # A static image graph keeps no state between frames and is reused for
+    # every shard; a tracking graph is made per shard by _extract_shard.
+    if static_image_mode:
+        _hands = _make_hands()
+
+def _extract_shard(shard):
+    """Run hand detection over one shard; returns (shard, samples, frames, busy_seconds)."""
+    path, start, end = shard
+    begin = time.perf_counter()
+    hands = _hands or _make_hands()
+    try:
+        samples, frames = _detect_shard(hands, path, start, end)
+    finally:
+        if hands is not _hands:
+            hands.close()
+    return shard, samples, frames, time.perf_counter() - begin
+
+def _detect_shard(hands, path, start, end):
+    samples = []
+    frames = 0
+    for index, frame in iter_frames(path, start, end):
+        frames += 1
+        results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if not results.multi_hand_landmarks:
+            continue
+        samples.append({
+            "instruction": "",
+            "top_finger": "",
+            "bottom_finger": "",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "landmarks": [
+                {"x": lm.x, "y": lm.y, "z": lm.z}
+                for lm in results.multi_hand_landmarks[0].landmark
+            ],
+            "source": path,
+            "frame": index,
+        })
+    return samples, frames
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {"shards": {}, "offset": 0}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_path):
+    # Write to a temporary file first so the manifest is never left half-written.
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def extract(paths, output_path, workers=None, shard_size=DEFAULT_SHARD_SIZE,
+            static_image_mode=True, max_num_hands=1, min_detection_confidence=0.7, force=False):
+    """
+    Extract landmarks from all inputs into output_path and return a throughput report.
+    A non-empty output_path without a manifest (e.g. a recorded session) is
+    only overwritten with force; otherwise FileExistsError is raised.
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest_path = output_path + MANIFEST_SUFFIX
+    resuming = os.path.exists(manifest_path)
+    if not resuming and os.path.exists(output_path) and os.path.getsize(output_path):
+        if not force:
+            raise FileExistsError(f"{output_path} exists and was not written by batch_extract; "
+                                  f"choose another output or pass --force to overwrite it")
+        os.remove(output_path)
+    manifest = load_manifest(manifest_path)
+
+    # Anything written after the last recorded shard belongs to an unfinished
+    # shard from an interrupted run; drop it before appending again.
+    if resuming and os.path.exists(output_path) and os.path.getsize(output_path) > manifest["offset"]:
+        with open(output_path, "r+b") as f:
+            f.truncate(manifest["offset"])
+
+    pending = [s for s in make_shards(paths, shard_size) if shard_key(s) not in manifest["shards"]]
+    print(f"{len(pending)} shards to process with {workers} workers "
+          f"({len(manifest['shards'])} already done)")
+
+    frames = 0
+    samples = 0
+    busy = 0.0
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, _init_worker,
+                              (static_image_mode, max_num_hands, min_detection_confidence)) as pool, \
+            SessionWriter(output_path, fsync_every=DEFAULT_SHARD_SIZE) as writer:
+        # imap keeps results in submission order, so the output follows input order.
+        for shard, shard_samples, shard_frames, shard_busy in pool.imap(_extract_shard, pending):
+            for sample in shard_samples:
+                writer.write(sample)
+            writer.sync()
+            manifest["offset"] = os.path.getsize(output_path)
+            manifest["shards"][shard_key(shard)] = {"frames": shard_frames, "samples": len(shard_samples)}
+            save_manifest(manifest, manifest_path)
+
+            frames += shard_frames
+            samples += len(shard_samples)
+            busy += shard_busy
+            elapsed = time.perf_counter() - start
+            print(f"{shard[0]} [{shard[1]}:{shard[2]}]: {len(shard_samples)}/{shard_frames} frames with hands, "
+                  f"{frames / elapsed:.1f} fps total")
+
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": frames,
+        "samples": samples,
+        "workers": workers,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "fps_per_core": frames / elapsed / workers if elapsed else 0.0,
+        # Share of the pool's wall-clock capacity spent on inference.
+        "utilization": busy / (elapsed * workers) if elapsed else 0.0,
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract hand landmarks from videos and image folders.")
+    parser.add_argument("inputs", nargs="+", help="Video files or image directories")
+    parser.add_argument("-o", "--output", required=True, help="Output JSON Lines session file")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Frames per shard")
+    parser.add_argument("--tracking", action="store_true",
+                        help="Use MediaPipe tracking between frames instead of static image mode")
+    parser.add_argument("--max-hands", type=int, default=1)
+    parser.add_argument("--force", action="store_true",
+                        help="Overwrite an existing output that has no batch_extract manifest")
+    args = parser.parse_args()
+
+    try:
+        report = extract(args.inputs, args.output, args.workers, args.shard_size,
+                         static_image_mode=not args.tracking, max_num_hands=args.max_hands, force=args.force)
+    except FileExistsError as e:
+        parser.error(str(e))
+    print(json.dumps(report, indent=2))
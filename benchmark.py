@@ -0,0 +1,398 @@
+# benchmark.py
+"""
+Benchmarks for the landmark-to-decision hot path.
+
+Runs without a camera or GPU on synthetic landmark arrays generated from a
+recorded session (the recorded hands, tiled and jittered with a fixed seed).
+Each benchmark is run at every requested size and reports call latency
+percentiles, throughput in samples per second and peak traced memory.
+Results are saved as JSON so runs from different commits can be compared:
+
+    python benchmark.py                       # all benchmarks at 1, 1k, 1M samples
+    python benchmark.py -k features --sizes 1,1000
+    python benchmark.py --compare benchmark_results/<old>.json
+    python benchmark.py --imports             # startup time of every module, against IMPORT_BUDGET_MS
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import numpy as np
+
+DEFAULT_SIZES = [1, 1000, 1000000]
+DEFAULT_SESSION = "overlap_dataset/overlap_data_20250414_092037.json"
+RESULTS_DIR = "benchmark_results"
+
+# Benchmarks that write a session file of the requested size to disk; a 1M
+# sample JSON file is over a gigabyte, so they stop here unless --full is given.
+FILE_BENCHMARK_MAX_SIZE = 100000
+
+# Short-lived workers pay the import cost of every module on each start, so
+# importing any of these must stay under the budget and load none of the
+# heavy dependencies, which are imported lazily where they are used.
+IMPORT_MODULES = [
+    "feature_extraction", "geometry", "data_preparation", "landmark_store", "session_writer", "feature_cache", "frame_buffers", "instrumentation",
+    "overlap", "gestures", "forest_export", "multitask", "train_search", "tracking", "pipeline",
+    "convert_sessions", "dataset_index", "data_collection", "data_visualization", "mp", "serve", "results_server", "augment",
+]
+IMPORT_BUDGET_MS = 250
+HEAVY_MODULES = ["mediapipe", "cv2", "plotly", "sklearn", "pyttsx3", "PIL"]
+
+def synthetic_landmarks(n, session_path=DEFAULT_SESSION, seed=0):
+    """(n, 21, 3) float64 hands: recorded samples tiled to n and jittered with a fixed seed."""
+    from feature_extraction import landmarks_to_array
+    from session_writer import load_session
+    base = np.array([landmarks_to_array(s["landmarks"]) for s in load_session(session_path) if s.get("landmarks")])
+    rng = np.random.default_rng(seed)
+    points = base[rng.integers(0, len(base), n)]
+    return points + rng.normal(0.0, 0.002, points.shape)
+
+def to_samples(points):
+    """Session samples (data_collection schema) for an (n, 21, 3) array."""
+    fingers = ["thumb1", "index2", "middle3", "ring4", "pinky5"]
+    return [
+        {
+            "instruction": f"{fingers[i % 5]}>{fingers[(i + 1) % 5]}",
+            "top_finger": fingers[i % 5],
+            "bottom_finger": fingers[(i + 1) % 5],
+            "timestamp": "2025-04-14 08:48:54",
+            "landmarks": [{"x": x, "y": y, "z": z} for x, y, z in hand],
+        }
+        for i, hand in enumerate(points.tolist())
+    ]
+
+def _as_hand_landmarks(hand):
+    """Object shaped like a MediaPipe hand_landmarks result for one (21, 3) hand."""
+    return types.SimpleNamespace(landmark=[types.SimpleNamespace(x=x, y=y, z=z) for x, y, z in hand.tolist()])
+
+# Each benchmark is a setup function taking (points, workdir) and returning a
+# callable that processes all len(points) samples once.
+
+def bench_normalize_landmarks(points, workdir):
+    from feature_extraction import normalize_landmarks
+    samples = [s["landmarks"] for s in to_samples(points)]
+    return lambda: [normalize_landmarks(lms) for lms in samples]
+
+def bench_extract_features(points, workdir):
+    from feature_extraction import extract_features_from_landmarks
+    samples = [s["landmarks"] for s in to_samples(points)]
+    return lambda: [extract_features_from_landmarks(lms) for lms in samples]
+
+def bench_extract_features_batch(points, workdir):
+    from feature_extraction import extract_features_batch
+    return lambda: extract_features_batch(points)
+
+def bench_extract_features_geometry(points, workdir):
+    # Per-frame path with every geometry group; should not cost more than extract_features.
+    from feature_extraction import extract_features_from_landmarks
+    from geometry import GEOMETRY_GROUPS
+    samples = [s["landmarks"] for s in to_samples(points)]
+    return lambda: [extract_features_from_landmarks(lms, list(GEOMETRY_GROUPS)) for lms in samples]
+
+def bench_geometry_batch(points, workdir):
+    from geometry import geometry_features
+    return lambda: geometry_features(points)
+
+def _write_session(points, workdir):
+    path = os.path.join(workdir, f"session_{len(points)}.json")
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            json.dump(to_samples(points), f)
+    return path
+
+def bench_load_data(points, workdir):
+    from data_preparation import load_data
+    path = _write_session(points, workdir)
+    return lambda: load_data(path)
+
+def bench_convert_json_to_csv(points, workdir):
+    import contextlib
+    import io
+    from json_csv import convert_json_to_csv
+    path = _write_session(points, workdir)
+    csv_path = os.path.join(workdir, "out.csv")
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert_json_to_csv(path, csv_path)
+    return run
+
+def bench_get_gesture(points, workdir):
+    from mp import SignLanguageConverter
+    converter = SignLanguageConverter.__new__(SignLanguageConverter)
+    hands = [_as_hand_landmarks(hand) for hand in points]
+    return lambda: [converter.get_gesture(hand) for hand in hands]
+
+def bench_gesture_rules_batch(points, workdir):
+    from gestures import classify_batch
+    return lambda: classify_batch(points)
+
+def _bench_metrics(points, enabled):
+    from instrumentation import Metrics
+    registry = Metrics(enabled=enabled)
+    def run():
+        # One timer and one counter hook per frame.
+        for _ in range(len(points)):
+            with registry.timer("stage"):
+                pass
+            registry.count("frames")
+    return run
+
+def bench_metrics_disabled(points, workdir):
+    # The cost instrumentation hooks leave in the hot path while switched off.
+    return _bench_metrics(points, False)
+
+def bench_metrics_enabled(points, workdir):
+    return _bench_metrics(points, True)
+
+def bench_overlap_pairwise(points, workdir):
+    from overlap import FINGER_NAMES, FINGER_PAIRS, check_finger_overlap_3d
+    pairs = [(FINGER_NAMES[i], FINGER_NAMES[j]) for i, j in FINGER_PAIRS]
+    return lambda: [check_finger_overlap_3d(f1, f2, hand) for hand in points for f1, f2 in pairs]
+
+def bench_overlap_matrix(points, workdir):
+    from overlap import finger_overlap_matrix
+    return lambda: finger_overlap_matrix(points)
+
+def bench_augment_stream(points, workdir):
+    from augment import Augmenter
+    labels = {name: np.zeros(len(points), dtype=np.int8) for name in ("overlap", "top_finger", "bottom_finger")}
+    augmenter = Augmenter()
+    return lambda: [batch for batch, _ in augmenter.stream(points, labels, seed=0, limit=len(points))]
+
+def bench_overlay_figure(points, workdir):
+    from data_visualization import overlay_figure
+    codes = np.arange(len(points)) % 5
+    return lambda: overlay_figure(points, codes, (codes + 1) % 5)
+
+def _bench_forest_predict_one(points, train_size, label_noise):
+    from sklearn.ensemble import RandomForestClassifier
+    from feature_extraction import extract_features_batch
+    from forest_export import export_forest
+    features = extract_features_batch(points)
+    train_points = synthetic_landmarks(train_size, seed=1)
+    train = extract_features_batch(train_points)
+    # Stand-in "top finger" label: the finger tip closest to the camera.
+    labels = train_points[:, [4, 8, 12, 16, 20], 2].argmin(axis=1)
+    # Noisy labels grow the fully grown trees to the size of a forest trained on a large archive.
+    noisy = np.random.default_rng(2).random(train_size) < label_noise
+    labels[noisy] = np.random.default_rng(3).integers(0, 5, noisy.sum())
+    forest = export_forest(RandomForestClassifier(n_estimators=100, random_state=42).fit(train, labels))
+    return lambda: [forest.predict_proba_one(x) for x in features]
+
+def bench_forest_predict_one(points, workdir):
+    return _bench_forest_predict_one(points, 500, 0.0)
+
+def bench_forest_predict_one_large(points, workdir):
+    # About 100 trees of several thousand nodes each (~500k nodes).
+    return _bench_forest_predict_one(points, 20000, 0.3)
+
+def bench_results_server_stop(points, workdir):
+    # Publish the hands to a subscriber and stop the server while it is still connected.
+    import asyncio
+    import threading
+    from results_server import ResultClient, ResultServer
+    address = f"unix:{os.path.join(workdir, 'results.sock')}"
+    results = [{"stream_id": 0, "frame": i, "hand": 0, "handedness": "Right", "inferred": False,
+                "gesture": None, "overlap_code": 0, "landmarks": hand} for i, hand in enumerate(points)]
+
+    def run():
+        server = ResultServer(address).start()
+        received = []
+        async def subscribe():
+            async with ResultClient(address) as client:
+                try:
+                    async for record in client.subscribe():
+                        received.append(record)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    pass
+        client = threading.Thread(target=asyncio.run, args=(subscribe(),), daemon=True)
+        client.start()
+        deadline = time.perf_counter() + 5
+        while not received and time.perf_counter() < deadline:
+            server.publish(results)
+            time.sleep(0.001)
+        assert received, "subscriber received nothing"
+        start = time.perf_counter()
+        server.stop()
+        assert time.perf_counter() - start < 1, "stop() waited for a connected subscriber"
+        assert not server._thread.is_alive(), "server thread still running after stop()"
+        client.join(timeout=5)
+        assert not client.is_alive(), "subscriber was not disconnected"
+    return run
+
+BENCHMARKS = {
+    "normalize_landmarks": (bench_normalize_landmarks, None),
+    "extract_features": (bench_extract_features, None),
+    "extract_features_batch": (bench_extract_features_batch, None),
+    "extract_features_geometry": (bench_extract_features_geometry, None),
+    "geometry_batch": (bench_geometry_batch, None),
+    "load_data": (bench_load_data, FILE_BENCHMARK_MAX_SIZE),
+    "convert_json_to_csv": (bench_convert_json_to_csv, FILE_BENCHMARK_MAX_SIZE),
+    "get_gesture": (bench_get_gesture, None),
+    "gesture_rules_batch": (bench_gesture_rules_batch, None),
+    "metrics_disabled": (bench_metrics_disabled, None),
+    "metrics_enabled": (bench_metrics_enabled, None),
+    "overlap_pairwise": (bench_overlap_pairwise, None),
+    "overlap_matrix": (bench_overlap_matrix, None),
+    "augment_stream": (bench_augment_stream, None),
+    "overlay_figure": (bench_overlay_figure, None),
+    "forest_predict_one": (bench_forest_predict_one, None),
+    "forest_predict_one_large": (bench_forest_predict_one_large, None),
+    "results_server_stop": (bench_results_server_stop, None),
+}
+
+def measure(run, n, min_time=0.5, max_repeats=1000):
+    """Time repeated calls of run() and trace the peak memory of one more call."""
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < max_repeats and (not latencies or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "samples": n,
+        "repeats": len(latencies),
+        "p50_ms": 1000 * p50,
+        "p90_ms": 1000 * p90,
+        "p99_ms": 1000 * p99,
+        "throughput_per_s": n / p50 if p50 else float("inf"),
+        "peak_mem_mb": peak / 2**20,
+    }
+
+def measure_import(module, repeats=3):
+    """
+    Import time of module in a fresh interpreter, from python -X importtime
+    (best of repeats), and the heavy modules the import pulled in.
+    """
+    best, heavy = None, set()
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stderr
+        # Lines look like "import time:   self [us] | cumulative | imported package".
+        for line in output.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            if name.split(".")[0] in HEAVY_MODULES:
+                heavy.add(name.split(".")[0])
+            if name == module:
+                seconds = int(cumulative) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    return {"import_ms": 1000 * best, "budget_ms": IMPORT_BUDGET_MS, "heavy": sorted(heavy),
+            "ok": 1000 * best <= IMPORT_BUDGET_MS and not heavy}
+
+def run_import_benchmarks(modules, repeats=3):
+    results = {}
+    for module in modules:
+        key = f"import:{module}"
+        results[key] = measure_import(module, repeats)
+        print(format_result(key, results[key]))
+    return results
+
+def run_benchmarks(names, sizes, full=False, min_time=0.5):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            points = synthetic_landmarks(n)
+            for name in names:
+                setup, max_size = BENCHMARKS[name]
+                key = f"{name}[{n}]"
+                if max_size is not None and n > max_size and not full:
+                    results[key] = {"skipped": f"size above {max_size}, use --full"}
+                    print(format_result(key, results[key]))
+                    continue
+                try:
+                    run = setup(points, workdir)
+                except Exception as e:
+                    results[key] = {"skipped": f"{type(e).__name__}: {e}"}
+                else:
+                    results[key] = measure(run, n, min_time)
+                print(format_result(key, results[key]))
+    return results
+
+def format_result(key, result):
+    if "skipped" in result:
+        return f"{key:36s} skipped ({result['skipped']})"
+    if "import_ms" in result:
+        heavy = f"  loads {', '.join(result['heavy'])}" if result["heavy"] else ""
+        return (f"{key:36s} {result['import_ms']:10.1f} ms  budget {result['budget_ms']} ms  "
+                f"{'ok' if result['ok'] else 'FAIL'}{heavy}")
+    return (f"{key:36s} p50 {result['p50_ms']:10.3f} ms  p99 {result['p99_ms']:10.3f} ms  "
+            f"{result['throughput_per_s']:14.0f} samples/s  peak {result['peak_mem_mb']:8.1f} MB")
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results, baseline):
+    """Print the p50 latency ratio of every benchmark present in both runs."""
+    for key, result in results.items():
+        old = baseline.get(key)
+        if not old or "p50_ms" not in result or "p50_ms" not in old:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+        print(f"{key:36s} {old['p50_ms']:10.3f} -> {result['p50_ms']:10.3f} ms  x{ratio:.2f}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the landmark-to-decision hot path.")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated sample counts")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Minimum seconds of repeats per benchmark")
+    parser.add_argument("--full", action="store_true", help="Run file benchmarks at every size")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmark_results/<time>_<rev>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare against")
+    parser.add_argument("--imports", action="store_true",
+                        help="Check module import times against IMPORT_BUDGET_MS instead (exit status 1 if over)")
+    args = parser.parse_args()
+
+    if args.imports:
+        results = run_import_benchmarks([m for m in IMPORT_MODULES if args.filter in m])
+    else:
+        names = [name for name in BENCHMARKS if args.filter in name]
+        sizes = [int(s) for s in args.sizes.split(",")]
+        results = run_benchmarks(names, sizes, args.full, args.min_time)
+
+    revision = git_revision()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{revision}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "revision": revision,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "results": results,
+        }, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f)["results"])
+
+    if args.imports and not all(result["ok"] for result in results.values()):
+        sys.exit(1)
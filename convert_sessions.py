@@ -0,0 +1,226 @@
+# convert_sessions.py
+"""
+Parallel, streaming conversion of recorded sessions to CSV or columnar files.
+
+Every input session (.json list or .jsonl) is converted by one task in a pool
+of worker processes, largest files first. A worker reads its session one
+sample at a time (session_writer.iter_session), validates it against the
+data_collection schema and writes it out straight away, so its memory use
+stays constant however large the file is, and the archive converts in
+parallel across cores.
+
+Rejected samples are counted per reason for every file:
+  - not_an_object:  the record is not a JSON object
+  - no_landmarks:   missing or empty "landmarks"
+  - landmark_count: not exactly 21 landmarks
+  - bad_coordinate: a landmark without numeric x, y, z
+  - non_finite:     a NaN or infinite coordinate
+  - unknown_finger: top_finger / bottom_finger not in landmark_store.FINGERS
+                    (with --unlabeled, samples with both left empty, as
+                    batch_extract writes them, are accepted)
+
+Output formats:
+  - csv:  the json_csv layout (one ";"-joined coordinate string per finger)
+  - wide: numeric CSV with one column per landmark coordinate (x0, y0, z0 ... z20)
+  - lmk:  landmark store with memory-mappable .npy columns (landmark_store)
+
+    python convert_sessions.py overlap_dataset/ --format lmk -j 8
+"""
+import csv
+import glob
+import json
+import math
+import multiprocessing
+import os
+import time
+from landmark_store import CSV_FINGER_MAPPING, FINGERS, STORE_SUFFIX, StoreWriter, overlap_label
+from session_writer import SESSION_SUFFIX, iter_session
+
+REJECT_REASONS = ["not_an_object", "no_landmarks", "landmark_count", "bad_coordinate", "non_finite", "unknown_finger"]
+
+OUTPUT_SUFFIXES = {"csv": ".csv", "wide": ".wide.csv", "lmk": STORE_SUFFIX}
+
+_KNOWN_FINGERS = frozenset(FINGERS)
+
+def validate_sample(sample, allow_unlabeled=False):
+    """
+    Check one sample against the session schema.
+    Returns (coordinates, None) with the 63 x, y, z values of a valid sample,
+    or (None, reason) with one of REJECT_REASONS. With allow_unlabeled, a
+    sample whose top_finger and bottom_finger are both empty is valid.
+    """
+    if not isinstance(sample, dict):
+        return None, "not_an_object"
+    landmarks = sample.get("landmarks")
+    if not landmarks:
+        return None, "no_landmarks"
+    if not isinstance(landmarks, list) or len(landmarks) != 21:
+        return None, "landmark_count"
+    coords = []
+    try:
+        for lm in landmarks:
+            coords.extend((lm["x"], lm["y"], lm["z"]))
+    except (TypeError, KeyError):
+        return None, "bad_coordinate"
+    # bool is an int subclass, so check exact types.
+    if any(type(v) is not float and type(v) is not int for v in coords):
+        return None, "bad_coordinate"
+    if not all(map(math.isfinite, coords)):
+        return None, "non_finite"
+    top, bottom = sample.get("top_finger"), sample.get("bottom_finger")
+    if allow_unlabeled and not top and not bottom:
+        return coords, None
+    if top not in _KNOWN_FINGERS or bottom not in _KNOWN_FINGERS:
+        return None, "unknown_finger"
+    return coords, None
+
+class CsvLayoutWriter:
+    """The json_csv.convert_json_to_csv layout, written row by row."""
+    fieldnames = list(CSV_FINGER_MAPPING) + ["top_finger", "bottom_finger"]
+    # Coordinate slices and "x,y,z;x,y,z;..." format of each finger column.
+    _columns = [(3 * r.start, 3 * r.stop, ";".join(["%.6f,%.6f,%.6f"] * len(r))) for r in CSV_FINGER_MAPPING.values()]
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path + ".partial", "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.fieldnames)
+
+    def write(self, coords, sample):
+        row = [fmt % tuple(coords[start:stop]) for start, stop, fmt in self._columns]
+        row.extend((sample.get("top_finger") or "", sample.get("bottom_finger") or ""))
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+        os.replace(self.path + ".partial", self.path)
+
+class WideCsvWriter(CsvLayoutWriter):
+    """Numeric CSV: one column per landmark coordinate, then the labels."""
+    fieldnames = [f"{axis}{i}" for i in range(21) for axis in "xyz"] + ["overlap", "top_finger", "bottom_finger"]
+
+    def write(self, coords, sample):
+        self._writer.writerow(coords + [overlap_label(sample), sample.get("top_finger") or "",
+                                        sample.get("bottom_finger") or ""])
+
+class StoreOutputWriter:
+    """Landmark store output through landmark_store.StoreWriter."""
+    def __init__(self, path):
+        self._writer = StoreWriter(path)
+
+    def write(self, coords, sample):
+        self._writer.write(coords, overlap_label(sample), sample.get("top_finger") or "",
+                           sample.get("bottom_finger") or "",
+                           sample.get("instruction", ""), sample.get("timestamp", ""))
+
+    def close(self):
+        self._writer.close()
+
+WRITERS = {"csv": CsvLayoutWriter, "wide": WideCsvWriter, "lmk": StoreOutputWriter}
+
+def convert_session(task):
+    """Convert one session file; returns its statistics. Runs in a worker process."""
+    input_path, output_path, output_format, allow_unlabeled = task
+    start = time.process_time()
+    rejected = dict.fromkeys(REJECT_REASONS, 0)
+    samples = 0
+    error = None
+    writer = WRITERS[output_format](output_path)
+    try:
+        for sample in iter_session(input_path):
+            samples += 1
+            coords, reason = validate_sample(sample, allow_unlabeled)
+            if reason:
+                rejected[reason] += 1
+            else:
+                writer.write(coords, sample)
+    except ValueError as e:
+        # Malformed or truncated JSON: keep the samples read before it.
+        error = f"{type(e).__name__}: {e}"
+    writer.close()
+    return {
+        "input": input_path,
+        "output": output_path,
+        "samples": samples,
+        "written": samples - sum(rejected.values()),
+        "rejected": {reason: count for reason, count in rejected.items() if count},
+        "error": error,
+        "cpu_seconds": time.process_time() - start,
+    }
+
+def find_inputs(paths):
+    """Expand directories into their .json / .jsonl session files."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "*.json")) + glob.glob(os.path.join(path, "*" + SESSION_SUFFIX))
+            inputs.extend(sorted(p for p in found if not p.endswith(".manifest.json")))
+        else:
+            inputs.append(path)
+    return inputs
+
+def output_path_for(input_path, output_format, out_dir=None):
+    base = os.path.splitext(input_path)[0]
+    if out_dir:
+        base = os.path.join(out_dir, os.path.basename(base))
+    return base + OUTPUT_SUFFIXES[output_format]
+
+def convert(paths, output_format="csv", out_dir=None, workers=None, allow_unlabeled=False):
+    """
+    Convert all session files in paths in parallel (allow_unlabeled: see
+    validate_sample). Returns (per-file statistics in input order, summary report).
+    """
+    workers = workers or os.cpu_count() or 1
+    inputs = find_inputs(paths)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tasks = [(path, output_path_for(path, output_format, out_dir), output_format, allow_unlabeled)
+             for path in inputs]
+    # Largest files first, so one big file does not finish alone at the end.
+    tasks.sort(key=lambda task: -os.path.getsize(task[0]))
+
+    results = {}
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for stats in pool.imap_unordered(convert_session, tasks):
+            results[stats["input"]] = stats
+            rejected = ", ".join(f"{reason} {count}" for reason, count in stats["rejected"].items()) or "none"
+            print(f"{stats['input']}: {stats['written']}/{stats['samples']} samples -> {stats['output']} "
+                  f"(rejected: {rejected}){' ' + stats['error'] if stats['error'] else ''}")
+    elapsed = time.perf_counter() - start
+
+    stats = [results[path] for path in inputs]
+    samples = sum(s["samples"] for s in stats)
+    busy = sum(s["cpu_seconds"] for s in stats)
+    report = {
+        "files": len(stats),
+        "samples": samples,
+        "written": sum(s["written"] for s in stats),
+        "rejected": sum(sum(s["rejected"].values()) for s in stats),
+        "errors": sum(1 for s in stats if s["error"]),
+        "workers": workers,
+        "seconds": elapsed,
+        "samples_per_s": samples / elapsed if elapsed else 0.0,
+        # Share of the pool's wall-clock capacity spent converting.
+        "utilization": busy / (elapsed * workers) if elapsed else 0.0,
+    }
+    return stats, report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate and convert session files in parallel.")
+    parser.add_argument("inputs", nargs="+", help="Session files (.json / .jsonl) or directories of them")
+    parser.add_argument("--format", default="csv", choices=list(WRITERS))
+    parser.add_argument("--out-dir", default=None, help="Output directory (default: next to each input)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--report", default=None, help="Also write per-file statistics to this JSON file")
+    parser.add_argument("--unlabeled", action="store_true",
+                        help="Keep samples without finger labels (e.g. batch_extract output)")
+    args = parser.parse_args()
+
+    stats, report = convert(args.inputs, args.format, args.out_dir, args.workers, args.unlabeled)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"summary": report, "files": stats}, f, indent=2)
+    print(json.dumps(report, indent=2))
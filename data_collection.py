@@ -115,23 +115,22 @@
 # if __name__ == "__main__":
 #     main()
 
-import cv2
-import numpy as np
-import mediapipe as mp
 import random
 import time
 import os
-import json
-
-# Initialize MediaPipe
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(static_image_mode=True, max_num_hands=1, min_detection_confidence=0.7)
+from session_writer import SessionWriter, SESSION_SUFFIX
+from frame_buffers import FrameBufferPool
+from instrumentation import metrics, session
+from pipeline import Pipeline
 
 # Configuration parameters
 DATA_DIR = "overlap_dataset"
 TOTAL_SAMPLES = 500       # Total number of samples to collect
 SAMPLES_PER_INTERVAL = 50 # Number of samples per interval
 BREAK_DURATION = 15       # Seconds to break before next interval
+FSYNC_EVERY = 10          # Samples written between fsyncs of the session file
+COUNTDOWN = 3             # Seconds a hand must be shown before a sample is recorded
+REPLAY_FRAME_RATE = 30    # Frame rate assumed when replaying an image directory
 FINGERS = ["thumb1", "index2", "middle3", "ring4", "pinky5"]  # All fingers
 
 # Mapping for finger tip landmarks (MediaPipe uses 21 landmarks)
@@ -143,98 +142,251 @@ FINGER_TIPS = {
     "pinky": 20
 }
 
+class LiveClock:
+    """Wall-clock time and an OpenCV window, for collecting from a camera."""
+    display = True
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def next_frame(self):
+        return True
+
+    def show(self, frame):
+        import cv2
+        cv2.imshow("Data Collection", frame)
+
+    def wait_key(self, delay_ms):
+        import cv2
+        return cv2.waitKey(delay_ms) & 0xFF
+
+    def close(self):
+        import cv2
+        cv2.destroyAllWindows()
+
+class ReplayClock:
+    """
+    Virtual clock for replaying recorded frames headless.
+
+    Every frame advances the clock by 1 / frame_rate, so the countdown lasts
+    as many frames as it would live. Waits are simulated instead of slept:
+    the frames a camera would have delivered meanwhile are skipped, and
+    nothing is displayed, so replay runs as fast as inference allows.
+    """
+    display = False
+
+    def __init__(self, frame_rate=REPLAY_FRAME_RATE, start=None):
+        self.frame_interval = 1.0 / frame_rate
+        self.now = time.time() if start is None else start
+        self.frame_time = self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def next_frame(self):
+        """Advance to the next frame; False if it was captured during a simulated wait."""
+        self.frame_time += self.frame_interval
+        if self.frame_time < self.now:
+            return False
+        self.now = self.frame_time
+        return True
+
+    def show(self, frame):
+        pass
+
+    def wait_key(self, delay_ms):
+        self.sleep(delay_ms / 1000)
+        return -1
+
+    def close(self):
+        pass
+
 def generate_random_instruction():
     """Generate a random instruction for finger overlap."""
     f1, f2 = random.sample(FINGERS, 2)
     return f"{f1}>{f2}", f1, f2
 
-def record_sample(cap, instruction, top_finger, bottom_finger):
-    """Record one sample of data."""
-    start_time = time.time()
+# MediaPipe Hands graph, created on first use so importing this module stays cheap.
+hands = None
+# RGB conversions and captured frames are written into reused arrays.
+buffers = FrameBufferPool()
+
+def get_hands():
+    """The shared Hands graph, loading MediaPipe the first time it is needed."""
+    global hands
+    if hands is None:
+        import mediapipe as mp
+        # Tracking mode: palm detection only re-runs when MediaPipe loses tracking confidence.
+        hands = mp.solutions.hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.5)
+    return hands
+
+def detect_hands(frame):
+    """Run hand detection on a BGR frame (called on the pipeline's inference worker)."""
+    import cv2
+    with metrics.timer("cvt_color"):
+        frame_rgb = buffers.cvt_color(frame, cv2.COLOR_BGR2RGB)
+    with metrics.timer("hands"):
+        results = get_hands().process(frame_rgb)
+    buffers.release("rgb", frame_rgb)
+    metrics.count("detections" if results.multi_hand_landmarks else "misses")
+    return results
+
+def record_sample(pipeline, instruction, top_finger, bottom_finger, clock=None):
+    """
+    Record one sample of data from the frames and detections of a running Pipeline.
+    clock is a LiveClock (the default) or a ReplayClock for headless replay.
+    """
+    clock = clock or LiveClock()
+    if clock.display:
+        import cv2
+        import mediapipe as mp
+    start_time = clock.time()
     sample_data = {
         "instruction": instruction,
         "top_finger": top_finger,
         "bottom_finger": bottom_finger,
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time)),
         "landmarks": None
     }
     
     while True:
-        ret, frame = cap.read()
+        ret, frame, results = pipeline.read()
         if not ret:
+            if pipeline.finished:
+                return None
+            continue
+        if not clock.next_frame():
             continue
         
         # Display instruction and countdown
-        cv2.putText(frame, instruction, (50, 50), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.putText(frame, f"Collection countdown: {3 - (time.time() - start_time):.1f}s", 
-                    (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-        
-        # Process hand detection
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = hands.process(image_rgb)
+        if clock.display:
+            cv2.putText(frame, instruction, (50, 50), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.putText(frame, f"Collection countdown: {COUNTDOWN - (clock.time() - start_time):.1f}s", 
+                        (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
         
+        # Hand detection already ran on the pipeline's inference worker
         if results.multi_hand_landmarks:
             hand_landmarks = results.multi_hand_landmarks[0]
             
             # Draw hand landmarks
-            mp.solutions.drawing_utils.draw_landmarks(
-                frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+            if clock.display:
+                mp.solutions.drawing_utils.draw_landmarks(
+                    frame, hand_landmarks, mp.solutions.hands.HAND_CONNECTIONS)
             
             # Automatically record after 3 seconds
-            if time.time() - start_time > 3:
+            if clock.time() - start_time > COUNTDOWN:
                 # Save all landmark 3D coordinates
                 sample_data["landmarks"] = [
                     {"x": lm.x, "y": lm.y, "z": lm.z} 
                     for lm in hand_landmarks.landmark
                 ]
-                cv2.putText(frame, "Recorded!", (200, 200), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
-                cv2.imshow("Data Collection", frame)
-                cv2.waitKey(500)  # Show the recorded message for 0.5 seconds
+                if clock.display:
+                    cv2.putText(frame, "Recorded!", (200, 200), 
+                                cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
+                clock.show(frame)
+                clock.wait_key(500)  # Show the recorded message for 0.5 seconds
                 return sample_data
         
-        cv2.imshow("Data Collection", frame)
-        if cv2.waitKey(1) & 0xFF == 27:  # ESC to exit
+        with pipeline.timed("render"):
+            clock.show(frame)
+        if clock.wait_key(1) == 27:  # ESC to exit
             return None
 
-def main():
+def replay_frame_rate(pipeline):
+    """Frame rate of a replayed video, or REPLAY_FRAME_RATE for image directories."""
+    get = getattr(pipeline.capture, "get", None)
+    if get is not None:
+        import cv2
+        fps = get(cv2.CAP_PROP_FPS)
+        if fps and fps > 0:
+            return fps
+    return REPLAY_FRAME_RATE
+
+def main(resume_path=None, source=0, replay=False, seed=None, total_samples=TOTAL_SAMPLES):
+    """
+    Collect samples from a camera, or with replay=True from a recorded video or
+    image directory, headless and on a virtual clock, processing every frame.
+    """
     # Create the data directory if it doesn't exist
     os.makedirs(DATA_DIR, exist_ok=True)
-    dataset = []
+    if seed is not None:
+        random.seed(seed)
     
-    cap = cv2.VideoCapture(0)
+    # Samples are streamed to a JSON Lines file as they are recorded, so an
+    # interrupted session keeps everything captured so far and can be resumed.
+    if resume_path:
+        filename = resume_path
+    else:
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join(DATA_DIR, f"overlap_data_{timestamp}{SESSION_SUFFIX}")
+    writer = SessionWriter(filename, fsync_every=FSYNC_EVERY)
+    if writer.count:
+        print(f"Resuming {filename} after {writer.count} recorded samples")
     
-    print(f"Collecting {TOTAL_SAMPLES} finger overlap samples...")
+    # Replay is lossless: every recorded frame goes through inference, in order.
+    pipeline = Pipeline(source, detect_hands, drop=not replay, buffers=buffers).start()
+    clock = ReplayClock(replay_frame_rate(pipeline)) if replay else LiveClock()
     
-    for i in range(TOTAL_SAMPLES):
-        # Generate a random instruction
-        instruction, top_finger, bottom_finger = generate_random_instruction()
-        print(f"\nSample {i+1}/{TOTAL_SAMPLES}: {instruction}")
-        
-        # Record the sample
-        sample = record_sample(cap, instruction, top_finger, bottom_finger)
-        if sample:
-            dataset.append(sample)
-            print(f"Recorded: {top_finger} is on top, {bottom_finger} is at bottom")
-        else:
-            print("User interrupted")
-            break
-        
-        # Pause for a break after every interval of samples (except after the last interval)
-        if (i+1) % SAMPLES_PER_INTERVAL == 0 and (i+1) < TOTAL_SAMPLES:
-            print(f"\nCollected {i+1} samples so far. Taking a {BREAK_DURATION}-second break before the next interval...")
-            time.sleep(BREAK_DURATION)
+    print(f"Collecting {total_samples} finger overlap samples...")
+    start = time.perf_counter()
     
-    # Save the dataset to a JSON file
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(DATA_DIR, f"overlap_data_{timestamp}.json")
-    with open(filename, 'w') as f:
-        json.dump(dataset, f, indent=2)
-    print(f"\nData saved to {filename}")
-    
-    cap.release()
-    cv2.destroyAllWindows()
+    try:
+        for i in range(writer.count, total_samples):
+            # Generate a random instruction
+            instruction, top_finger, bottom_finger = generate_random_instruction()
+            print(f"\nSample {i+1}/{total_samples}: {instruction}")
+            
+            # Record the sample
+            sample = record_sample(pipeline, instruction, top_finger, bottom_finger, clock)
+            if sample:
+                with metrics.timer("write"):
+                    writer.write(sample)
+                metrics.count("samples")
+                print(f"Recorded: {top_finger} is on top, {bottom_finger} is at bottom")
+            else:
+                print("Source finished" if pipeline.finished else "User interrupted")
+                break
+            
+            # Pause for a break after every interval of samples (except after the last interval)
+            if (i+1) % SAMPLES_PER_INTERVAL == 0 and (i+1) < total_samples:
+                print(f"\nCollected {i+1} samples so far. Taking a {BREAK_DURATION}-second break before the next interval...")
+                clock.sleep(BREAK_DURATION)
+    finally:
+        writer.close()
+        print(f"\n{writer.count} samples saved to {filename}")
+        pipeline.stop()
+        print(f"Pipeline stats: {pipeline.report()}")
+        if replay:
+            print(f"Replayed in {time.perf_counter() - start:.1f}s")
+        clock.close()
+        if os.path.abspath(os.path.dirname(filename)) == os.path.abspath(DATA_DIR):
+            # Index the new samples, so the dataset index always covers DATA_DIR.
+            # The samples are already saved; a failed update is redone by the next one.
+            try:
+                from dataset_index import update_index
+                update_index(DATA_DIR)
+            except Exception as e:
+                print(f"Warning: could not update the dataset index of {DATA_DIR}: {e}")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Collect finger overlap samples.")
+    parser.add_argument("--resume", default=None, help="Session file to continue recording into")
+    parser.add_argument("--source", default=0, help="Camera index, video file or image directory")
+    parser.add_argument("--replay", action="store_true",
+                        help="Replay a recorded source headless on a virtual clock, as fast as inference allows")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the instruction sequence")
+    parser.add_argument("--samples", type=int, default=TOTAL_SAMPLES, help="Number of samples to collect")
+    parser.add_argument("--metrics", default=None,
+                        help="Export stage metrics to this file (.prom for Prometheus text, else JSON Lines)")
+    parser.add_argument("--profile", default=None, help="Write sampling profiler stacks to this file")
+    args = parser.parse_args()
+    with session(args.metrics, args.profile):
+        main(args.resume, args.source, args.replay, args.seed, args.samples)
@@ -1,7 +1,9 @@
 # data_preparation.py
-import json
 import numpy as np
-from feature_extraction import extract_features_from_landmarks
+from feature_extraction import extract_features_batch, landmarks_to_array
+from instrumentation import metrics, session
+from landmark_store import is_store, open_store
+from session_writer import load_session
 
 def load_data(json_file_path):
     """
@@ -15,17 +17,22 @@ def load_data(json_file_path):
     
     If "overlap" is not provided, a simple heuristic is used: if ">" is found
     in the instruction, the sample is labeled as 1 (overlap); otherwise 0.
+
+    json_file_path may also be a JSON Lines session written by data_collection,
+    or a landmark store directory (see landmark_store.py); a store's columns
+    are memory-mapped instead of parsed and its labels returned without copying.
     """
-    features_list = []
+    if is_store(json_file_path):
+        store = open_store(json_file_path)
+        with metrics.timer("extract_features"):
+            return extract_features_batch(store["landmarks"]), store["overlap"]
+
+    points_list = []
     labels_list = []
     
-    with open(json_file_path, "r") as f:
-        data = json.load(f)
-    
-    # Check if the file holds a list of samples or a single sample.
-    if isinstance(data, dict):
-        # If it's a dict, assume a single sample; convert to a list.
-        data = [data]
+    # Accepts a JSON list, a single-sample JSON dict or a JSON Lines session.
+    with metrics.timer("load_session"):
+        data = load_session(json_file_path)
 
     for sample in data:
         # Ensure the sample has landmark data before processing.
@@ -33,9 +40,8 @@ def load_data(json_file_path):
         if not landmarks:
             continue
         
-        # Extract feature vector from the 21 hand landmarks.
-        features = extract_features_from_landmarks(landmarks)
-        features_list.append(features)
+        # Collect the 21 hand landmarks; features are extracted in one batch below.
+        points_list.append(landmarks_to_array(landmarks))
         
         # Determine label: use "overlap" key if present; otherwise infer from instruction.
         if "overlap" in sample:
@@ -46,14 +52,17 @@ def load_data(json_file_path):
             label = 1 if ">" in instruction else 0
         labels_list.append(label)
         
-    X = np.array(features_list)
+    with metrics.timer("extract_features"):
+        X = extract_features_batch(np.array(points_list).reshape(-1, 21, 3))
     y = np.array(labels_list)
+    metrics.count("samples", len(y))
     
     return X, y
 
 if __name__ == '__main__':
     # Update the JSON path to your file
     json_file_path = "overlap_dataset/overlap_data_20250414_092037.json"
-    X, y = load_data(json_file_path)
+    with session():
+        X, y = load_data(json_file_path)
     print("Features shape:", X.shape)
     print("Labels shape:", y.shape)
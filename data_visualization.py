@@ -1,82 +1,233 @@
-import plotly.graph_objects as go
-import mediapipe as mp
-import json
-
-# 加载数据
-with open('overlap_dataset/overlap_data_20250414_092037.json') as f:
-    data = json.load(f)
-
-def plot_overlap_3d(sample):
-    # 提取关键点坐标
-    landmarks = sample['landmarks']
-    x = [lm['x'] for lm in landmarks]
-    y = [lm['y'] for lm in landmarks]
-    z = [lm['z'] for lm in landmarks]
-    
-    # 获取上下手指的指尖索引
-    finger_indices = {'thumb':4, 'index':8, 'middle':12, 'ring':16, 'pinky':20}
-    top_idx = finger_indices[sample['top_finger'].rstrip('1234')]  # 移除末尾数字
-    bottom_idx = finger_indices[sample['bottom_finger'].rstrip('1234')]
-    
-    fig = go.Figure()
-    
-    # 绘制所有关键点（灰色）
-    fig.add_trace(go.Scatter3d(
-        x=x, y=y, z=z,
-        mode='markers',
-        marker=dict(size=5, color='lightgray'),
-        name='All joints'
-    ))
-    
-    # 高亮上手指（红色）
-    fig.add_trace(go.Scatter3d(
-        x=[x[top_idx]], y=[y[top_idx]], z=[z[top_idx]],
-        mode='markers',
-        marker=dict(size=10, color='red'),
-        name=f"Top: {sample['top_finger']}"
-    ))
-    
-    # 高亮下手指（蓝色）
-    fig.add_trace(go.Scatter3d(
-        x=[x[bottom_idx]], y=[y[bottom_idx]], z=[z[bottom_idx]],
-        mode='markers',
-        marker=dict(size=10, color='blue'),
-        name=f"Bottom: {sample['bottom_finger']}"
-    ))
-    
-    # 添加连线
-    connections = mp.solutions.hands.HAND_CONNECTIONS
-    for conn in connections:
-        fig.add_trace(go.Scatter3d(
-            x=[x[conn[0]], x[conn[1]]],
-            y=[y[conn[0]], y[conn[1]]],
-            z=[z[conn[0]], z[conn[1]]],
-            mode='lines',
-            line=dict(color='gray', width=1),
-            showlegend=False
-        ))
-    
-    # 添加上下手指连线（虚线）
-    fig.add_trace(go.Scatter3d(
-        x=[x[top_idx], x[bottom_idx]],
-        y=[y[top_idx], y[bottom_idx]],
-        z=[z[top_idx], z[bottom_idx]],
-        mode='lines',
-        line=dict(color='purple', width=2, dash='dash'),
-        name='Overlap'
-    ))
-    
-    fig.update_layout(
-        title=f"Overlap: {sample['instruction']}",
-        scene=dict(
-            xaxis=dict(title='X', range=[0.4,0.9]),
-            yaxis=dict(title='Y', range=[0.4,0.9]),
-            zaxis=dict(title='Z', range=[-0.05,0.05]),
-            camera=dict(eye=dict(x=1.5, y=1.5, z=0.8))
-        ),
-        margin=dict(l=0, r=0, b=0, t=30)
+# data_visualization.py
+import numpy as np
+
+DEFAULT_SESSION = 'overlap_dataset/overlap_data_20250414_092037.json'
+
+# MediaPipe 手部关键点连线 (mediapipe.solutions.hands.HAND_CONNECTIONS)，
+# 在此列出以免为了画线加载 mediapipe
+HAND_CONNECTIONS = [
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+]
+
+# 覆盖上面全部连线的 5 条折线，-1 处断开：每只手只需 31 个点，
+# 所有手的骨架合并成一条线 trace，不再是每条连线一个 trace
+_BONE_PATH = np.array([
+    17, 0, 1, 2, 3, 4, -1,
+    0, 5, 6, 7, 8, -1,
+    5, 9, 10, 11, 12, -1,
+    9, 13, 14, 15, 16, -1,
+    13, 17, 18, 19, 20, -1,
+])
+
+def _path_connections(path):
+    """折线中相邻两点构成的连线（跳过 -1 断点）"""
+    return {tuple(sorted(pair)) for pair in zip(path[:-1], path[1:]) if -1 not in pair}
+
+# 折线必须恰好画出 HAND_CONNECTIONS 的全部连线，不多不少
+assert _path_connections(_BONE_PATH.tolist()) == {tuple(sorted(c)) for c in HAND_CONNECTIONS}
+assert len(HAND_CONNECTIONS) == 21
+
+# landmark_store.FINGERS 编码对应的指尖索引
+_TIP_INDICES = np.array([4, 8, 12, 16, 20])
+
+# 20 种有序 (上, 下) 手指组合的颜色（matplotlib tab20），未标注的样本为灰色
+PAIR_COLORS = [
+    '#1f77b4', '#aec7e8', '#ff7f0e', '#ffbb78', '#2ca02c', '#98df8a', '#d62728', '#ff9896', '#9467bd', '#c5b0d5',
+    '#8c564b', '#c49c94', '#e377c2', '#f7b6d2', '#7f7f7f', '#c7c7c7', '#bcbd22', '#dbdb8d', '#17becf', '#9edae5',
+]
+UNLABELED_COLOR = 'gray'
+
+def samples_to_arrays(samples):
+    """
+    Convert data_collection samples into (points (N, 21, 3), top, bottom),
+    with the fingers as landmark_store.FINGERS codes (-1 if unknown).
+    """
+    from feature_extraction import landmarks_to_array
+    from landmark_store import encode_fingers
+    samples = [s for s in samples if s.get('landmarks')]
+    points = np.array([landmarks_to_array(s['landmarks']) for s in samples]).reshape(-1, 21, 3)
+    return (points, encode_fingers([s.get('top_finger', '') for s in samples]),
+            encode_fingers([s.get('bottom_finger', '') for s in samples]))
+
+def _labeled(top, bottom):
+    return (top >= 0) & (top < 5) & (bottom >= 0) & (bottom < 5) & (top != bottom)
+
+def pair_name(top, bottom):
+    """"index2>thumb1" for finger codes, "none" for unlabeled samples."""
+    from landmark_store import FINGERS
+    return f"{FINGERS[top]}>{FINGERS[bottom]}" if _labeled(top, bottom) else 'none'
+
+def pair_color(top, bottom):
+    if not _labeled(top, bottom):
+        return UNLABELED_COLOR
+    return PAIR_COLORS[top * 4 + (bottom if bottom < top else bottom - 1)]
+
+def _xyz(points):
+    """(..., 3) 坐标 -> plotly 的 x, y, z 数组；NaN 处断线"""
+    # 保留 5 位小数（远超关键点精度），HTML 中的数字短约三分之二
+    points = np.round(points.reshape(-1, 3), 5)
+    return {'x': points[:, 0], 'y': points[:, 1], 'z': points[:, 2]}
+
+def bone_lines(points):
+    """x, y, z of the skeletons of (N, 21, 3) hands as one NaN-separated polyline."""
+    padded = np.concatenate([points, np.full((len(points), 1, 3), np.nan)], axis=1)
+    # -1 取到补上的 NaN 点
+    return _xyz(padded[:, _BONE_PATH])
+
+def _tips(points, codes):
+    labeled = (codes >= 0) & (codes < 5)
+    return points[np.flatnonzero(labeled), _TIP_INDICES[codes[labeled]]]
+
+def _overlap_lines(points, top, bottom):
+    labeled = np.flatnonzero(_labeled(top, bottom))
+    segments = np.full((len(labeled), 3, 3), np.nan)
+    segments[:, 0] = points[labeled, _TIP_INDICES[top[labeled]]]
+    segments[:, 1] = points[labeled, _TIP_INDICES[bottom[labeled]]]
+    return _xyz(segments)
+
+def _marker_traces(points, top, bottom):
+    """关键点（灰色）、上手指指尖（红色）、下手指指尖（蓝色）和上下指尖连线（虚线）"""
+    return [
+        dict(type='scatter3d', mode='markers', name='All joints', **_xyz(points),
+             marker=dict(size=3 if len(points) > 1 else 5, color='lightgray')),
+        dict(type='scatter3d', mode='markers', name='Top finger', **_xyz(_tips(points, top)),
+             marker=dict(size=6 if len(points) > 1 else 10, color='red')),
+        dict(type='scatter3d', mode='markers', name='Bottom finger', **_xyz(_tips(points, bottom)),
+             marker=dict(size=6 if len(points) > 1 else 10, color='blue')),
+        dict(type='scatter3d', mode='lines', name='Overlap', **_overlap_lines(points, top, bottom),
+             line=dict(color='purple', width=2, dash='dash')),
+    ]
+
+def _scene(points):
+    if not points.size:
+        # 没有样本：坐标范围交给 plotly 自动决定
+        return dict(xaxis=dict(title='X'), yaxis=dict(title='Y'), zaxis=dict(title='Z'),
+                    camera=dict(eye=dict(x=1.5, y=1.5, z=0.8)))
+    # 所有样本共用的坐标范围，浏览时坐标轴不会跳动
+    lo, hi = points.reshape(-1, 3).min(axis=0), points.reshape(-1, 3).max(axis=0)
+    pad = np.maximum((hi - lo) * 0.05, 1e-3)
+    return dict(
+        xaxis=dict(title='X', range=[lo[0] - pad[0], hi[0] + pad[0]]),
+        yaxis=dict(title='Y', range=[lo[1] - pad[1], hi[1] + pad[1]]),
+        zaxis=dict(title='Z', range=[lo[2] - pad[2], hi[2] + pad[2]]),
+        camera=dict(eye=dict(x=1.5, y=1.5, z=0.8)),
+    )
+
+def overlay_figure(points, top, bottom, title=None):
+    """
+    All hands in one scene: one skeleton trace per (top, bottom) pair, colored
+    by the pair (click the legend to hide a pair), plus the merged marker
+    traces. The number of traces does not grow with the number of hands.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 21, 3)
+    top, bottom = np.asarray(top), np.asarray(bottom)
+    keys = np.where(_labeled(top, bottom), top * 5 + bottom, -1)
+    traces = []
+    for key in np.unique(keys):
+        rows = np.flatnonzero(keys == key)
+        t, b = (top[rows[0]], bottom[rows[0]]) if key >= 0 else (-1, -1)
+        traces.append(dict(type='scatter3d', mode='lines', name=f"{pair_name(t, b)} ({len(rows)})",
+                           **bone_lines(points[rows]), line=dict(color=pair_color(t, b), width=1)))
+    traces += _marker_traces(points, top, bottom)
+    return dict(data=traces, layout=dict(
+        title=title or f"{len(points)} samples", scene=_scene(points), margin=dict(l=0, r=0, b=0, t=30)))
+
+def browse_figure(points, top, bottom, titles=None):
+    """
+    One hand at a time with a slider over all of them. Every sample is an
+    animation frame restyling the same five traces, so the page holds one
+    scene however many samples there are.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 21, 3)
+    top, bottom = np.asarray(top), np.asarray(bottom)
+    titles = titles or [f"#{i}: {pair_name(t, b)}" for i, (t, b) in enumerate(zip(top, bottom))]
+    frames = []
+    for i in range(len(points)):
+        hand, t, b = points[i:i + 1], top[i:i + 1], bottom[i:i + 1]
+        bones = dict(type='scatter3d', mode='lines', name='Bones', **bone_lines(hand),
+                     line=dict(color=pair_color(t[0], b[0]), width=2))
+        frames.append(dict(name=str(i), data=[bones] + _marker_traces(hand, t, b),
+                           layout=dict(title=dict(text=titles[i]))))
+    steps = [dict(method='animate', label=str(i),
+                  args=[[str(i)], dict(mode='immediate', frame=dict(duration=0, redraw=True),
+                                       transition=dict(duration=0))])
+             for i in range(len(frames))]
+    layout = dict(
+        title=dict(text=titles[0] if titles else ''), scene=_scene(points), margin=dict(l=0, r=0, b=0, t=30),
+        sliders=[dict(active=0, steps=steps, currentvalue=dict(prefix='Sample '))],
     )
-    fig.show()
+    return dict(data=frames[0]['data'] if frames else [], layout=layout, frames=frames)
+
+def write_figure(fig, path, include_plotlyjs=True):
+    """
+    Write a figure without a display: HTML for *.html (include_plotlyjs='cdn'
+    for a small file that loads plotly.js online), otherwise a static image in
+    the format of the extension (needs kaleido).
+    """
+    import plotly.io as pio
+    # 图是按 plotly 格式直接构造的 dict，跳过逐属性校验
+    if path.endswith('.html'):
+        pio.write_html(fig, path, include_plotlyjs=include_plotlyjs, auto_play=False, validate=False)
+    else:
+        pio.write_image(fig, path, validate=False)
+
+def show_figure(fig):
+    import plotly.io as pio
+    pio.show(fig, validate=False, auto_play=False)
+
+def plot_overlap_3d(sample, output=None):
+    """Plot one sample; writes it to output (see write_figure) instead of showing it when given."""
+    points, top, bottom = samples_to_arrays([sample])
+    fig = browse_figure(points, top, bottom, titles=[f"Overlap: {sample['instruction']}"])
+    # 单个样本不需要滑块
+    del fig['layout']['sliders'], fig['frames']
+    if output:
+        write_figure(fig, output)
+    else:
+        show_figure(fig)
+    return fig
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from feature_cache import read_session_arrays
+    from landmark_store import encode_fingers
+
+    parser = argparse.ArgumentParser(description="Plot recorded hands in 3D, colored by their top/bottom finger labels.")
+    parser.add_argument('session', nargs='?', default=DEFAULT_SESSION, help="Session file (.json, .jsonl) or landmark store (.lmk)")
+    parser.add_argument('--mode', choices=['browse', 'overlay'], default='browse',
+                        help="browse: one sample at a time with a slider; overlay: all samples in one scene")
+    parser.add_argument('--limit', type=int, default=None, help="Plot at most this many samples")
+    parser.add_argument('--sample', type=int, default=None, help="Plot this many random samples")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--top', default=None, help="Only samples with this top finger")
+    parser.add_argument('--bottom', default=None, help="Only samples with this bottom finger")
+    parser.add_argument('--output', default=None, help="Write to this .html/.png/.svg/.pdf file instead of opening a browser")
+    parser.add_argument('--cdn', action='store_true', help="Load plotly.js from a CDN instead of embedding it in the HTML")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # 加载数据
+    points, labels = read_session_arrays(args.session)
+    top, bottom = labels['top_finger'], labels['bottom_finger']
+    rows = np.arange(len(points))
+    for column, wanted in ((top, args.top), (bottom, args.bottom)):
+        if wanted is not None:
+            rows = rows[column[rows] == encode_fingers([wanted])[0]]
+    if args.sample is not None:
+        rows = np.sort(np.random.default_rng(args.seed).permutation(rows)[:args.sample])
+    rows = rows[:args.limit]
+    if not len(rows):
+        parser.exit(1, f"No samples in {args.session} match the given filters\n")
 
-# 可视化第一个样本
-plot_overlap_3d(data[0])
\ No newline at end of file
+    make_figure = browse_figure if args.mode == 'browse' else overlay_figure
+    fig = make_figure(points[rows], top[rows], bottom[rows])
+    if args.output:
+        write_figure(fig, args.output, include_plotlyjs='cdn' if args.cdn else True)
+        print(f"{len(rows)} samples written to {args.output} in {time.perf_counter() - start:.2f}s")
+    else:
+        show_figure(fig)
@@ -0,0 +1,326 @@
+# dataset_index.py
+"""
+Incremental index of the recorded sessions in a data directory.
+
+For every session file (.json, .jsonl) and landmark store (.lmk) the index
+keeps where each sample is (its byte range in the file, or its row in the
+store), its labels, a histogram of (top, bottom) finger pairs and a content
+hash. Samples can be filtered and drawn at random or balanced across finger
+pairs from the index alone; load() then reads just the selected samples.
+
+Updates are incremental: unchanged files are skipped, and a JSON Lines session
+that only grew since it was indexed (data_collection appends to it) has only
+its new records parsed. data_collection updates the index when a session ends.
+
+Layout of <data_dir>/.dataset_index/:
+  - manifest.json:     size, mtime, hash, count and pair histogram of every
+                       session, and for JSON Lines sessions the offset (and
+                       prefix hash) after the last good record to resume from
+  - sessions/<id>.npz: start/end offsets and label columns of one session's samples
+
+    python dataset_index.py overlap_dataset --sample 200 --balanced
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from feature_cache import LABEL_COLUMNS, find_sessions
+from feature_extraction import landmarks_to_array
+from landmark_store import COLUMNS, FINGERS, decode_fingers, encode_fingers, is_store, open_store, overlap_label
+from session_writer import SESSION_SUFFIX, iter_session_records, read_record
+
+INDEX_DIR_NAME = ".dataset_index"
+INDEX_VERSION = 2
+
+def _content_hash(path, prefix_size=None):
+    """
+    blake2b hash of a session file (or of the columns of a store). With
+    prefix_size, also return the hash of the first prefix_size bytes.
+    """
+    if is_store(path):
+        h = hashlib.blake2b(digest_size=16)
+        for name in COLUMNS:
+            with open(os.path.join(path, name + ".npy"), "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+        return h.hexdigest(), None
+    h = hashlib.blake2b(digest_size=16)
+    prefix = None
+    with open(path, "rb") as f:
+        if prefix_size is not None:
+            remaining = prefix_size
+            while remaining:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                h.update(block)
+                remaining -= len(block)
+            prefix = h.hexdigest()
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest(), prefix
+
+def _stamp(path):
+    # Stores are directories; their landmark column is what changes when rewritten.
+    stat = os.stat(os.path.join(path, "landmarks.npy") if is_store(path) else path)
+    return stat.st_size, stat.st_mtime
+
+def _index_records(path, start=0):
+    """Offsets and label columns of the samples of a session file from byte offset start."""
+    starts, ends, overlap, top, bottom, valid = [], [], [], [], [], []
+    try:
+        for record_start, record_end, sample in iter_session_records(path, start=start):
+            landmarks = sample.get("landmarks")
+            starts.append(record_start)
+            ends.append(record_end)
+            overlap.append(overlap_label(sample))
+            top.append(sample.get("top_finger", ""))
+            bottom.append(sample.get("bottom_finger", ""))
+            valid.append(isinstance(landmarks, list) and len(landmarks) == 21)
+    except ValueError:
+        # A truncated JSON list: index the samples before the damage, as read_session does.
+        pass
+    return {
+        "start": np.array(starts, dtype=np.int64),
+        "end": np.array(ends, dtype=np.int64),
+        "overlap": np.array(overlap, dtype=np.int8),
+        "top_finger": encode_fingers(top),
+        "bottom_finger": encode_fingers(bottom),
+        "valid": np.array(valid, dtype=bool),
+    }
+
+def _index_store(path):
+    """Rows and label columns of a landmark store; start/end are row numbers."""
+    store = open_store(path)
+    rows = np.arange(len(store["overlap"]), dtype=np.int64)
+    columns = {name: np.asarray(store[name]) for name in LABEL_COLUMNS}
+    columns.update(start=rows, end=rows + 1, valid=np.ones(len(rows), dtype=bool))
+    return columns
+
+def pair_histogram(top_finger, bottom_finger):
+    """Counts of "top>bottom" finger pairs (e.g. "index2>thumb1"), "none" for unlabeled samples."""
+    keys = (np.asarray(top_finger, dtype=np.int64) + 1) * (len(FINGERS) + 1) + np.asarray(bottom_finger) + 1
+    values, counts = np.unique(keys, return_counts=True)
+    histogram = {}
+    for key, count in zip(values.tolist(), counts.tolist()):
+        top, bottom = decode_fingers([key // (len(FINGERS) + 1) - 1, key % (len(FINGERS) + 1) - 1])
+        name = f"{top}>{bottom}" if top and bottom else "none"
+        histogram[name] = histogram.get(name, 0) + count
+    return histogram
+
+class DatasetIndex:
+    """Index of all sessions in one data directory."""
+    def __init__(self, data_dir="overlap_dataset"):
+        self.data_dir = data_dir
+        self.dir = os.path.join(data_dir, INDEX_DIR_NAME)
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        self.sessions = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == INDEX_VERSION:
+                self.sessions = manifest["sessions"]
+        self._table = None
+
+    def _columns_file(self, name):
+        key = hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.dir, "sessions", key + ".npz")
+
+    def _load_columns(self, name):
+        with np.load(self._columns_file(name)) as data:
+            return {key: data[key] for key in data.files}
+
+    def update(self):
+        """
+        Index new and changed sessions and drop deleted ones.
+        Returns the names (paths relative to data_dir) of the sessions (re)indexed.
+        """
+        os.makedirs(os.path.join(self.dir, "sessions"), exist_ok=True)
+        names = [os.path.relpath(path, self.data_dir) for path in find_sessions(self.data_dir)]
+        changed = []
+        for name in set(self.sessions) - set(names):
+            del self.sessions[name]
+            if os.path.exists(self._columns_file(name)):
+                os.remove(self._columns_file(name))
+
+        for name in names:
+            path = os.path.join(self.data_dir, name)
+            size, mtime = _stamp(path)
+            entry = self.sessions.get(name)
+            if entry and entry["size"] == size and entry["mtime"] == mtime:
+                continue
+
+            columns = None
+            if is_store(path):
+                digest, _ = _content_hash(path)
+                columns = _index_store(path)
+            elif entry and name.endswith(SESSION_SUFFIX) and size >= entry["indexed"]:
+                # Append-only session: if the indexed part is unchanged, only parse the records after it.
+                digest, prefix = _content_hash(path, entry["indexed"])
+                if prefix == entry["indexed_hash"]:
+                    old = self._load_columns(name)
+                    new = _index_records(path, start=entry["indexed"])
+                    columns = {key: np.concatenate([old[key], new[key]]) for key in old}
+            else:
+                digest, _ = _content_hash(path)
+            if entry and digest == entry["hash"] and os.path.exists(self._columns_file(name)):
+                # Touched but identical content.
+                entry.update(size=size, mtime=mtime)
+                continue
+            if columns is None:
+                columns = _index_records(path)
+
+            np.savez(self._columns_file(name), **columns)
+            indexed = size
+            if name.endswith(SESSION_SUFFIX):
+                indexed = int(columns["end"][-1]) if len(columns["end"]) else 0
+            self.sessions[name] = {
+                "size": size,
+                "mtime": mtime,
+                "hash": digest,
+                # A partial trailing record is left out, so a growing file resumes at its last good record.
+                "indexed": indexed,
+                "indexed_hash": digest if indexed == size else _content_hash(path, indexed)[1],
+                "count": len(columns["start"]),
+                "valid": int(columns["valid"].sum()),
+                "histogram": pair_histogram(columns["top_finger"][columns["valid"]],
+                                            columns["bottom_finger"][columns["valid"]]),
+            }
+            changed.append(name)
+        self._table = None
+        return changed
+
+    def save(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "sessions": self.sessions}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def names(self):
+        """Indexed session names, in the order their samples appear in table."""
+        return sorted(self.sessions)
+
+    @property
+    def table(self):
+        """All indexed samples: the label and offset columns plus "session" (index into names)."""
+        if self._table is None:
+            parts = [self._load_columns(name) for name in self.names]
+            keys = ("start", "end", "valid") + LABEL_COLUMNS
+            self._table = {key: np.concatenate([p[key] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+                           for key in keys}
+            self._table["session"] = np.concatenate(
+                [np.full(len(p["start"]), i, dtype=np.int32) for i, p in enumerate(parts)]
+            ) if parts else np.empty(0, dtype=np.int32)
+        return self._table
+
+    def __len__(self):
+        return sum(entry["count"] for entry in self.sessions.values())
+
+    def histogram(self):
+        """Pair histogram of all valid samples, summed from the manifest."""
+        total = {}
+        for entry in self.sessions.values():
+            for pair, count in entry["histogram"].items():
+                total[pair] = total.get(pair, 0) + count
+        return total
+
+    def select(self, top_finger=None, bottom_finger=None, overlap=None, sessions=None):
+        """
+        Indices of the valid samples matching every given filter. Finger and
+        session filters take a name or a list of names.
+        """
+        table = self.table
+        mask = table["valid"].astype(bool)
+        for column, wanted in (("top_finger", top_finger), ("bottom_finger", bottom_finger)):
+            if wanted is not None:
+                wanted = [wanted] if isinstance(wanted, str) else wanted
+                mask &= np.isin(table[column], encode_fingers(wanted))
+        if overlap is not None:
+            mask &= table["overlap"] == int(overlap)
+        if sessions is not None:
+            sessions = [sessions] if isinstance(sessions, str) else sessions
+            mask &= np.isin(table["session"], [self.names.index(name) for name in sessions])
+        return np.flatnonzero(mask)
+
+    def sample(self, n, balanced=False, seed=None, **filters):
+        """
+        Up to n random sample indices among those matching filters (see select).
+        balanced draws round-robin across (top, bottom) pairs, so every pair
+        is equally represented until the rarer ones run out.
+        """
+        candidates = self.select(**filters)
+        rng = np.random.default_rng(seed)
+        candidates = rng.permutation(candidates)
+        if balanced:
+            table = self.table
+            pairs = table["top_finger"][candidates].astype(np.int64) * 8 + table["bottom_finger"][candidates]
+            # Rank of each candidate within its (shuffled) pair; taking ranks 0, 1, ... interleaves the pairs.
+            order = np.argsort(pairs, kind="stable")
+            sorted_pairs = pairs[order]
+            group_start = np.r_[0, np.flatnonzero(np.diff(sorted_pairs)) + 1]
+            ranks = np.empty(len(candidates), dtype=np.int64)
+            ranks[order] = np.arange(len(candidates)) - np.repeat(group_start, np.diff(np.r_[group_start, len(candidates)]))
+            candidates = candidates[np.argsort(ranks, kind="stable")]
+        # Sorted, so the selected samples are read in file order.
+        return np.sort(candidates[:n])
+
+    def load(self, indices):
+        """
+        Read the given samples only. Returns (points (n, 21, 3), labels) with
+        labels a dict of LABEL_COLUMNS arrays, in the order of indices.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        table = self.table
+        points = np.empty((len(indices), 21, 3))
+        sessions = table["session"][indices]
+        for session in np.unique(sessions):
+            positions = np.flatnonzero(sessions == session)
+            rows = indices[positions]
+            path = os.path.join(self.data_dir, self.names[session])
+            if is_store(path):
+                points[positions] = open_store(path)["landmarks"][table["start"][rows]]
+                continue
+            with open(path, "rb") as f:
+                for position, start, end in zip(positions, table["start"][rows], table["end"][rows]):
+                    points[position] = landmarks_to_array(read_record(f, start, end)["landmarks"])
+        return points, {name: table[name][indices] for name in LABEL_COLUMNS}
+
+def update_index(data_dir="overlap_dataset"):
+    """Bring the index of data_dir up to date and return it."""
+    index = DatasetIndex(data_dir)
+    index.update()
+    index.save()
+    return index
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Update and query the dataset index of a data directory.")
+    parser.add_argument("data_dir", nargs="?", default="overlap_dataset")
+    parser.add_argument("--sample", type=int, default=0, help="Draw and load this many samples")
+    parser.add_argument("--balanced", action="store_true", help="Balance the draw across finger pairs")
+    parser.add_argument("--top", default=None, help="Only samples with this top finger")
+    parser.add_argument("--bottom", default=None, help="Only samples with this bottom finger")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = DatasetIndex(args.data_dir)
+    changed = index.update()
+    index.save()
+    print(f"{len(index)} samples in {len(index.sessions)} sessions, {len(changed)} (re)indexed "
+          f"in {time.perf_counter() - start:.3f}s")
+    for name in index.names:
+        entry = index.sessions[name]
+        print(f"  {name}: {entry['valid']}/{entry['count']} valid, hash {entry['hash']}")
+    print(f"Pairs: {json.dumps(index.histogram(), sort_keys=True)}")
+
+    if args.sample:
+        start = time.perf_counter()
+        indices = index.sample(args.sample, args.balanced, args.seed, top_finger=args.top, bottom_finger=args.bottom)
+        points, labels = index.load(indices)
+        print(f"Loaded {len(points)} samples in {time.perf_counter() - start:.3f}s")
+        print(f"Sample pairs: {json.dumps(pair_histogram(labels['top_finger'], labels['bottom_finger']), sort_keys=True)}")
@@ -0,0 +1,221 @@
+# feature_cache.py
+"""
+Persistent on-disk cache of extracted feature vectors.
+
+Features are keyed by a hash of each sample's raw landmarks, under a version
+derived from the source of feature_extraction.py, so editing the feature set
+automatically invalidates the cache. Session files in the data directory
+(.json, .jsonl and .lmk landmark stores) are tracked by size and mtime: an
+unchanged session is not even re-read, and only samples with unseen landmarks
+go through feature extraction. Repeated training runs over a growing archive
+therefore only pay for the new samples.
+
+Layout of <data_dir>/.feature_cache/<version>/:
+  - chunk_<n>.npz:     keys and features added by one update
+  - sessions/<id>.npz: landmark keys and label columns of one session file
+  - sessions.json:     size/mtime/count of every indexed session file
+"""
+import glob
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import numpy as np
+import feature_extraction
+from feature_extraction import extract_features_batch, landmarks_to_array
+from landmark_store import STORE_SUFFIX, encode_fingers, is_partial_store, is_store, open_store, overlap_label
+from session_writer import SESSION_SUFFIX, load_session
+
+CACHE_DIR_NAME = ".feature_cache"
+KEY_DTYPE = "S16"
+LABEL_COLUMNS = ("overlap", "top_finger", "bottom_finger")
+
+# Formats of one session, preferred first. landmark_store and convert_sessions
+# write <session>.lmk next to <session>.json(l) by default, holding the same samples.
+SESSION_SUFFIXES = (STORE_SUFFIX, SESSION_SUFFIX, ".json")
+
+def feature_version():
+    """Version string of the current feature extractor definition."""
+    source = inspect.getsource(feature_extraction).encode("utf-8")
+    return hashlib.sha1(source).hexdigest()[:16]
+
+def landmark_keys(points):
+    """Content hash (16 bytes) of every (21, 3) hand in an (N, 21, 3) array."""
+    points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 21 * 3)
+    return np.array([hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in points], dtype=KEY_DTYPE)
+
+def find_sessions(data_dir):
+    """
+    Session files and landmark stores in data_dir, in name order, one per
+    session name: a store over a .jsonl over a .json file of the same name, so
+    a converted session is not loaded twice. Partial (CSV-derived) stores are
+    skipped: the loaders cannot use them (see landmark_store).
+    """
+    found = {}
+    for rank, suffix in enumerate(SESSION_SUFFIXES):
+        for path in glob.glob(os.path.join(data_dir, "*" + suffix)):
+            if path.endswith(".manifest.json") or is_partial_store(path):
+                continue
+            name = path[:-len(suffix)]
+            if name not in found or rank < found[name][0]:
+                found[name] = (rank, path)
+    return sorted(path for _, path in found.values())
+
+def read_session_arrays(path):
+    """
+    Return (points (N, 21, 3), labels) for a session file or landmark store,
+    where labels maps each of LABEL_COLUMNS to an int8 (N,) array (finger
+    columns hold landmark_store.FINGERS codes).
+    """
+    if is_store(path):
+        store = open_store(path)
+        return (np.asarray(store["landmarks"], dtype=np.float64),
+                {name: np.asarray(store[name]) for name in LABEL_COLUMNS})
+    samples = [s for s in load_session(path) if s.get("landmarks")]
+    points = np.array([landmarks_to_array(s["landmarks"]) for s in samples]).reshape(-1, 21, 3)
+    return points, {
+        "overlap": np.array([overlap_label(s) for s in samples], dtype=np.int8),
+        "top_finger": encode_fingers([s.get("top_finger", "") for s in samples]),
+        "bottom_finger": encode_fingers([s.get("bottom_finger", "") for s in samples]),
+    }
+
+def _session_stamp(path):
+    # Stores are directories; their landmark column is what changes when rewritten.
+    stat = os.stat(os.path.join(path, "landmarks.npy") if os.path.isdir(path) else path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+class FeatureCache:
+    """Feature vectors of previously seen landmark sets for one feature version."""
+    def __init__(self, data_dir, version=None):
+        self.version = version or feature_version()
+        root = os.path.join(data_dir, CACHE_DIR_NAME)
+        self.dir = os.path.join(root, self.version)
+        os.makedirs(os.path.join(self.dir, "sessions"), exist_ok=True)
+
+        # Caches written by other versions of the feature extractor are stale.
+        for name in os.listdir(root):
+            if name != self.version:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+        self.rows = {}
+        self.chunks = []
+        self.chunk_count = 0
+        for chunk_path in sorted(glob.glob(os.path.join(self.dir, "chunk_*.npz"))):
+            with np.load(chunk_path) as chunk:
+                self._index(chunk["keys"], chunk["features"])
+            self.chunk_count += 1
+
+        manifest_path = os.path.join(self.dir, "sessions.json")
+        self.sessions = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.sessions = json.load(f)
+
+    def _index(self, keys, features):
+        offset = sum(len(c) for c in self.chunks)
+        for row, key in enumerate(keys.tolist()):
+            self.rows.setdefault(key, offset + row)
+        self.chunks.append(features)
+
+    def _session_file(self, path):
+        name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.dir, "sessions", name + ".npz")
+
+    def add(self, keys, features):
+        """Store features for new keys as a new chunk."""
+        if not len(keys):
+            return
+        np.savez(os.path.join(self.dir, f"chunk_{self.chunk_count:05d}.npz"), keys=keys, features=features)
+        self.chunk_count += 1
+        self._index(keys, features)
+
+    def features(self, keys):
+        """Cached features for keys (all of which must be present)."""
+        table = np.concatenate(self.chunks) if len(self.chunks) != 1 else self.chunks[0]
+        self.chunks = [table]
+        return table[[self.rows[key] for key in keys.tolist()]].reshape(len(keys), -1)
+
+    def load_session(self, path):
+        """
+        Return (keys, labels) for a session file, extracting features for any
+        landmarks not seen before. labels is a dict of LABEL_COLUMNS arrays.
+        """
+        stamp = _session_stamp(path)
+        session_file = self._session_file(path)
+        if self.sessions.get(path, {}).get("stamp") == stamp and os.path.exists(session_file):
+            with np.load(session_file) as cached:
+                keys = cached["keys"]
+                labels = {name: cached[name] for name in LABEL_COLUMNS if name in cached.files}
+            if len(labels) == len(LABEL_COLUMNS) and all(key in self.rows for key in keys.tolist()):
+                return keys, labels
+
+        points, labels = read_session_arrays(path)
+        keys = landmark_keys(points)
+        new = np.array([key not in self.rows for key in keys.tolist()], dtype=bool)
+        # Identical landmarks within the new batch only need extracting once.
+        new_keys, first = np.unique(keys[new], return_index=True)
+        self.add(new_keys, extract_features_batch(points[new][first]))
+
+        np.savez(session_file, keys=keys, **labels)
+        self.sessions[path] = {"stamp": stamp, "count": len(keys)}
+        return keys, labels
+
+    def save(self):
+        with open(os.path.join(self.dir, "sessions.json"), "w") as f:
+            json.dump(self.sessions, f, indent=2)
+
+def load_cached_dataset(data_dir="overlap_dataset", sessions=None):
+    """
+    Return a dict with the feature matrix "X", the LABEL_COLUMNS label arrays
+    and "session" (index of each sample's session file in "sessions") for all
+    sessions in data_dir, or the given session paths. Features are computed
+    only for landmarks missing from the cache.
+    """
+    cache = FeatureCache(data_dir)
+    paths = list(sessions) if sessions is not None else find_sessions(data_dir)
+    all_keys = []
+    all_labels = {name: [] for name in LABEL_COLUMNS}
+    session_ids = []
+    for index, path in enumerate(paths):
+        keys, labels = cache.load_session(path)
+        all_keys.append(keys)
+        for name in LABEL_COLUMNS:
+            all_labels[name].append(labels[name])
+        session_ids.append(np.full(len(keys), index, dtype=np.int32))
+    cache.save()
+
+    if not all_keys:
+        dataset = {name: np.empty(0, dtype=np.int8) for name in LABEL_COLUMNS}
+        dataset.update(X=np.empty((0, feature_extraction.NUM_FEATURES)),
+                       session=np.empty(0, dtype=np.int32), sessions=paths)
+        return dataset
+    dataset = {name: np.concatenate(arrays) for name, arrays in all_labels.items()}
+    dataset.update(X=cache.features(np.concatenate(all_keys)),
+                   session=np.concatenate(session_ids), sessions=paths)
+    return dataset
+
+def load_cached_features(data_dir="overlap_dataset", sessions=None):
+    """
+    Return (X, y) for all sessions in data_dir (or the given session paths),
+    where y is the overlap label, computing features only for landmarks
+    missing from the cache.
+    """
+    dataset = load_cached_dataset(data_dir, sessions)
+    return dataset["X"], dataset["overlap"]
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Update the feature cache for a data directory.")
+    parser.add_argument("data_dir", nargs="?", default="overlap_dataset")
+    parser.add_argument("--export", action="store_true", help="Also write features.npy and labels.npy")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    X, y = load_cached_features(args.data_dir)
+    print(f"Features shape: {X.shape} ({time.perf_counter() - start:.3f}s, version {feature_version()})")
+    if args.export:
+        np.save("features.npy", X)
+        np.save("labels.npy", y)
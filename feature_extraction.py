@@ -1,5 +1,42 @@
 # feature_extraction.py
 import numpy as np
+from geometry import GEOMETRY_GROUPS, geometry_features
+
+# Finger tip landmark indices (thumb, index, middle, ring, pinky).
+TIP_INDICES = [4, 8, 12, 16, 20]
+
+# Landmark triplet (p1, p2, p3) whose angle at p2 is used as a feature.
+ANGLE_JOINT = (5, 6, 7)
+
+# Every unordered pair of finger tips, in the order used by the feature vector.
+_TIP_PAIRS = np.array([(i, j) for a, i in enumerate(TIP_INDICES) for j in TIP_INDICES[a + 1:]])
+
+# Coordinate axes whose range is reported, in order: xy-plane (x, y),
+# xz-plane (x, z) and zy-plane (y, z).
+_PROJECTION_AXES = np.array([0, 1, 0, 2, 1, 2])
+
+NUM_FEATURES = 1 + len(_TIP_PAIRS) + len(_PROJECTION_AXES)
+
+# Column ranges of each feature group in the feature vector.
+FEATURE_GROUPS = {
+    "angle": slice(0, 1),
+    "tip_distances": slice(1, 1 + len(_TIP_PAIRS)),
+    "ranges": slice(1 + len(_TIP_PAIRS), NUM_FEATURES),
+}
+
+def feature_columns(groups):
+    """Column indices of the given feature groups, in feature-vector order."""
+    return np.concatenate([np.arange(NUM_FEATURES)[FEATURE_GROUPS[g]] for g in FEATURE_GROUPS if g in groups])
+
+def num_features(extra_groups=()):
+    """Length of the feature vector with the given optional geometry.GEOMETRY_GROUPS appended."""
+    return NUM_FEATURES + sum(GEOMETRY_GROUPS[g] for g in extra_groups)
+
+def landmarks_to_array(landmarks):
+    """
+    Convert 21 landmarks (each a dict with x, y, z) into a (21, 3) float array.
+    """
+    return np.array([[lm['x'], lm['y'], lm['z']] for lm in landmarks], dtype=np.float64)
 
 def normalize_landmarks(landmarks):
     """
@@ -29,14 +66,20 @@ def compute_angle(p1, p2, p3):
     angle = np.arccos(np.clip(dot_prod / norm_prod, -1.0, 1.0))
     return angle
 
-def extract_features_from_landmarks(landmarks):
+def extract_features_from_landmarks(landmarks, extra_groups=()):
     """
     Given 21 hand landmarks (each a dict with x, y, z), return a feature vector.
     Features include:
       - Angles (e.g. the angle at the index finger’s joint)
       - Pairwise distances between finger tips
       - Projection spread (range) on the xy, xz, and zy planes
+    followed by the optional geometry groups in extra_groups (see
+    extract_features_batch).
     """
+    if extra_groups:
+        # The batch path on one hand is cheaper than the loop below, which
+        # keeps the richer vector within the cost of the single-angle one.
+        return extract_features_batch(landmarks_to_array(landmarks)[None], extra_groups)[0]
     points = normalize_landmarks(landmarks)
     features = []
     
@@ -45,7 +88,7 @@ def extract_features_from_landmarks(landmarks):
     features.append(angle_index)
     
     # Compute distances between each pair of finger tips (indices: 4, 8, 12, 16, 20)
-    tip_indices = [4, 8, 12, 16, 20]
+    tip_indices = TIP_INDICES
     for i in range(len(tip_indices)):
         for j in range(i+1, len(tip_indices)):
             dist = np.linalg.norm(points[tip_indices[i]] - points[tip_indices[j]])
@@ -64,3 +107,75 @@ def extract_features_from_landmarks(landmarks):
     features.append(np.ptp(zy_proj[:, 1]))  # range in z on zy-plane
     
     return np.array(features)
+
+
+def _rowwise_dot(a, b):
+    """
+    Dot product over the last axis of two equally shaped arrays.
+    Uses matmul so each result is accumulated the same way as np.dot on a
+    single vector, keeping batch results bit-identical to the per-sample path.
+    """
+    return (a[..., None, :] @ b[..., :, None])[..., 0, 0]
+
+def _rowwise_norm(a):
+    """Euclidean norm over the last axis, matching np.linalg.norm on a vector."""
+    return np.sqrt(_rowwise_dot(a, a))
+
+def normalize_landmarks_batch(points):
+    """
+    Vectorized normalize_landmarks for an (N, 21, 3) array of landmarks.
+    Every hand is translated so its wrist is at the origin and scaled by its
+    own maximum distance; hands with a zero scale are left unscaled.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    normalized = points - points[:, :1, :]
+    scale = np.linalg.norm(normalized, axis=2).max(axis=1, initial=0.0)
+    scale[scale == 0] = 1.0
+    return normalized / scale[:, None, None]
+
+def compute_angle_batch(p1, p2, p3):
+    """
+    Vectorized compute_angle for (N, 3) arrays of points.
+    Returns the (N,) angles at p2 in radians; degenerate joints give 0.0.
+    """
+    v1 = p1 - p2
+    v2 = p3 - p2
+    dot_prod = _rowwise_dot(v1, v2)
+    norm_prod = _rowwise_norm(v1) * _rowwise_norm(v2)
+    valid = norm_prod != 0
+    cosine = np.divide(dot_prod, norm_prod, out=np.zeros_like(dot_prod), where=valid)
+    angle = np.arccos(np.clip(cosine, -1.0, 1.0))
+    angle[~valid] = 0.0
+    return angle
+
+def extract_features_batch(points, extra_groups=()):
+    """
+    Vectorized extract_features_from_landmarks.
+
+    Takes an (N, 21, 3) array of raw landmark coordinates and returns the
+    (N, num_features(extra_groups)) feature matrix in a single pass, with the
+    same feature order and values as the per-sample function:
+      - Angle at the index finger's joint
+      - Pairwise distances between finger tips
+      - Projection spread (range) on the xy, xz, and zy planes
+      - Optionally, after these, the geometry.GEOMETRY_GROUPS named in
+        extra_groups (all 15 joint angles, bone lengths, finger directions,
+        palm orientation) of the normalized hands, in GEOMETRY_GROUPS order
+    """
+    points = normalize_landmarks_batch(points)
+    n = points.shape[0]
+    features = np.empty((n, num_features(extra_groups)))
+    if n == 0:
+        return features
+    if extra_groups:
+        geometry_features(points, extra_groups, out=features[:, NUM_FEATURES:])
+
+    features[:, 0] = compute_angle_batch(*(points[:, i] for i in ANGLE_JOINT))
+
+    tip_pairs = points.take(_TIP_PAIRS[:, 0], axis=1) - points.take(_TIP_PAIRS[:, 1], axis=1)
+    features[:, 1:1 + len(_TIP_PAIRS)] = _rowwise_norm(tip_pairs)
+
+    # Peak-to-peak of each axis, repeated per projection plane.
+    ranges = points.max(axis=1) - points.min(axis=1)
+    features[:, 1 + len(_TIP_PAIRS):NUM_FEATURES] = ranges[:, _PROJECTION_AXES]
+    return features
@@ -0,0 +1,199 @@
+# forest_export.py
+"""
+Compact array export of trained random forests for per-frame inference.
+
+export_forest flattens every tree of a fitted sklearn RandomForestClassifier
+into shared node arrays (feature, threshold, children, leaf probabilities).
+CompiledForest walks all trees at once with no sklearn input validation or
+per-tree Python calls: a single frame advances every tree by one level per
+step, gathering and testing only the node each tree is on, and stops once
+every tree has reached a leaf. Its cost is a few numpy calls per level of the
+deepest path the frame takes, whatever the total node count. benchmark.py
+measures ~75 us per frame for a 100-tree forest grown on 500 samples (depth
+19, forest_predict_one) and ~200 us for one grown on 20k noisy samples (depth
+52, ~940k nodes, forest_predict_one_large), which is still above the 100 us
+per-frame goal. Predictions and probabilities match the original model.
+
+    compiled = export_forest(clf)
+    save_forest("overlap_forest.npz", compiled)
+    proba = load_forest("overlap_forest.npz").predict_proba_one(features)
+"""
+import numpy as np
+
+# Levels predict_proba_one walks between checks for every tree having reached a leaf.
+EXIT_CHECK_LEVELS = 4
+
+def _float32_floor(values):
+    """
+    Largest float32 <= each float64 value. sklearn tests float32 inputs with
+    x <= threshold in float64; for a float32 x that is the same as comparing
+    against this rounded-down threshold, which keeps the comparison in float32.
+    """
+    rounded = values.astype(np.float32)
+    above = rounded > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def export_forest(forest):
+    """Flatten a fitted (single- or multi-output) RandomForestClassifier into a CompiledForest."""
+    features, thresholds, lefts, deltas, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(n)
+
+        # Leaves point to themselves and always go "left", so walking a fixed
+        # number of levels leaves every tree parked on its leaf.
+        left = np.where(is_leaf, node_ids, tree.children_left)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        lefts.append(left + offset)
+        deltas.append(np.where(is_leaf, node_ids, tree.children_right) - left)
+
+        value = tree.value
+        totals = value.sum(axis=2, keepdims=True)
+        if not np.allclose(totals, 1.0):
+            # Older sklearn versions store weighted class counts instead of fractions.
+            value = np.divide(value, totals, out=np.zeros_like(value), where=totals != 0)
+        values.append(value)
+        roots.append(offset)
+        offset += n
+
+    # Per-output class labels, padded to a rectangle; padded classes have zero probability.
+    classes = forest.classes_ if forest.n_outputs_ > 1 else [forest.classes_]
+    n_classes = [len(c) for c in classes]
+    return CompiledForest(
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=_float32_floor(np.concatenate(thresholds)),
+        left=np.concatenate(lefts).astype(np.intp),
+        delta=np.concatenate(deltas).astype(np.intp),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.intp),
+        depth=max(e.tree_.max_depth for e in forest.estimators_),
+        classes=np.array([np.resize(c, max(n_classes)) for c in classes]),
+        n_classes=np.array(n_classes),
+    )
+
+class CompiledForest:
+    """
+    Flattened random forest classifier.
+
+    Node n of the shared arrays splits on feature[n] at threshold[n]; its
+    children are left[n] and left[n] + delta[n]. value[n] holds the class
+    probabilities of every output at a leaf, shape (n_outputs, max_classes).
+    Like sklearn, single-output forests return flat per-sample results and
+    multi-output forests return one column (or probability array) per output.
+    """
+    def __init__(self, feature, threshold, left, delta, value, roots, depth, classes, n_classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.delta = delta
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.classes = np.asarray(classes)
+        self.n_classes = np.asarray(n_classes)
+        self.n_outputs = value.shape[1]
+        # _proba_one tracks nodes as 2 * n, so the next node after n is one gather:
+        # _children[2 * n + go_right] is 2 * child, and the per-node arrays are repeated to match.
+        self._children = 2 * np.stack([left, left + delta], axis=1).ravel()
+        self._feature2 = np.repeat(feature, 2)
+        self._threshold2 = np.repeat(threshold, 2)
+        self._tree_value = value / len(roots)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def leaves(self, X):
+        """Leaf node index reached in every tree, shape (n_samples, n_trees)."""
+        # Like sklearn, inputs are compared as float32.
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.depth):
+            go_right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.left[nodes] + self.delta[nodes] * go_right
+        return nodes
+
+    def _split_outputs(self, proba):
+        """Trim padded classes from (..., n_outputs, max_classes) probabilities."""
+        if self.n_outputs == 1:
+            return proba[..., 0, :self.n_classes[0]]
+        return [proba[..., k, :n] for k, n in enumerate(self.n_classes)]
+
+    def _labels(self, proba):
+        """Class labels for (..., n_outputs, max_classes) probabilities."""
+        labels = self.classes[np.arange(self.n_outputs), proba.argmax(axis=-1)]
+        return labels[..., 0] if self.n_outputs == 1 else labels
+
+    def _proba(self, X):
+        X = np.asarray(X)
+        return self.value[self.leaves(X.reshape(len(X), -1))].mean(axis=1)
+
+    def predict_proba(self, X):
+        """Class probabilities for a 2D batch, averaged over trees like sklearn."""
+        return self._split_outputs(self._proba(X))
+
+    def predict(self, X):
+        return self._labels(self._proba(X))
+
+    def _proba_one(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        # One level of every tree per step, testing only the active nodes
+        # (take() is the cheapest gather for arrays this small). Leaves point
+        # to themselves, so every few levels check whether all trees are done.
+        feature, threshold, children = self._feature2, self._threshold2, self._children
+        nodes = 2 * self.roots
+        for level in range(self.depth):
+            following = children.take(nodes + (x.take(feature.take(nodes)) > threshold.take(nodes)))
+            if level % EXIT_CHECK_LEVELS == EXIT_CHECK_LEVELS - 1 and (following == nodes).all():
+                break
+            nodes = following
+        return self._tree_value.take(nodes >> 1, axis=0).sum(axis=0)
+
+    def predict_proba_one(self, x):
+        """Fast path for a single feature vector: returns (n_classes,) probabilities (one array per output)."""
+        return self._split_outputs(self._proba_one(x))
+
+    def predict_one(self, x):
+        """Fast path for a single feature vector: the predicted class (one per output)."""
+        return self._labels(self._proba_one(x))
+
+    def to_arrays(self):
+        arrays = {name: getattr(self, name) for name in
+                  ("feature", "threshold", "left", "delta", "value", "roots", "classes", "n_classes")}
+        arrays["depth"] = self.depth
+        return arrays
+
+def save_forest(path, forest):
+    """Save a CompiledForest as an uncompressed .npz file."""
+    np.savez(path, **forest.to_arrays())
+
+def load_forest(path):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    return CompiledForest(**arrays)
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
+    parser = argparse.ArgumentParser(description="Export joblib-pickled random forests to compact .npz files.")
+    parser.add_argument("model", help="joblib file holding a forest or a dict of forests (e.g. finger_overlap_model.pkl)")
+    parser.add_argument("--out-dir", default=".", help="Where to write <name>.npz files")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    if isinstance(model, RandomForestClassifier):
+        model = {os.path.splitext(os.path.basename(args.model))[0]: model}
+    for name, forest in model.items():
+        if isinstance(forest, RandomForestClassifier):
+            path = os.path.join(args.out_dir, name + ".npz")
+            save_forest(path, export_forest(forest))
+            print(f"Exported {name} ({len(forest.estimators_)} trees) to {path}")
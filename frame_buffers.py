@@ -0,0 +1,103 @@
+# frame_buffers.py
+"""
+Reusable frame buffers for the live loops.
+
+Every frame used to allocate several full-size arrays (BGR->RGB for
+inference, another RGB copy for display, a flipped copy for the selfie view),
+which shows up as steady memory growth and GC pauses in long sessions.
+FrameBufferPool hands out preallocated destination arrays instead, so OpenCV
+writes into the same memory every frame:
+
+    buffers = FrameBufferPool()
+    rgb = buffers.cvt_color(frame, cv2.COLOR_BGR2RGB)     # cv2.cvtColor(..., dst=)
+    ...
+    buffers.release("rgb", rgb)                           # done with it: reuse it
+
+A buffer is only handed out again after it has been released, so a frame
+passed to another thread through the Pipeline queues cannot be overwritten
+while it is still queued or being drawn, however many frames the queues drop
+or the render stage falls behind. Pipeline releases captured frames when a
+queue drops them and when the render stage reads the next one; a buffer that
+is never released is simply not reused, and the next acquire allocates.
+
+The pool counts every allocation it had to make (no free buffer, or a new
+frame size) and every reuse; report() gives these per frame, so churn in a
+long kiosk session is visible next to the Pipeline stage timings.
+"""
+import threading
+import numpy as np
+
+class FrameBufferPool:
+    """Free lists of preallocated arrays, keyed by name, each for one shape and dtype."""
+    def __init__(self):
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.reuses = 0
+
+    def acquire(self, key, shape, dtype=np.uint8):
+        """
+        A free buffer for `key`, or a new one if none is free. Its contents are
+        whatever was last written to it; callers always overwrite it completely.
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None or pool["shape"] != shape or pool["dtype"] != dtype:
+                # First use or the frame size changed: drop the old buffers.
+                pool = self.pools[key] = {"shape": shape, "dtype": dtype, "free": []}
+            if pool["free"]:
+                buffer = pool["free"].pop()
+                self.reuses += 1
+            else:
+                buffer = np.empty(shape, dtype)
+                self.allocations += 1
+                self.allocated_bytes += buffer.nbytes
+        # MediaPipe callers mark their input read-only; make it writable again for reuse.
+        buffer.flags.writeable = True
+        return buffer
+
+    def release(self, key, buffer):
+        """Give a buffer acquired for `key` back; buffers of an old frame size are dropped."""
+        if buffer is None:
+            return
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is not None and pool["shape"] == buffer.shape and pool["dtype"] == buffer.dtype:
+                pool["free"].append(buffer)
+
+    def cvt_color(self, frame, code, key="rgb"):
+        """cv2.cvtColor into a pooled buffer (same-channel-count conversions such as BGR<->RGB)."""
+        import cv2
+        return cv2.cvtColor(frame, code, dst=self.acquire(key, frame.shape, frame.dtype))
+
+    def flip(self, frame, flip_code, key="flip"):
+        """cv2.flip into a pooled buffer."""
+        import cv2
+        return cv2.flip(frame, flip_code, dst=self.acquire(key, frame.shape, frame.dtype))
+
+    def count_frame(self):
+        """Mark one processed frame; report() divides the counters by this."""
+        with self.lock:
+            self.frames += 1
+
+    @property
+    def resident_bytes(self):
+        """Bytes of the free buffers currently held by the pool."""
+        with self.lock:
+            return sum(b.nbytes for pool in self.pools.values() for b in pool["free"])
+
+    def report(self):
+        frames = max(self.frames, 1)
+        return {
+            "frames": self.frames,
+            "allocations": self.allocations,
+            "allocated_bytes": self.allocated_bytes,
+            "reuses": self.reuses,
+            "allocations_per_frame": self.allocations / frames,
+            "allocated_bytes_per_frame": self.allocated_bytes / frames,
+            "resident_bytes": self.resident_bytes,
+        }
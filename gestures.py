@@ -0,0 +1,147 @@
+# gestures.py
+"""
+Data-driven rule table for the sign language gestures shown by mp.py.
+
+Each GestureRule has `when` clauses that select it and `then` clauses that
+confirm it. Rules are tried in table order and the first rule whose `when`
+clauses all hold decides the frame: it is that gesture if its `then` clauses
+also hold, otherwise no gesture at all. This reproduces the original if/elif
+chain of SignLanguageConverter.get_gesture exactly, including the Stop branch
+that returns no gesture without falling through to Point.
+
+Clauses work on landmark arrays, either one hand (21, 3) evaluated with
+plain floats and short-circuiting (the per-frame path), or a batch (N, 21, 3)
+evaluated with NumPy over all frames at once (offline classification).
+New gestures are new table entries built from the same clauses.
+
+    codes = classify_batch(points)            # int8 (N,), index into GESTURE_NAMES or -1
+    gesture = classify_one(points[0])         # "Okay", ..., or None
+"""
+import math
+import numpy as np
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+# Finger tips: thumb, index, middle, ring, little.
+TIPS = (4, 8, 12, 16, 20)
+
+class Chain:
+    """Coordinate `axis` strictly increasing ("<") or decreasing (">") along the landmarks."""
+    def __init__(self, axis, landmarks, op="<"):
+        self.axis = AXES[axis]
+        self.landmarks = tuple(landmarks)
+        self.op = op
+
+    def one(self, points):
+        values = [points[i][self.axis] for i in self.landmarks]
+        if self.op == "<":
+            return all(a < b for a, b in zip(values, values[1:]))
+        return all(a > b for a, b in zip(values, values[1:]))
+
+    def batch(self, points):
+        values = points[:, self.landmarks, self.axis]
+        if self.op == "<":
+            return np.all(values[:, :-1] < values[:, 1:], axis=1)
+        return np.all(values[:, :-1] > values[:, 1:], axis=1)
+
+class AbsDiffBelow:
+    """|a - b| along `axis` below limit."""
+    def __init__(self, axis, a, b, limit):
+        self.axis = AXES[axis]
+        self.a, self.b = a, b
+        self.limit = limit
+
+    def one(self, points):
+        return abs(points[self.a][self.axis] - points[self.b][self.axis]) < self.limit
+
+    def batch(self, points):
+        return np.abs(points[:, self.a, self.axis] - points[:, self.b, self.axis]) < self.limit
+
+class AngleToCameraBetween:
+    """
+    Angle in degrees between the origin -> tip vector and the direction towards
+    the camera (0, 0, -1) strictly between low and high.
+    """
+    def __init__(self, origin, tip, low, high):
+        self.origin, self.tip = origin, tip
+        self.low, self.high = low, high
+
+    def one(self, points):
+        o, t = points[self.origin], points[self.tip]
+        vector = (t[0] - o[0], t[1] - o[1], t[2] - o[2])
+        length = (vector[0] ** 2 + vector[1] ** 2 + vector[2] ** 2) ** 0.5
+        if length == 0:
+            return False
+        # Same operations as the original rule, so the angle is bit-identical.
+        dot = vector[0] / length * 0 + vector[1] / length * 0 + vector[2] / length * -1
+        if not -1 <= dot <= 1:
+            # Like NaN in the batch path: a degenerate vector is never pointing.
+            return False
+        angle = math.acos(dot) * 180 / math.pi
+        return self.low < angle < self.high
+
+    def batch(self, points):
+        vector = points[:, self.tip] - points[:, self.origin]
+        length = np.power(vector[:, 0] * vector[:, 0] + vector[:, 1] * vector[:, 1] + vector[:, 2] * vector[:, 2], 0.5)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dot = vector[:, 2] / length * -1
+            angle = np.arccos(dot) * 180 / math.pi
+        return (self.low < angle) & (angle < self.high)
+
+class GestureRule:
+    """One row of the rule table: gesture name, GUI status text and its clauses."""
+    def __init__(self, name, status, when=(), then=()):
+        self.name = name
+        self.status = status
+        self.when = list(when)
+        self.then = list(then)
+
+# In priority order; the first rule whose `when` clauses hold decides the frame.
+GESTURE_RULES = [
+    GestureRule("Okay", "Okay", when=[Chain("y", TIPS, "<")]),
+    GestureRule("Dislike", "I dislike It", when=[Chain("y", TIPS, ">")]),
+    GestureRule("Victory", "We Won! Victory", when=[Chain("y", (8, 12), "<"), AbsDiffBelow("x", 8, 12, 0.2)]),
+    GestureRule("Stop", "STOP! Dont Move.", when=[Chain("x", (4, 8, 12), "<")],
+                then=[Chain("x", (2, 5), "<"), Chain("x", (3, 5), "<"), Chain("x", (4, 5), "<")]),
+    GestureRule("Point", "Hey You!!", then=[AngleToCameraBetween(0, 8, 20, 80)]),
+]
+
+GESTURE_NAMES = [rule.name for rule in GESTURE_RULES]
+GESTURE_STATUS = {rule.name: rule.status for rule in GESTURE_RULES}
+
+def classify_one(points, rules=GESTURE_RULES):
+    """Gesture name (or None) for one hand: (21, 3) array or sequence of (x, y, z)."""
+    for rule in rules:
+        if all(clause.one(points) for clause in rule.when):
+            return rule.name if all(clause.one(points) for clause in rule.then) else None
+    return None
+
+def classify_hand(hand_landmarks, rules=GESTURE_RULES):
+    """Gesture name (or None) for a MediaPipe hand_landmarks result."""
+    return classify_one([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], rules)
+
+def classify_batch(points, rules=GESTURE_RULES):
+    """
+    Classify a batch of hands (N, 21, 3). Returns int8 (N,) codes: the index
+    of the gesture in the rule table, or -1 for no gesture.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 21, 3)
+    codes = np.full(len(points), -1, dtype=np.int8)
+    undecided = np.ones(len(points), dtype=bool)
+    for code, rule in enumerate(rules):
+        selected = undecided.copy()
+        for clause in rule.when:
+            selected &= clause.batch(points)
+        confirmed = selected.copy()
+        for clause in rule.then:
+            confirmed &= clause.batch(points)
+        codes[confirmed] = code
+        undecided &= ~selected
+        if not undecided.any():
+            break
+    return codes
+
+def gesture_names(codes, rules=GESTURE_RULES):
+    """Map classify_batch codes to gesture names (None for -1)."""
+    names = [rule.name for rule in rules]
+    return [names[c] if c >= 0 else None for c in np.asarray(codes).tolist()]
@@ -0,0 +1,311 @@
+# instrumentation.py
+"""
+Per-stage timers, counters and latency histograms for the live loops and the
+data/training scripts, plus an optional sampling profiler.
+
+Everything goes through one Metrics registry. While it is disabled (the
+default) a timer is a shared no-op context manager and observe()/count()
+return immediately, so the hooks can stay in the hot path:
+
+    from instrumentation import metrics
+    with metrics.timer("hands"):
+        results = hands.process(image_rgb)
+    metrics.count("detections" if results.multi_hand_landmarks else "misses")
+
+Scripts wrap their work in session(), which enables the registry when a
+metrics path is given and exports it periodically and on exit, as JSON Lines
+(one snapshot per line) or, for a path ending in .prom, a Prometheus text
+file that node_exporter's textfile collector can pick up. With a profile path
+a SamplingProfiler runs alongside and writes collapsed stacks (flamegraph.pl /
+speedscope format). Without arguments both paths come from the environment,
+so mp.py, test.py and train.py need no flags:
+
+    OVERLAP_METRICS=metrics.prom OVERLAP_PROFILE=stacks.txt python test.py video.mp4
+
+Pipeline records capture, inference and render times, the time the inference
+worker sits idle waiting for frames, and drops and failed reads. snapshot()
+turns these into a "bottleneck" verdict: "inference" when the worker is busy
+and frames are dropped in front of it, "io" when it mostly waits on capture.
+"""
+import bisect
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+METRICS_ENV = "OVERLAP_METRICS"
+PROFILE_ENV = "OVERLAP_PROFILE"
+
+# Number of recent observations kept per stage for percentiles.
+WINDOW = 1024
+# Prometheus histogram bucket bounds in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Inference utilization above / below which a loop counts as inference- / I/O-bound.
+INFERENCE_BOUND = 0.9
+IO_BOUND = 0.5
+
+_NULL_TIMER = contextlib.nullcontext()
+
+class Histogram:
+    """Latency histogram: cumulative buckets plus a rolling window for percentiles."""
+    def __init__(self, window=WINDOW, buckets=BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.recent = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+        i = bisect.bisect_left(self.buckets, seconds)
+        if i < len(self.buckets):
+            self.bucket_counts[i] += 1
+
+    def percentile(self, q):
+        """q-th percentile (0-100) of the rolling window, in seconds."""
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "max_ms": 1000 * self.max,
+            "p50_ms": 1000 * self.percentile(50),
+            "p95_ms": 1000 * self.percentile(95),
+            "p99_ms": 1000 * self.percentile(99),
+        }
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+class Metrics:
+    """Registry of stage histograms and counters; thread safe."""
+    def __init__(self, enabled=False, window=WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.stages = {}
+        self.counters = collections.Counter()
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def timer(self, stage):
+        """Context manager that records the duration of its block under stage."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(self.window)
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] += n
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def bottleneck(self):
+        """Share of time the inference worker was busy, and what that says about the loop."""
+        with self.lock:
+            busy = self.stages["inference"].total if "inference" in self.stages else 0.0
+            idle = self.stages["inference_wait"].total if "inference_wait" in self.stages else 0.0
+            dropped = self.counters["dropped.capture"]
+        if busy + idle == 0:
+            return {"inference_utilization": 0.0, "bound": None}
+        utilization = busy / (busy + idle)
+        if utilization >= INFERENCE_BOUND or (dropped and utilization > IO_BOUND):
+            bound = "inference"
+        elif utilization <= IO_BOUND:
+            bound = "io"
+        else:
+            bound = "balanced"
+        return {"inference_utilization": utilization, "bound": bound}
+
+    def snapshot(self):
+        with self.lock:
+            stages = {stage: histogram.summary() for stage, histogram in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            "time": time.time(),
+            "uptime_seconds": time.time() - self.started,
+            "stages": stages,
+            "counters": counters,
+            "bottleneck": self.bottleneck(),
+        }
+
+    def write_jsonl(self, path):
+        """Append one snapshot as a JSON line."""
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def prometheus_text(self, prefix="overlap"):
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{_metric_name(name)}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            if self.stages:
+                metric = f"{prefix}_stage_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for stage, histogram in sorted(self.stages.items()):
+                    cumulative = 0
+                    for bound, n in zip(histogram.buckets, histogram.bucket_counts):
+                        cumulative += n
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+        utilization = self.bottleneck()["inference_utilization"]
+        lines += [f"# TYPE {prefix}_inference_utilization gauge", f"{prefix}_inference_utilization {utilization}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Rewrite a Prometheus text file atomically, so scrapers never read half of it."""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def export(self, path):
+        """Prometheus text for *.prom, otherwise a JSON line appended to path."""
+        if path.endswith(".prom"):
+            self.write_prometheus(path)
+        else:
+            self.write_jsonl(path)
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+# The registry every module reports to; disabled until a session enables it.
+metrics = Metrics()
+
+class SamplingProfiler:
+    """
+    Statistical profiler: every `interval` seconds a background thread records
+    the Python stack of every other thread. Overhead is bounded by the
+    interval, not by how much code runs, so it can stay on in production.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def top(self, n=10):
+        """Most frequently sampled innermost frames as (frame, share of samples)."""
+        leaves = collections.Counter()
+        for stack, hits in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += hits
+        return [(leaf, hits / max(self.samples, 1)) for leaf, hits in leaves.most_common(n)]
+
+    def write_collapsed(self, path):
+        """Write "thread;outer;...;inner count" lines for flamegraph.pl or speedscope."""
+        with open(path, "w") as f:
+            for stack, hits in self.stacks.most_common():
+                f.write(f"{stack} {hits}\n")
+
+class _Exporter:
+    """Background thread exporting the registry every `interval` seconds."""
+    def __init__(self, registry, path, interval):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.registry.export(self.path)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self.registry.export(self.path)
+
+@contextlib.contextmanager
+def session(metrics_path=None, profile_path=None, interval=10.0, registry=metrics):
+    """
+    Enable instrumentation for the block when a metrics path is given (default:
+    $OVERLAP_METRICS) and export every `interval` seconds and at the end; run a
+    SamplingProfiler when a profile path is given (default: $OVERLAP_PROFILE).
+    Yields the registry. Without either path the block runs uninstrumented.
+    """
+    metrics_path = metrics_path or os.environ.get(METRICS_ENV)
+    profile_path = profile_path or os.environ.get(PROFILE_ENV)
+    exporter = profiler = None
+    if metrics_path:
+        registry.enabled = True
+        exporter = _Exporter(registry, metrics_path, interval)
+    if profile_path:
+        profiler = SamplingProfiler().start()
+    try:
+        yield registry
+    finally:
+        if exporter is not None:
+            exporter.stop()
+            registry.enabled = False
+            print(f"Metrics written to {metrics_path}")
+        if profiler is not None:
+            profiler.stop()
+            profiler.write_collapsed(profile_path)
+            print(f"Profile ({profiler.samples} samples) written to {profile_path}")
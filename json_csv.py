@@ -1,14 +1,10 @@
-import json
 import csv
+from session_writer import iter_session
 
 def convert_json_to_csv(json_path, csv_path):
-    # Load data from the JSON file.
-    with open(json_path, "r") as f:
-        data = json.load(f)
-    
-    # Ensure data is a list (wrap in a list if a single sample is provided)
-    if isinstance(data, dict):
-        data = [data]
+    # Read the samples one at a time from a JSON list, a single-sample JSON
+    # dict or a JSON Lines session as data_collection writes them.
+    data = iter_session(json_path)
 
     output_rows = []
     
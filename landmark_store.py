@@ -0,0 +1,297 @@
+# landmark_store.py
+"""
+Compact columnar on-disk format for recorded landmark sessions.
+
+A store is a directory holding one uncompressed .npy file per column, so every
+column can be memory-mapped instead of parsed:
+  - landmarks.npy:     float32 (N, 21, 3) raw x, y, z coordinates
+  - overlap.npy:       int8 (N,) overlap label (1 = overlap, -1 if unknown)
+  - top_finger.npy:    int8 (N,) index into FINGERS, -1 if unknown
+  - bottom_finger.npy: int8 (N,) index into FINGERS, -1 if unknown
+  - instruction.npy:   fixed-width unicode (N,) instruction, e.g. "ring4>middle3"
+  - timestamp.npy:     datetime64[s] (N,) capture time, NaT if unknown
+  - meta.json:         format version, sample count and the finger name table,
+                       plus "partial": true for stores converted from CSV
+
+A partial store lacks the wrist (landmark 0), which every feature is measured
+from, and has no overlap labels; open_store refuses it unless asked for one
+explicitly, so it cannot silently turn into NaN features.
+"""
+import csv
+import json
+import os
+import shutil
+import numpy as np
+from feature_extraction import landmarks_to_array
+from session_writer import iter_session
+
+STORE_VERSION = 1
+STORE_SUFFIX = ".lmk"
+META_FILE = "meta.json"
+
+# Finger names as recorded by data_collection, in code order.
+FINGERS = ["thumb1", "index2", "middle3", "ring4", "pinky5"]
+
+COLUMNS = ["landmarks", "overlap", "top_finger", "bottom_finger", "instruction", "timestamp"]
+
+# Landmarks belonging to each finger column of the CSV layout written by json_csv.
+CSV_FINGER_MAPPING = {
+    "thumb": range(1, 5),
+    "index": range(5, 9),
+    "middle": range(9, 13),
+    "ring": range(13, 17),
+    "pinky": range(17, 21)
+}
+
+def is_store(path):
+    """Return True if path is a landmark store directory."""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+def _check_target(store_path):
+    """Raise FileExistsError unless store_path is free, an empty directory or a store to replace."""
+    if not os.path.lexists(store_path) or is_store(store_path):
+        return
+    if os.path.isdir(store_path) and not os.path.islink(store_path) and not os.listdir(store_path):
+        return
+    raise FileExistsError(f"{store_path} exists and is not a landmark store; choose another output path")
+
+def is_partial_store(path):
+    """Return True if path is a partial (CSV-derived) landmark store."""
+    if not is_store(path):
+        return False
+    with open(os.path.join(path, META_FILE), "r") as f:
+        return bool(json.load(f).get("partial"))
+
+def overlap_label(sample):
+    """
+    Label a sample the same way data_preparation.load_data does: use the
+    "overlap" key if present, otherwise 1 if the instruction contains ">".
+    """
+    if "overlap" in sample:
+        return 1 if sample["overlap"] else 0
+    return 1 if ">" in sample.get("instruction", "") else 0
+
+def encode_fingers(names):
+    """Map finger names to int8 codes into FINGERS (-1 for unknown/empty)."""
+    codes = {name: i for i, name in enumerate(FINGERS)}
+    return np.array([codes.get(name, -1) for name in names], dtype=np.int8)
+
+def decode_fingers(codes):
+    """Map int8 finger codes back to names ("" for unknown)."""
+    return [FINGERS[c] if 0 <= c < len(FINGERS) else "" for c in codes]
+
+def _parse_timestamps(timestamps):
+    """Convert "YYYY-MM-DD HH:MM:SS" strings to datetime64[s]; blanks become NaT."""
+    return np.array([t.replace(" ", "T") if t else "NaT" for t in timestamps], dtype="datetime64[s]")
+
+def write_store(store_path, landmarks, overlap, top_finger, bottom_finger, instruction, timestamp,
+                partial=False):
+    """
+    Write a landmark store (partial: see the module docstring). Raises
+    FileExistsError if store_path holds something other than a store.
+
+    landmarks is an (N, 21, 3) array; the finger, instruction and timestamp
+    columns are sequences of strings as recorded by data_collection.
+    """
+    _check_target(store_path)
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+    n = len(landmarks)
+    columns = {
+        "landmarks": landmarks,
+        "overlap": np.asarray(overlap, dtype=np.int8).reshape(n),
+        "top_finger": encode_fingers(top_finger).reshape(n),
+        "bottom_finger": encode_fingers(bottom_finger).reshape(n),
+        "instruction": np.array(list(instruction), dtype=str).reshape(n),
+        "timestamp": _parse_timestamps(list(timestamp)).reshape(n),
+    }
+
+    os.makedirs(store_path, exist_ok=True)
+    for name, column in columns.items():
+        np.save(os.path.join(store_path, name + ".npy"), column, allow_pickle=False)
+    # meta.json is written last so a partially written store is not detected as valid.
+    with open(os.path.join(store_path, META_FILE), "w") as f:
+        meta = {"version": STORE_VERSION, "count": n, "fingers": FINGERS}
+        if partial:
+            meta["partial"] = True
+        json.dump(meta, f)
+
+def _write_npy(npy_path, raw_path, dtype, shape):
+    """Write an .npy file whose data is the raw bytes of raw_path, copied in blocks."""
+    with open(npy_path, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": shape,
+        })
+        shutil.copyfileobj(raw, out)
+
+class StoreWriter:
+    """
+    Streaming writer for a landmark store.
+
+    Samples are buffered chunk_size at a time and appended to raw column files
+    in <store_path>.partial; close() turns those into the .npy columns and
+    meta.json and moves the finished store into place, replacing a previous
+    store at store_path; anything else there raises FileExistsError. Memory
+    use is bounded by the chunk size, not by the number of samples.
+    """
+    def __init__(self, store_path, chunk_size=4096):
+        _check_target(store_path)
+        self.store_path = store_path
+        self.tmp_path = store_path + ".partial"
+        self.chunk_size = chunk_size
+        self.count = 0
+        # The instruction column is fixed-width, so its width is only known at the end.
+        self.instruction_width = 1
+        self._pending = []
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+    def write(self, points, overlap, top_finger, bottom_finger, instruction, timestamp):
+        """Append one sample: (21, 3) landmarks (or 63 coordinates) and its label strings."""
+        self._pending.append((points, overlap, top_finger, bottom_finger, instruction, timestamp))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        points, overlap, top_finger, bottom_finger, instruction, timestamp = zip(*self._pending)
+        columns = {
+            "landmarks": np.asarray(points, dtype=np.float32).reshape(-1, 21, 3),
+            "overlap": np.asarray(overlap, dtype=np.int8),
+            "top_finger": encode_fingers(top_finger),
+            "bottom_finger": encode_fingers(bottom_finger),
+            "timestamp": _parse_timestamps(timestamp),
+        }
+        for name, column in columns.items():
+            with open(os.path.join(self.tmp_path, name + ".raw"), "ab") as f:
+                f.write(column.tobytes())
+        with open(os.path.join(self.tmp_path, "instruction.txt"), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(s) + "\n" for s in instruction)
+        self.instruction_width = max(self.instruction_width, max(len(s) for s in instruction))
+        self.count += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        """Finish the store and return the number of samples written."""
+        self.flush()
+        shapes = {"landmarks": (np.float32, (self.count, 21, 3)), "overlap": (np.int8, (self.count,)),
+                  "top_finger": (np.int8, (self.count,)), "bottom_finger": (np.int8, (self.count,)),
+                  "timestamp": ("datetime64[s]", (self.count,))}
+        for name, (dtype, shape) in shapes.items():
+            raw_path = os.path.join(self.tmp_path, name + ".raw")
+            open(raw_path, "ab").close()
+            _write_npy(os.path.join(self.tmp_path, name + ".npy"), raw_path, dtype, shape)
+            os.remove(raw_path)
+
+        # Re-encode the instructions at their final width, chunk_size lines at a time.
+        text_path = os.path.join(self.tmp_path, "instruction.txt")
+        raw_path = os.path.join(self.tmp_path, "instruction.raw")
+        dtype = f"<U{self.instruction_width}"
+        with open(text_path, "a+", encoding="utf-8") as text, open(raw_path, "wb") as raw:
+            text.seek(0)
+            lines = []
+            for line in text:
+                lines.append(json.loads(line))
+                if len(lines) >= self.chunk_size:
+                    raw.write(np.array(lines, dtype=dtype).tobytes())
+                    lines = []
+            raw.write(np.array(lines, dtype=dtype).tobytes())
+        _write_npy(os.path.join(self.tmp_path, "instruction.npy"), raw_path, dtype, (self.count,))
+        os.remove(raw_path)
+        os.remove(text_path)
+
+        # meta.json is written last so a partially written store is not detected as valid.
+        with open(os.path.join(self.tmp_path, META_FILE), "w") as f:
+            json.dump({"version": STORE_VERSION, "count": self.count, "fingers": FINGERS}, f)
+        # Only a previous store is replaced, never whatever else sits at the target.
+        _check_target(self.store_path)
+        shutil.rmtree(self.store_path, ignore_errors=True)
+        os.replace(self.tmp_path, self.store_path)
+        return self.count
+
+def open_store(store_path, mmap_mode="r", allow_partial=False):
+    """
+    Open a landmark store and return a dict of its columns.
+
+    With the default mmap_mode every column is a read-only memory map, so
+    opening a store costs no parsing and no copies regardless of its size.
+    A partial (CSV-derived) store raises ValueError unless allow_partial.
+    """
+    with open(os.path.join(store_path, META_FILE), "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported landmark store version {meta.get('version')} in {store_path}")
+    if meta.get("partial") and not allow_partial:
+        raise ValueError(f"{store_path} was converted from CSV and has no wrist landmark or overlap labels, "
+                         f"so no features can be computed from it; convert the original JSON session instead")
+
+    store = {"fingers": meta["fingers"], "partial": bool(meta.get("partial"))}
+    for name in COLUMNS:
+        store[name] = np.load(os.path.join(store_path, name + ".npy"), mmap_mode=mmap_mode, allow_pickle=False)
+    return store
+
+def convert_json_to_store(json_path, store_path):
+    """
+    Convert a data_collection JSON or JSON Lines session file into a landmark
+    store, streaming the samples so memory does not grow with the file size.
+    """
+    writer = StoreWriter(store_path)
+    for s in iter_session(json_path):
+        # Samples without a full set of landmarks are skipped, as in load_data.
+        if s.get("landmarks") and len(s["landmarks"]) == 21:
+            writer.write(landmarks_to_array(s["landmarks"]), overlap_label(s), s.get("top_finger", ""),
+                         s.get("bottom_finger", ""), s.get("instruction", ""), s.get("timestamp", ""))
+    return writer.close()
+
+def convert_csv_to_store(csv_path, store_path):
+    """
+    Convert a CSV file written by json_csv.convert_json_to_csv into a store.
+
+    The CSV layout only keeps the finger landmarks (1-20) at six decimals and
+    no overlap label, instruction or timestamp, so the wrist (landmark 0) is
+    stored as NaN, the overlap label as -1, the instruction is rebuilt as
+    "top>bottom" and timestamps are NaT. The store is marked partial, which
+    keeps it out of the feature and training loaders.
+    """
+    rows = []
+    with open(csv_path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            points = np.full((21, 3), np.nan)
+            for finger, indices in CSV_FINGER_MAPPING.items():
+                coords = np.array(row[finger].replace(";", ",").split(","), dtype=np.float64)
+                points[list(indices)] = coords.reshape(len(indices), 3)
+            rows.append((points, row.get("top_finger", ""), row.get("bottom_finger", "")))
+
+    instructions = [f"{top}>{bottom}" if top and bottom else "" for _, top, bottom in rows]
+    write_store(
+        store_path,
+        np.array([points for points, _, _ in rows]).reshape(-1, 21, 3),
+        [-1] * len(rows),
+        [top for _, top, _ in rows],
+        [bottom for _, _, bottom in rows],
+        instructions,
+        [""] * len(rows),
+        partial=True,
+    )
+    return len(rows)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert JSON or CSV landmark sessions to a landmark store.")
+    parser.add_argument("inputs", nargs="+", help="JSON or CSV session files")
+    parser.add_argument("--out-dir", default=None, help="Directory for the stores (default: next to each input)")
+    args = parser.parse_args()
+
+    for input_path in args.inputs:
+        base, ext = os.path.splitext(input_path)
+        if args.out_dir:
+            base = os.path.join(args.out_dir, os.path.basename(base))
+        store_path = base + STORE_SUFFIX
+        if ext.lower() == ".csv":
+            count = convert_csv_to_store(input_path, store_path)
+        else:
+            count = convert_json_to_store(input_path, store_path)
+        print(f"Wrote {count} samples to {store_path}")
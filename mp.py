@@ -5,20 +5,26 @@ Submitted to: Dr Muhammad Ahsan Naeem
 Date: 11 May,2023.
 '''
 
-import mediapipe as mp
-import cv2, math, datetime, pyttsx3
+import datetime, time
 from tkinter import*
-from PIL import Image, ImageTk
-
-# GUI starting:
-win = Tk()
-width=win.winfo_screenwidth()
-height=win.winfo_screenheight()
-win.geometry("%dx%d" % (width, height))
-
-frame_1 = Frame(win, width=width, height=height, bg="#181823").place(x=0, y=0)
-win.title('Sign Language Recognition')
-mylabel1= Label(win,text='Sign Language Recognition',font=('Comic Sans MS',26,'bold'),bd=5,bg='#20262E',fg='#F5EAEA',relief=GROOVE,width=5000 ).pack(pady=20,padx=500)
+from frame_buffers import FrameBufferPool
+from gestures import GESTURE_STATUS, classify_hand
+from instrumentation import metrics, session
+from pipeline import Pipeline
+from tracking import TrackedHands
+
+# mediapipe, cv2, PIL and pyttsx3 are imported where they are first used, so
+# importing this module (e.g. for SignLanguageConverter.get_gesture) is cheap
+# and builds no window; the GUI is created by main().
+def _solutions():
+    import mediapipe as mp
+    return mp.solutions
+
+# Status text shown in the GUI; a StringVar once main() has built the window.
+CountGesture = None
+def set_status(text):
+    if CountGesture is not None:
+        CountGesture.set(text)
 
 # Function to update the clock
 def update_clock():
@@ -26,88 +32,59 @@ def update_clock():
     clock.config(text=now.strftime("%H:%M:%S"))
     clock.after(1000, update_clock)
 
-# Name and Rollno Label:
-namee = Label(win,text='Muhammad Rafay', font=('Verdana',14,'bold'),relief=GROOVE,width = 22,bd=5, fg="#F5EAEA", bg="#20262E")
-namee.place(x=1200,y=650)
-rollno = Label(win,text='2021-MC-39', font=('Verdana',14,'bold'),relief=GROOVE,width = 22,bd=5, fg="#F5EAEA", bg="#20262E")
-rollno.place(x=1200,y=700)
-
-# Create the clock label
-clock = Label(win, font=("Arial", 20),relief=GROOVE,width = 15,bd=5, fg="#F5EAEA", bg="#20262E")
-clock.pack(anchor=NW, padx=150, pady=10)
-clock.place(x=100,y=350)
-# Create the calendar label
-cal = Label(win, font=("Arial", 20),relief=GROOVE,width = 15,bd=5, fg="#F5EAEA", bg="#20262E")
-cal.pack(anchor=NW, padx=150, pady=10)
-cal.place(x=100,y=400)
-update_clock()
-cal.config(text=datetime.date.today().strftime("%B %d, %Y"))
-
 # Mediapipe Solution Using oop and Gestures:
-mp_drawing = mp.solutions.drawing_utils
-mp_hands = mp.solutions.hands
+# Run full hand inference every INFERENCE_STRIDE frames; landmarks are tracked in between.
+INFERENCE_STRIDE = 2
 class SignLanguageConverter:
     current_gesture= None
-    global CountGesture
-    CountGesture = StringVar()
-    def init(self):
-        self.hands = mp_hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.5)
+    def __init__(self):
+        # One Hands graph per stream, created once and reused for every frame.
+        self.hands = TrackedHands(_solutions().hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.5), stride=INFERENCE_STRIDE)
         self.current_gesture = None
+        self.results = None
+        # The RGB frame is converted once into a reused buffer, for inference and display.
+        self.buffers = FrameBufferPool()
     
     def detect_gesture(self, image):
-        with mp_hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.5) as hands:
-            results = hands.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            if results.multi_hand_landmarks:
-                hand_landmarks = results.multi_hand_landmarks[0]
-                self.current_gesture = self.get_gesture(hand_landmarks)
+        return self.update_gesture(self.detect_hands(image))
+    
+    def detect_hands(self, image):
+        results, framergb = self.detect_frame(image)
+        self.buffers.release("rgb", framergb)
+        return results
+    
+    def detect_frame(self, image):
+        """
+        Run inference on a BGR frame; returns (results, rgb frame). Runs once per
+        frame and is safe to call from a pipeline worker thread.
+        """
+        import cv2
+        with metrics.timer("cvt_color"):
+            framergb = self.buffers.cvt_color(image, cv2.COLOR_BGR2RGB)
+        with metrics.timer("hands"):
+            results = self.hands.process(framergb)
+        metrics.count("detections" if results.multi_hand_landmarks else "misses")
+        return results, framergb
+    
+    def release_frame(self, detection):
+        """Give the RGB frame of a detect_frame result back once it has been shown."""
+        self.buffers.release("rgb", detection[1])
+    
+    def update_gesture(self, results):
+        # Classification touches Tk variables, so it runs on the GUI thread.
+        self.results = results
+        if results.multi_hand_landmarks:
+            hand_landmarks = results.multi_hand_landmarks[0]
+            self.current_gesture = self.get_gesture(hand_landmarks)
+        return results
     
     def get_gesture(self, hand_landmarks):
-        thumb_tip = hand_landmarks.landmark[4]
-        index_finger_tip = hand_landmarks.landmark[8]
-        middle_finger_tip = hand_landmarks.landmark[12]
-        ring_finger_tip = hand_landmarks.landmark[16]
-        little_finger_tip = hand_landmarks.landmark[20]
-
-        # Check if hand is in OK gesture
-        if thumb_tip.y < index_finger_tip.y < middle_finger_tip.y < ring_finger_tip.y < little_finger_tip.y:
-            CountGesture.set('Okay')
-            return "Okay"
-
-        # Check if hand is in Dislike gesture
-        elif thumb_tip.y > index_finger_tip.y > middle_finger_tip.y > ring_finger_tip.y > little_finger_tip.y:
-            CountGesture.set('I dislike It')
-            return "Dislike"
-
-        # Check if hand is in Victory gesture
-        elif index_finger_tip.y < middle_finger_tip.y and abs(index_finger_tip.x - middle_finger_tip.x) < 0.2:
-            CountGesture.set('We Won! Victory')
-            return "Victory"
-
-        # Check if hand is in Stop gesture
-        elif thumb_tip.x < index_finger_tip.x < middle_finger_tip.x:
-            if (hand_landmarks.landmark[2].x < hand_landmarks.landmark[5].x) and (hand_landmarks.landmark[3].x < hand_landmarks.landmark[5].x) and (hand_landmarks.landmark[4].x < hand_landmarks.landmark[5].x):
-                CountGesture.set('STOP! Dont Move.')
-                return "Stop"
-            else:
-                return None
-        
-        # Check if hand is in Point gesture
-        else:
-            wrist = hand_landmarks.landmark[0]
-            index_finger_tip = hand_landmarks.landmark[8]
-            index_finger = (index_finger_tip.x, index_finger_tip.y, index_finger_tip.z)
-            wrist_coords = (wrist.x, wrist.y, wrist.z)
-            vector = (index_finger[0] - wrist_coords[0], index_finger[1] - wrist_coords[1], index_finger[2] - wrist_coords[2])
-            vector_len = (vector[0] ** 2 + vector[1] ** 2 + vector[2] ** 2) ** 0.5
-            vector_unit = (vector[0] / vector_len, vector[1] / vector_len, vector[2] / vector_len)
-            reference_vector = (0, 0, -1)  # the vector pointing towards the camera
-            dot_product = vector_unit[0] * reference_vector[0] + vector_unit[1] * reference_vector[1] + vector_unit[2] * reference_vector[2]
-            angle = math.acos(dot_product) * 180 / math.pi  # angle in degrees
-            if 20 < angle < 80:
-                CountGesture.set('Hey You!!')
-                return "Point"
-            else:
-                return None
+        # The rules live in gestures.GESTURE_RULES; only the status text is GUI work.
+        with metrics.timer("gesture"):
+            gesture = classify_hand(hand_landmarks)
+        if gesture:
+            set_status(GESTURE_STATUS[gesture])
+        return gesture
         
     def get_current_gesture(self):
         return self.current_gesture
@@ -117,6 +94,7 @@ class SignLanguageConverter:
 
 # Voice feature in GUI
 def voice():
+    import pyttsx3
     engine = pyttsx3.init()
     engine.say((CountGesture.get()))
     engine.runAndWait()
@@ -127,43 +105,116 @@ def lbl():
     label1.destroy()
 def lbl2():
     global label1
+    import cv2
     cv2.destroyAllWindows()
     label1.destroy()
 
-# Exit and Voice button in GUI:
-exit=Button(win,text='Exit',padx=95,bg='#20262E',fg='#F5EAEA',relief=GROOVE,width=7,bd=5,font=('Verdana',14,'bold') ,command=win.destroy).place(x=1200,y=400)
-voic=Button(win,text='Sound',padx=95,bg='#20262E',fg='#F5EAEA',relief=GROOVE,width=7,bd=5,font=('Verdana',14,'bold') ,command=voice).place(x=1200,y=350)
-
-# Calling of functions and solution:
-sign_lang_conv = SignLanguageConverter()
-cap = cv2.VideoCapture(0)
-label1 = Label(frame_1, width=640, height=480)
-label1.place(x=450, y=150)
+def close_app():
+    pipeline.stop()
+    sign_lang_conv.release()
+    win.destroy()
+
+# Camera view: one PIL image and one PhotoImage, created for the first frame
+# (or a new frame size) and updated in place afterwards.
+display_image = None
+display_photo = None
+def show_frame(framergb):
+    global display_image, display_photo
+    from PIL import Image, ImageTk
+    size = (framergb.shape[1], framergb.shape[0])
+    if display_image is None or display_image.size != size:
+        display_image = Image.new("RGB", size)
+        display_photo = ImageTk.PhotoImage(display_image)
+        label1.configure(image=display_photo)
+        label1.image = display_photo
+    display_image.frombytes(framergb)
+    display_photo.paste(display_image)
+
+# Frame clock: frames are scheduled at a fixed rate instead of polling every 1 ms.
+FRAME_RATE = 30
+FRAME_INTERVAL = 1.0 / FRAME_RATE
+next_frame_time = time.perf_counter()
 def select_img():
-        _, frame = cap.read()
-        # frame = cv2.resize(frame, (640, 480))
-        sign_lang_conv.detect_gesture(frame)
-        gesture = sign_lang_conv.get_current_gesture()
-        if gesture:
-            cv2.putText(frame, gesture, (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-        # Draw landmarks on the hand
-        with mp_hands.Hands(static_image_mode=False, max_num_hands=1, min_detection_confidence=0.5, min_tracking_confidence=0.5) as hands:
-            results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if results.multi_hand_landmarks:
-                for hand_landmarks in results.multi_hand_landmarks:
-                    mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-        
-        framergb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image = Image.fromarray(framergb)
-        finalImage = ImageTk.PhotoImage(image)
-        label1.configure(image=finalImage)
-        label1.image = finalImage
-        crrgesture=Label(win,text='Current Gesture :',font=('Calibri',18,'bold'),bd=5,bg='#20262E',width=15,fg='#F5EAEA',relief=GROOVE )
-        status = Label(win,textvariable=CountGesture,font=('Georgia',18,'bold'),bd=5,bg='#20262E',width=30,fg='#F5EAEA',relief=GROOVE )
-        status.place(x=520,y=700)
-        crrgesture.place(x=200,y=700)
-        win.after(1, select_img)
-
-select_img()
-win.mainloop()
+        global next_frame_time
+        import cv2
+        ok, frame, detection = pipeline.read(timeout=0)
+        if ok:
+            results, framergb = detection
+            with pipeline.timed("render"):
+                # frame = cv2.resize(frame, (640, 480))
+                sign_lang_conv.update_gesture(results)
+                gesture = sign_lang_conv.get_current_gesture()
+                # Everything is drawn on the RGB frame that inference already produced.
+                if gesture:
+                    cv2.putText(framergb, gesture, (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
+                # Draw landmarks on the hand, reusing the landmarks from gesture detection
+                if results.multi_hand_landmarks:
+                    solutions = _solutions()
+                    # MediaPipe's default landmark colour is BGR red; give it as RGB.
+                    landmark_spec = solutions.drawing_utils.DrawingSpec(color=(255, 0, 0))
+                    for hand_landmarks in results.multi_hand_landmarks:
+                        solutions.drawing_utils.draw_landmarks(framergb, hand_landmarks, solutions.hands.HAND_CONNECTIONS, landmark_spec)
+                
+                with metrics.timer("display"):
+                    show_frame(framergb)
+        # Wait until the next tick of the frame clock; if this frame overran, start the next one right away.
+        now = time.perf_counter()
+        next_frame_time = max(next_frame_time + FRAME_INTERVAL, now)
+        win.after(int((next_frame_time - now) * 1000), select_img)
+
+def main():
+    global win, clock, cal, label1, CountGesture, sign_lang_conv, pipeline, next_frame_time
+    # GUI starting:
+    win = Tk()
+    width=win.winfo_screenwidth()
+    height=win.winfo_screenheight()
+    win.geometry("%dx%d" % (width, height))
+
+    frame_1 = Frame(win, width=width, height=height, bg="#181823").place(x=0, y=0)
+    win.title('Sign Language Recognition')
+    mylabel1= Label(win,text='Sign Language Recognition',font=('Comic Sans MS',26,'bold'),bd=5,bg='#20262E',fg='#F5EAEA',relief=GROOVE,width=5000 ).pack(pady=20,padx=500)
+
+    # Name and Rollno Label:
+    namee = Label(win,text='Muhammad Rafay', font=('Verdana',14,'bold'),relief=GROOVE,width = 22,bd=5, fg="#F5EAEA", bg="#20262E")
+    namee.place(x=1200,y=650)
+    rollno = Label(win,text='2021-MC-39', font=('Verdana',14,'bold'),relief=GROOVE,width = 22,bd=5, fg="#F5EAEA", bg="#20262E")
+    rollno.place(x=1200,y=700)
+
+    # Create the clock label
+    clock = Label(win, font=("Arial", 20),relief=GROOVE,width = 15,bd=5, fg="#F5EAEA", bg="#20262E")
+    clock.pack(anchor=NW, padx=150, pady=10)
+    clock.place(x=100,y=350)
+    # Create the calendar label
+    cal = Label(win, font=("Arial", 20),relief=GROOVE,width = 15,bd=5, fg="#F5EAEA", bg="#20262E")
+    cal.pack(anchor=NW, padx=150, pady=10)
+    cal.place(x=100,y=400)
+    update_clock()
+    cal.config(text=datetime.date.today().strftime("%B %d, %Y"))
+    CountGesture = StringVar()
+    crrgesture=Label(win,text='Current Gesture :',font=('Calibri',18,'bold'),bd=5,bg='#20262E',width=15,fg='#F5EAEA',relief=GROOVE )
+    status = Label(win,textvariable=CountGesture,font=('Georgia',18,'bold'),bd=5,bg='#20262E',width=30,fg='#F5EAEA',relief=GROOVE )
+    status.place(x=520,y=700)
+    crrgesture.place(x=200,y=700)
+
+    # Exit and Voice button in GUI:
+    exit=Button(win,text='Exit',padx=95,bg='#20262E',fg='#F5EAEA',relief=GROOVE,width=7,bd=5,font=('Verdana',14,'bold') ,command=close_app).place(x=1200,y=400)
+    voic=Button(win,text='Sound',padx=95,bg='#20262E',fg='#F5EAEA',relief=GROOVE,width=7,bd=5,font=('Verdana',14,'bold') ,command=voice).place(x=1200,y=350)
+
+    # Calling of functions and solution:
+    sign_lang_conv = SignLanguageConverter()
+    # Capture and hand detection run on background threads; select_img renders the latest result.
+    pipeline = Pipeline(0, sign_lang_conv.detect_frame, buffers=sign_lang_conv.buffers,
+                        release=sign_lang_conv.release_frame).start()
+    label1 = Label(frame_1, width=640, height=480)
+    label1.place(x=450, y=150)
+    win.protocol("WM_DELETE_WINDOW", close_app)
+
+    next_frame_time = time.perf_counter()
+    select_img()
+    win.mainloop()
+
+if __name__ == "__main__":
+    # OVERLAP_METRICS / OVERLAP_PROFILE in the environment turn on instrumentation.
+    with session():
+        main()
 # End of the program.
\ No newline at end of file
@@ -0,0 +1,127 @@
+# multitask.py
+"""
+Single multi-output model for finger overlap: which pair overlaps and which
+finger is on top, predicted together from one shared feature vector.
+
+Instead of an overlap forest and a top-finger forest per finger pair (up to
+20 model evaluations per frame), one RandomForestClassifier is trained on two
+outputs built from the top_finger / bottom_finger fields data_collection
+records:
+
+  - pair: index into overlap.FINGER_PAIRS of the overlapping pair, or -1
+  - top:  index into overlap.FINGER_NAMES of the finger on top, or -1
+
+Both come out of one compiled forest call per frame:
+
+    model = OverlapModel.load("multitask_forest.npz")
+    is_overlap, pair, top = model.predict_one(features)
+
+The training split can be extended with augmented copies of its own hands
+(augment.py):
+
+    python multitask.py overlap_dataset
+    python multitask.py overlap_dataset --augment 1000000 --trees 50
+"""
+import numpy as np
+from feature_cache import load_cached_dataset
+from forest_export import export_forest, load_forest, save_forest
+from overlap import FINGER_NAMES, FINGER_PAIRS
+
+DEFAULT_MODEL_PATH = "multitask_forest.npz"
+
+# PAIR_INDEX[i, j] is the FINGER_PAIRS index of fingers i and j (either order), -1 on the diagonal.
+PAIR_INDEX = np.full((5, 5), -1, dtype=np.int8)
+PAIR_INDEX[FINGER_PAIRS[:, 0], FINGER_PAIRS[:, 1]] = np.arange(len(FINGER_PAIRS))
+PAIR_INDEX[FINGER_PAIRS[:, 1], FINGER_PAIRS[:, 0]] = np.arange(len(FINGER_PAIRS))
+
+def make_targets(overlap, top_finger, bottom_finger):
+    """
+    (N, 2) int8 targets [pair, top] from the overlap label and the finger codes
+    of landmark_store.FINGERS (same order as overlap.FINGER_NAMES). Samples
+    without an overlap, or with a missing finger, get -1 in both columns.
+    """
+    top = np.asarray(top_finger, dtype=np.int8)
+    bottom = np.asarray(bottom_finger, dtype=np.int8)
+    valid = (np.asarray(overlap) == 1) & (top >= 0) & (bottom >= 0)
+    pair = np.where(valid, PAIR_INDEX[np.clip(top, 0, 4), np.clip(bottom, 0, 4)], -1)
+    valid &= pair >= 0
+    return np.column_stack([np.where(valid, pair, -1), np.where(valid, top, -1)]).astype(np.int8)
+
+def train(X, targets, n_estimators=100, random_state=42):
+    """Fit one RandomForestClassifier on both target columns."""
+    from sklearn.ensemble import RandomForestClassifier
+    clf = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    return clf.fit(X, targets)
+
+class OverlapModel:
+    """Compiled multi-output forest returning overlap, pair and top finger together."""
+    def __init__(self, forest):
+        self.forest = forest
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        return cls(load_forest(path))
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        save_forest(path, self.forest)
+
+    @staticmethod
+    def decode(pair, top):
+        """(is_overlap, (finger1, finger2) or None, top finger name or None) for predicted codes."""
+        if pair < 0:
+            return False, None, None
+        i, j = FINGER_PAIRS[pair]
+        # The top finger has to belong to the pair; otherwise it is left undecided.
+        top_name = FINGER_NAMES[top] if top in (i, j) else None
+        return True, (FINGER_NAMES[i], FINGER_NAMES[j]), top_name
+
+    def predict_one(self, features):
+        """Decoded prediction for one feature vector, from a single forest call."""
+        pair, top = self.forest.predict_one(features)
+        return self.decode(int(pair), int(top))
+
+    def predict(self, X):
+        """(N, 2) [pair, top] codes for a batch of feature vectors."""
+        return self.forest.predict(X)
+
+if __name__ == "__main__":
+    import argparse
+    from sklearn.metrics import classification_report
+    from sklearn.model_selection import train_test_split
+
+    parser = argparse.ArgumentParser(description="Train the multi-output overlap / pair / top finger model.")
+    parser.add_argument("data_dir", nargs="?", default="overlap_dataset")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--augment", type=int, default=0,
+                        help="Add this many augmented copies of training samples (see augment.py)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the augmentation stream")
+    args = parser.parse_args()
+
+    dataset = load_cached_dataset(args.data_dir)
+    targets = make_targets(dataset["overlap"], dataset["top_finger"], dataset["bottom_finger"])
+    train_idx, test_idx = train_test_split(np.arange(len(targets)), test_size=0.2, random_state=42)
+    X_test, y_test = dataset["X"][test_idx], targets[test_idx]
+    if args.augment:
+        from augment import augment_features, load_source
+        # Only training hands are augmented, so no test hand leaks into training.
+        points, labels = load_source(sessions=dataset["sessions"])
+        X_train = np.empty((len(train_idx) + args.augment, dataset["X"].shape[1]))
+        X_train[:len(train_idx)] = dataset["X"][train_idx]
+        _, augmented = augment_features(points[train_idx], {name: column[train_idx] for name, column in labels.items()},
+                                        args.augment, args.seed, out=X_train[len(train_idx):])
+        y_train = np.concatenate([targets[train_idx], make_targets(augmented["overlap"], augmented["top_finger"],
+                                                                   augmented["bottom_finger"])])
+    else:
+        X_train, y_train = dataset["X"][train_idx], targets[train_idx]
+    clf = train(X_train, y_train, n_estimators=args.trees)
+
+    y_pred = clf.predict(X_test)
+    print("Pair (-1 = no overlap):")
+    print(classification_report(y_test[:, 0], y_pred[:, 0], zero_division=0))
+    print("Top finger (-1 = no overlap):")
+    print(classification_report(y_test[:, 1], y_pred[:, 1], zero_division=0))
+    print(f"Exact match (pair and top): {(y_pred == y_test).all(axis=1).mean():.3f}")
+
+    OverlapModel(export_forest(clf)).save(args.output)
+    print(f"Model saved to {args.output}")
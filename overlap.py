@@ -0,0 +1,116 @@
+# overlap.py
+"""
+Vectorized finger overlap detection for all finger pairs.
+
+Production version of the notebook's check_finger_overlap_3d: two fingers
+overlap when their tips are close in the XY plane and in at least one of the
+XZ / YZ planes, and the finger whose tip + second joint average depth is
+smaller (closer to the camera) is on top.
+
+finger_overlap_matrix evaluates all 10 pairs of a single hand (21, 3) or a
+batch of hands (N, 21, 3) in one NumPy pass and returns an int8 (N, 5, 5)
+matrix: entry [n, i, j] is -1 when fingers i and j do not overlap, otherwise
+the index (into FINGER_NAMES) of the finger on top. pack_overlap_matrix
+compresses that into one uint32 per frame.
+"""
+import numpy as np
+
+FINGER_NAMES = ["thumb", "index", "middle", "ring", "pinky"]
+
+# Tip and second-joint landmark of every finger, in FINGER_NAMES order.
+FINGER_TIP = np.array([4, 8, 12, 16, 20])
+FINGER_JOINT = np.array([3, 7, 11, 15, 19])
+
+# The 10 unordered finger pairs (i < j), in the order used for packing.
+FINGER_PAIRS = np.array([(i, j) for i in range(5) for j in range(i + 1, 5)])
+
+# Default tip distance thresholds in the xy, xz and yz planes.
+XY_THRESH = 0.03
+XZ_THRESH = 0.05
+YZ_THRESH = 0.05
+
+def check_finger_overlap_3d(finger1, finger2, points, xy_thresh=XY_THRESH, xz_thresh=XZ_THRESH, yz_thresh=YZ_THRESH):
+    """
+    Check a single finger pair on one hand.
+
+    points is a (21, 3) landmark array; finger1/finger2 are names from
+    FINGER_NAMES. Returns (is_overlap, top_finger_name or None).
+    """
+    f1, f2 = FINGER_NAMES.index(finger1), FINGER_NAMES.index(finger2)
+    tip1, tip2 = points[FINGER_TIP[f1]], points[FINGER_TIP[f2]]
+
+    xy_dist = np.sqrt((tip1[0] - tip2[0])**2 + (tip1[1] - tip2[1])**2)
+    xz_dist = np.sqrt((tip1[0] - tip2[0])**2 + (tip1[2] - tip2[2])**2)
+    yz_dist = np.sqrt((tip1[1] - tip2[1])**2 + (tip1[2] - tip2[2])**2)
+
+    # The tips must be close in XY and in at least one of the other two planes.
+    if xy_dist < xy_thresh and (xz_dist < xz_thresh or yz_dist < yz_thresh):
+        # Average depth of tip and second joint; smaller z is closer to the camera.
+        z1 = (tip1[2] + points[FINGER_JOINT[f1], 2]) / 2
+        z2 = (tip2[2] + points[FINGER_JOINT[f2], 2]) / 2
+        return True, finger1 if z1 < z2 else finger2
+    return False, None
+
+def finger_overlap_matrix(points, xy_thresh=XY_THRESH, xz_thresh=XZ_THRESH, yz_thresh=YZ_THRESH):
+    """
+    Evaluate every finger pair of one hand (21, 3) or a batch of hands (N, 21, 3).
+
+    Returns an int8 matrix of shape (5, 5) or (N, 5, 5): -1 where the pair does
+    not overlap (and on the diagonal), otherwise the index of the top finger.
+    Results equal check_finger_overlap_3d for every pair.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    single = points.ndim == 2
+    if single:
+        points = points[None]
+
+    i, j = FINGER_PAIRS[:, 0], FINGER_PAIRS[:, 1]
+    tips = points[:, FINGER_TIP]                                  # (N, 5, 3)
+    depth = (tips[:, :, 2] + points[:, FINGER_JOINT, 2]) / 2      # (N, 5)
+    d = tips[:, i] - tips[:, j]                                   # (N, 10, 3)
+
+    xy_dist = np.sqrt(d[..., 0]**2 + d[..., 1]**2)
+    xz_dist = np.sqrt(d[..., 0]**2 + d[..., 2]**2)
+    yz_dist = np.sqrt(d[..., 1]**2 + d[..., 2]**2)
+    is_overlap = (xy_dist < xy_thresh) & ((xz_dist < xz_thresh) | (yz_dist < yz_thresh))
+    top = np.where(depth[:, i] < depth[:, j], i, j)
+
+    pair_state = np.where(is_overlap, top, -1).astype(np.int8)    # (N, 10)
+    matrix = np.full((len(points), 5, 5), -1, dtype=np.int8)
+    matrix[:, i, j] = pair_state
+    matrix[:, j, i] = pair_state
+    return matrix[0] if single else matrix
+
+def pack_overlap_matrix(matrix):
+    """
+    Pack (N, 5, 5) overlap matrices into (N,) uint32 codes.
+
+    Bit k (0-9) is set when FINGER_PAIRS[k] overlaps and bit 10 + k when the
+    first finger of that pair is on top.
+    """
+    matrix = np.asarray(matrix)
+    pair_state = matrix[..., FINGER_PAIRS[:, 0], FINGER_PAIRS[:, 1]].astype(np.int64)
+    overlap_bits = pair_state >= 0
+    first_on_top = pair_state == FINGER_PAIRS[:, 0]
+    weights = np.uint32(1) << np.arange(len(FINGER_PAIRS), dtype=np.uint32)
+    return ((overlap_bits * weights).sum(axis=-1) + ((first_on_top * weights).sum(axis=-1) << 10)).astype(np.uint32)
+
+def unpack_overlap_matrix(codes):
+    """Inverse of pack_overlap_matrix."""
+    codes = np.asarray(codes, dtype=np.uint32)
+    bits = np.arange(len(FINGER_PAIRS), dtype=np.uint32)
+    overlap_bits = (codes[..., None] >> bits) & 1
+    first_on_top = (codes[..., None] >> (bits + 10)) & 1
+    i, j = FINGER_PAIRS[:, 0], FINGER_PAIRS[:, 1]
+    pair_state = np.where(overlap_bits == 1, np.where(first_on_top == 1, i, j), -1).astype(np.int8)
+    matrix = np.full(codes.shape + (5, 5), -1, dtype=np.int8)
+    matrix[..., i, j] = pair_state
+    matrix[..., j, i] = pair_state
+    return matrix
+
+def describe_overlaps(matrix):
+    """List (finger1, finger2, top_finger) name tuples for the overlapping pairs of one hand."""
+    return [
+        (FINGER_NAMES[i], FINGER_NAMES[j], FINGER_NAMES[matrix[i, j]])
+        for i, j in FINGER_PAIRS if matrix[i, j] >= 0
+    ]
@@ -0,0 +1,403 @@
+# pipeline.py
+"""
+Threaded capture -> inference -> render pipeline for the live loops.
+
+A capture thread reads frames from the source and an inference worker runs the
+supplied `process` function on them; the two are connected to each other and to
+the render stage (the caller's thread, where cv2.imshow / Tk must run) by small
+bounded queues that drop the oldest frame when full, so a slow inference frame
+never stalls capture or the UI.
+
+Sources can be a camera index, a video file or a directory of images, so the
+same loop can be benchmarked headless on machines without a camera:
+
+    python pipeline.py path/to/video.mp4
+
+They can also be a raw frame feed on stdin ("-") or on a local TCP port
+("tcp:5555"), standing in for network cameras: every frame is a FEED_HEADER
+(height, width, channels as little-endian uint32) followed by the BGR bytes,
+as written by send_frame.
+"""
+import collections
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from instrumentation import metrics as default_metrics
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class ImageFolderSource:
+    """Frame source over the images of a directory, in file name order."""
+    def __init__(self, path):
+        self.paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.position = 0
+
+    def isOpened(self):
+        return self.position < len(self.paths)
+
+    def read(self, image=None):
+        # cv2.imread cannot decode into an existing array, so `image` is ignored.
+        import cv2
+        while self.position < len(self.paths):
+            frame = cv2.imread(self.paths[self.position])
+            self.position += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.position = len(self.paths)
+
+FEED_HEADER = struct.Struct("<III")
+
+def send_frame(stream, frame):
+    """Write one BGR frame to a feed stream (a binary file or socket.makefile("wb"))."""
+    stream.write(FEED_HEADER.pack(*frame.shape[:2], frame.shape[2] if frame.ndim == 3 else 1))
+    stream.write(memoryview(frame).cast("B"))
+    stream.flush()
+
+class FrameFeedSource:
+    """
+    Frame source over a raw frame feed (see FEED_HEADER). `open_stream` returns
+    the binary stream; it is called on the first read, so waiting for a socket
+    connection happens on the capture thread.
+    """
+    def __init__(self, open_stream):
+        self.open_stream = open_stream
+        self.stream = None
+        self.closed = False
+
+    def isOpened(self):
+        return not self.closed
+
+    def _read_exactly(self, view):
+        filled = 0
+        while filled < len(view):
+            n = self.stream.readinto(view[filled:])
+            if not n:
+                return False
+            filled += n
+        return True
+
+    def read(self, image=None):
+        import numpy as np
+        if self.closed:
+            return False, None
+        if self.stream is None:
+            self.stream = self.open_stream()
+        header = bytearray(FEED_HEADER.size)
+        if not self._read_exactly(memoryview(header)):
+            self.release()
+            return False, None
+        shape = FEED_HEADER.unpack(header)
+        if image is None or image.shape != shape or image.dtype != np.uint8:
+            image = np.empty(shape, np.uint8)
+        if not self._read_exactly(memoryview(image).cast("B")):
+            self.release()
+            return False, None
+        return True, image
+
+    def release(self):
+        self.closed = True
+        if self.stream is not None and self.stream is not sys.stdin.buffer:
+            self.stream.close()
+
+def _accept_feed(port):
+    """Listen on localhost:port and return the first connection as a binary stream."""
+    with socket.create_server(("127.0.0.1", port)) as server:
+        connection, _ = server.accept()
+    return connection.makefile("rb")
+
+def open_source(source):
+    """
+    Open a frame source with a cv2.VideoCapture-like read()/release() interface.
+
+    Returns (capture, live): live is True for cameras, where a failed read is
+    skipped, and False for files, folders and feeds, where it ends the stream.
+    """
+    if source == "-":
+        return FrameFeedSource(lambda: sys.stdin.buffer), False
+    if isinstance(source, str) and source.startswith("tcp:"):
+        port = int(source[len("tcp:"):])
+        return FrameFeedSource(lambda: _accept_feed(port)), False
+    import cv2
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return cv2.VideoCapture(int(source)), True
+    if os.path.isdir(source):
+        return ImageFolderSource(source), False
+    return cv2.VideoCapture(source), False
+
+class DropOldestQueue:
+    """
+    Bounded queue that discards its oldest item instead of blocking producers;
+    on_drop(item) is called with every discarded item (e.g. to reuse its buffer).
+    """
+    def __init__(self, maxsize=2, drop=True, on_drop=None):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.drop = drop
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def put(self, item, stop_event=None):
+        """Add item; returns True if the oldest item was dropped to make room."""
+        dropped = None
+        with self.condition:
+            if self.drop:
+                if len(self.items) >= self.maxsize:
+                    dropped = self.items.popleft()
+                    self.dropped += 1
+            else:
+                # Lossless mode (offline processing): wait for room instead of dropping.
+                while len(self.items) >= self.maxsize and not (stop_event and stop_event.is_set()):
+                    self.condition.wait(0.1)
+            self.items.append(item)
+            self.condition.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return dropped is not None
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrived within timeout."""
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def __len__(self):
+        return len(self.items)
+
+class StageStats:
+    """Running timing statistics for one pipeline stage."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {
+            "frames": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "max_ms": 1000 * self.max,
+        }
+
+class Pipeline:
+    """
+    Run capture and inference on background threads.
+
+    `process(frame)` is called on the inference worker and its return value is
+    handed to the render stage together with the frame:
+
+        pipeline = Pipeline(0, process).start()
+        while True:
+            ok, frame, result = pipeline.read()
+            if not ok:
+                if pipeline.finished:
+                    break
+                continue
+            with pipeline.timed("render"):
+                ...draw and show...
+        pipeline.stop()
+
+    With drop=False frames are never discarded, which is what offline
+    processing of video files wants; live loops keep the default.
+
+    With a FrameBufferPool as `buffers`, captured frames are decoded into
+    reused arrays, every frame read counts towards the pool's per-frame
+    allocation metrics and report() includes them. A frame and result
+    returned by read() stay valid until the next read(); then, or when a
+    queue drops them, the frame goes back to the pool and the result to
+    `release` (e.g. to give back buffers that `process` put in it).
+
+    Stage times, the inference worker's idle time ("inference_wait"), drops
+    and failed reads also go to `metrics` (instrumentation.metrics by
+    default) whenever that registry is enabled.
+    """
+    def __init__(self, source, process, queue_size=2, drop=True, buffers=None, metrics=None, release=None):
+        self.capture, self.live = open_source(source)
+        self.process = process
+        self.buffers = buffers
+        self.release = release
+        self.metrics = metrics or default_metrics
+        self._frame_shape = None
+        # The (frame, result) last returned by read(), released by the next read().
+        self._rendering = None
+        self.frames = DropOldestQueue(queue_size, drop, on_drop=self._recycle_frame)
+        self.results = DropOldestQueue(queue_size, drop, on_drop=self._recycle)
+        self.stats = {"capture": StageStats(), "inference": StageStats(), "render": StageStats()}
+        self._stop = threading.Event()
+        self._capture_done = threading.Event()
+        self._inference_done = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _capture_loop(self):
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                ok, frame = self._read_frame()
+                if not ok:
+                    self.metrics.count("capture.misses")
+                    if self.live:
+                        continue
+                    break
+                seconds = time.perf_counter() - start
+                self.stats["capture"].add(seconds)
+                self.metrics.observe("capture", seconds)
+                self.metrics.count("frames.captured")
+                if self.frames.put(frame, self._stop):
+                    self.metrics.count("dropped.capture")
+        finally:
+            self._capture_done.set()
+
+    def _read_frame(self):
+        if self.buffers is None or self._frame_shape is None:
+            ok, frame = self.capture.read()
+        else:
+            buffer = self.buffers.acquire("capture", self._frame_shape)
+            ok, frame = self.capture.read(buffer)
+            if not ok:
+                self.buffers.release("capture", buffer)
+        if ok:
+            self._frame_shape = frame.shape
+        return ok, frame
+
+    def _recycle_frame(self, frame):
+        if self.buffers is not None:
+            self.buffers.release("capture", frame)
+
+    def _recycle(self, item):
+        """Give back a (frame, result) that was dropped or has been rendered."""
+        frame, result = item
+        self._recycle_frame(frame)
+        if self.release is not None:
+            self.release(result)
+
+    def _inference_loop(self):
+        try:
+            while not self._stop.is_set():
+                waiting = time.perf_counter()
+                frame = self.frames.get(timeout=0.1)
+                start = time.perf_counter()
+                # Idle time here, against busy time below, separates I/O-bound from inference-bound loops.
+                self.metrics.observe("inference_wait", start - waiting)
+                if frame is None:
+                    if self._capture_done.is_set() and not len(self.frames):
+                        break
+                    continue
+                result = self.process(frame)
+                seconds = time.perf_counter() - start
+                self.stats["inference"].add(seconds)
+                self.metrics.observe("inference", seconds)
+                if self.results.put((frame, result), self._stop):
+                    self.metrics.count("dropped.inference")
+        finally:
+            self._inference_done.set()
+
+    @property
+    def finished(self):
+        """True once the source is exhausted and every result has been read."""
+        return self._stop.is_set() or (self._inference_done.is_set() and not len(self.results))
+
+    def read(self, timeout=0.1):
+        """
+        Return (ok, frame, result) for the next processed frame. The previously
+        returned frame and result are released and must no longer be used.
+        """
+        if self._rendering is not None:
+            self._recycle(self._rendering)
+            self._rendering = None
+        item = self.results.get(timeout)
+        if item is None:
+            return False, None, None
+        self._rendering = item
+        if self.buffers is not None:
+            self.buffers.count_frame()
+        self.metrics.count("frames.rendered")
+        return (True,) + item
+
+    @contextmanager
+    def timed(self, stage):
+        """Time a block of work (e.g. drawing and display) as the given stage."""
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        self.stats.setdefault(stage, StageStats()).add(seconds)
+        self.metrics.observe(stage, seconds)
+
+    def report(self):
+        """Per-stage timings plus the number of frames dropped by each queue."""
+        report = {stage: stats.summary() for stage, stats in self.stats.items()}
+        report["dropped"] = {"capture": self.frames.dropped, "inference": self.results.dropped}
+        if self.buffers is not None:
+            report["buffers"] = self.buffers.report()
+        return report
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self.capture.release()
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import cv2
+    import mediapipe as mp
+    from frame_buffers import FrameBufferPool
+
+    parser = argparse.ArgumentParser(description="Run the hand landmark pipeline headless and report stage timings.")
+    parser.add_argument("source", help="Camera index, video file or image directory")
+    parser.add_argument("--max-hands", type=int, default=1)
+    parser.add_argument("--lossless", action="store_true", help="Process every frame instead of dropping the oldest")
+    args = parser.parse_args()
+
+    hands = mp.solutions.hands.Hands(static_image_mode=False, max_num_hands=args.max_hands, min_detection_confidence=0.5)
+    buffers = FrameBufferPool()
+
+    def process(frame):
+        frame_rgb = buffers.cvt_color(frame, cv2.COLOR_BGR2RGB)
+        results = hands.process(frame_rgb)
+        buffers.release("rgb", frame_rgb)
+        return results
+
+    pipeline = Pipeline(args.source, process, drop=not args.lossless, buffers=buffers).start()
+    start = time.perf_counter()
+    detections = 0
+    while not pipeline.finished:
+        ok, frame, results = pipeline.read()
+        if ok:
+            with pipeline.timed("render"):
+                detections += bool(results.multi_hand_landmarks)
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+    hands.close()
+
+    report = pipeline.report()
+    report["detections"] = detections
+    report["fps"] = report["render"]["frames"] / elapsed if elapsed else 0.0
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,360 @@
+# results_server.py
+"""
+Local asyncio service that streams per-hand results to other processes.
+
+ResultServer runs its own event loop on a background thread and listens on a
+Unix socket ("unix:/tmp/overlap.sock"), a localhost TCP port ("tcp:7000") or,
+when the optional `websockets` package is installed, a localhost WebSocket
+("ws:7001"). Producers on any thread call publish() with the result dicts of
+serve.hand_results. publish() only hands the records to the loop and never
+waits on a client, so the capture and inference loops cannot be slowed by a
+consumer.
+
+Wire format. Every message is MESSAGE_HEADER (uint32 payload length, uint8
+type) followed by the payload. On sockets that is the byte stream; on a
+WebSocket each binary message holds exactly one. Message types:
+
+    SUBSCRIBE   client -> server  uint16 queue size (0: DEFAULT_QUEUE_SIZE)
+    RESULTS     server -> client  RESULTS_HEADER (uint32 dropped since the
+                                  previous RESULTS, uint16 count) + count RECORDs
+    CLASSIFY    client -> server  CLASSIFY_HEADER (uint32 request id, uint32 n)
+                                  + n * 63 float32 landmarks
+    CLASSIFIED  server -> client  CLASSIFY_HEADER + n int8 gesture codes
+                                  + n uint32 packed overlap matrices
+
+A RECORD is 266 bytes: stream id, frame, hand, flags (bit 0 right hand, bit 1
+inferred rather than tracked, bit 2 handedness known; without it bit 0 is
+meaningless and the handedness decodes as None), gesture code (index into
+gestures.GESTURE_NAMES, -1 for none), the packed overlap matrix
+(overlap.pack_overlap_matrix) and the 21 landmarks as float32.
+
+Each subscriber has a bounded queue. When it is full the oldest message is
+dropped, and the client learns how many it lost from the next RESULTS header.
+CLASSIFY lets offline clients send landmark batches of any size. The server
+answers them with one vectorized gestures.classify_batch /
+overlap.finger_overlap_matrix pass, off the event loop, so MediaPipe never
+has to run in the client.
+
+    server = ResultServer("unix:/tmp/overlap.sock").start()
+    server.publish(results)                     # from any thread
+    ...
+    async with ResultClient("unix:/tmp/overlap.sock") as client:
+        async for record in client.subscribe():
+            ...
+"""
+import asyncio
+import collections
+import concurrent.futures
+import struct
+import threading
+import numpy as np
+
+MESSAGE_HEADER = struct.Struct("<IB")
+RESULTS_HEADER = struct.Struct("<IH")
+CLASSIFY_HEADER = struct.Struct("<II")
+RECORD = struct.Struct("<HIBBbxI63f")
+
+SUBSCRIBE, RESULTS, CLASSIFY, CLASSIFIED = 1, 2, 3, 4
+
+DEFAULT_QUEUE_SIZE = 256
+# Largest message a client may send (a CLASSIFY batch of ~400k hands).
+MAX_MESSAGE = 1 << 27
+# Seconds stop() waits for the clients to be disconnected and for the server thread.
+STOP_TIMEOUT = 5
+
+FLAG_RIGHT = 1
+FLAG_INFERRED = 2
+FLAG_HANDED = 4
+
+def encode_message(kind, payload=b""):
+    return MESSAGE_HEADER.pack(len(payload), kind) + payload
+
+def encode_record(result):
+    """Pack one serve.hand_results dict into a RECORD."""
+    from gestures import GESTURE_NAMES
+    handedness = result["handedness"]
+    flags = (FLAG_HANDED if handedness is not None else 0) | (FLAG_RIGHT if handedness == "Right" else 0)
+    flags |= FLAG_INFERRED if result["inferred"] else 0
+    gesture = GESTURE_NAMES.index(result["gesture"]) if result["gesture"] else -1
+    return RECORD.pack(result["stream_id"], result["frame"], result["hand"], flags, gesture,
+                       result["overlap_code"], *np.ravel(result["landmarks"]))
+
+def decode_record(data, offset=0):
+    """Inverse of encode_record; landmarks come back as a (21, 3) float32 array."""
+    from gestures import GESTURE_NAMES
+    stream_id, frame, hand, flags, gesture, overlap_code, *landmarks = RECORD.unpack_from(data, offset)
+    return {
+        "stream_id": stream_id,
+        "frame": frame,
+        "hand": hand,
+        "handedness": ("Right" if flags & FLAG_RIGHT else "Left") if flags & FLAG_HANDED else None,
+        "inferred": bool(flags & FLAG_INFERRED),
+        "gesture": GESTURE_NAMES[gesture] if gesture >= 0 else None,
+        "overlap_code": overlap_code,
+        "landmarks": np.array(landmarks, dtype=np.float32).reshape(21, 3),
+    }
+
+def encode_results(records, dropped=0):
+    return encode_message(RESULTS, RESULTS_HEADER.pack(dropped, len(records)) + b"".join(records))
+
+def decode_results(payload):
+    """(dropped, [record dicts]) from a RESULTS payload."""
+    dropped, count = RESULTS_HEADER.unpack_from(payload)
+    offset = RESULTS_HEADER.size
+    return dropped, [decode_record(payload, offset + i * RECORD.size) for i in range(count)]
+
+def classify_payload(payload):
+    """Answer a CLASSIFY payload with a CLASSIFIED message."""
+    from gestures import classify_batch
+    from overlap import finger_overlap_matrix, pack_overlap_matrix
+    request_id, n = CLASSIFY_HEADER.unpack_from(payload)
+    points = np.frombuffer(payload, np.float32, n * 63, CLASSIFY_HEADER.size).reshape(n, 21, 3)
+    gestures = classify_batch(points)
+    overlaps = pack_overlap_matrix(finger_overlap_matrix(points.astype(np.float64))) if n else np.zeros(0, np.uint32)
+    body = CLASSIFY_HEADER.pack(request_id, n) + gestures.astype(np.int8).tobytes() + overlaps.astype("<u4").tobytes()
+    return encode_message(CLASSIFIED, body)
+
+def parse_address(address):
+    """("unix", path), ("tcp", port) or ("ws", port)."""
+    kind, _, rest = address.partition(":")
+    if kind == "unix":
+        return kind, rest
+    if kind in ("tcp", "ws"):
+        return kind, int(rest)
+    raise ValueError(f"Unknown address {address!r}; use unix:PATH, tcp:PORT or ws:PORT")
+
+class _Subscriber:
+    """Bounded, drop-oldest outbox of one client. Only touched on the event loop."""
+    def __init__(self, size):
+        self.messages = collections.deque(maxlen=size)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def put(self, records):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += len(self.messages[0])
+        self.messages.append(records)
+        self.ready.set()
+
+    async def next_message(self):
+        await self.ready.wait()
+        records = self.messages.popleft()
+        if not self.messages:
+            self.ready.clear()
+        dropped, self.dropped = self.dropped, 0
+        return encode_results(records, dropped)
+
+class ResultServer:
+    """
+    Serve published results to subscribers and CLASSIFY requests on `address`.
+    start() returns once the server is listening.
+    """
+    def __init__(self, address, queue_size=DEFAULT_QUEUE_SIZE):
+        self.kind, self.target = parse_address(address)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.published = 0
+        # Live client handler tasks and stream writers, closed by stop().
+        self._handlers = set()
+        self._writers = set()
+        self.loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="results-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._listen())
+        except Exception as e:
+            # E.g. the address is in use, or ws: without the websockets package.
+            self._error = e
+            self._ready.set()
+            loop.close()
+            return
+        self.loop = loop
+        self._ready.set()
+        loop.run_forever()
+
+    async def _listen(self):
+        if self.kind == "unix":
+            self._server = await asyncio.start_unix_server(self._handle_stream, self.target)
+        elif self.kind == "tcp":
+            self._server = await asyncio.start_server(self._handle_stream, "127.0.0.1", self.target)
+        else:
+            import websockets
+            self._server = await websockets.serve(self._handle_websocket, "127.0.0.1", self.target)
+
+    def publish(self, results):
+        """Queue one frame's result dicts for every subscriber; never blocks. Thread safe."""
+        loop = self.loop
+        if not results or loop is None:
+            return
+        records = [encode_record(result) for result in results]
+        self.published += 1
+        loop.call_soon_threadsafe(self._fan_out, records)
+
+    def _fan_out(self, records):
+        for subscriber in self.subscribers:
+            subscriber.put(records)
+
+    async def _respond(self, kind, payload, send, subscribe):
+        if kind == SUBSCRIBE:
+            size = struct.unpack_from("<H", payload)[0] if len(payload) >= 2 else 0
+            subscribe(_Subscriber(size or self.queue_size))
+        elif kind == CLASSIFY:
+            # Large batches are classified on a worker thread so publishing keeps flowing.
+            await send(await self.loop.run_in_executor(None, classify_payload, payload))
+
+    async def _pump(self, subscriber, send):
+        while True:
+            await send(await subscriber.next_message())
+
+    async def _serve_client(self, receive, send):
+        """Shared client loop: receive() yields (kind, payload) or None at the end."""
+        pump = None
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        def subscribe(subscriber):
+            nonlocal pump
+            if pump is None:
+                self.subscribers.add(subscriber)
+                pump = asyncio.ensure_future(self._pump(subscriber, send))
+                pump.subscriber = subscriber
+        try:
+            while True:
+                message = await receive()
+                if message is None:
+                    break
+                await self._respond(*message, send, subscribe)
+        finally:
+            self._handlers.discard(handler)
+            if pump is not None:
+                self.subscribers.discard(pump.subscriber)
+                pump.cancel()
+                await asyncio.gather(pump, return_exceptions=True)
+
+    async def _handle_stream(self, reader, writer):
+        async def receive():
+            try:
+                length, kind = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+                if length > MAX_MESSAGE:
+                    return None
+                return kind, await reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return None
+        async def send(message):
+            writer.write(message)
+            # A slow reader stalls only its own pump; its queue drops the oldest meanwhile.
+            await writer.drain()
+        self._writers.add(writer)
+        try:
+            await self._serve_client(receive, send)
+        except asyncio.CancelledError:
+            # Cancelled by stop(); asyncio < 3.12 logs a cancelled connection task as an error.
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle_websocket(self, websocket, path=None):
+        async def receive():
+            try:
+                message = await websocket.recv()
+            except Exception:
+                return None
+            length, kind = MESSAGE_HEADER.unpack_from(message)
+            return kind, message[MESSAGE_HEADER.size:MESSAGE_HEADER.size + length]
+        await self._serve_client(receive, websocket.send)
+
+    def stop(self):
+        """
+        Disconnect every client and stop the server thread. wait_closed() waits
+        for live connections (Python >= 3.12.1), so those are closed and their
+        handlers cancelled first; the loop is stopped even if that times out.
+        """
+        async def close():
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            handlers = list(self._handlers)
+            for handler in handlers:
+                handler.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+        loop, self.loop = self.loop, None
+        if loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(close(), loop).result(timeout=STOP_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                pass
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=STOP_TIMEOUT)
+
+class ResultClient:
+    """asyncio client for unix: and tcp: addresses."""
+    def __init__(self, address):
+        self.kind, self.target = parse_address(address)
+        self.reader = self.writer = None
+        self.next_request = 0
+
+    async def __aenter__(self):
+        if self.kind == "unix":
+            self.reader, self.writer = await asyncio.open_unix_connection(self.target)
+        elif self.kind == "tcp":
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.target)
+        else:
+            raise ValueError("ResultClient speaks unix: and tcp:; use a WebSocket client for ws:")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.writer.close()
+
+    async def _receive(self):
+        length, kind = MESSAGE_HEADER.unpack(await self.reader.readexactly(MESSAGE_HEADER.size))
+        return kind, await self.reader.readexactly(length)
+
+    async def subscribe(self, queue_size=0):
+        """Yield result dicts as they are published; `dropped` on each batch is not lost silently."""
+        self.writer.write(encode_message(SUBSCRIBE, struct.pack("<H", queue_size)))
+        await self.writer.drain()
+        while True:
+            kind, payload = await self._receive()
+            if kind == RESULTS:
+                dropped, records = decode_results(payload)
+                for record in records:
+                    record["dropped_before"] = dropped
+                    dropped = 0
+                    yield record
+
+    async def classify(self, points):
+        """
+        Gesture codes (int8) and packed overlap matrices (uint32) for an (N, 21, 3)
+        batch. Use a connection of its own, not one that also subscribes.
+        """
+        points = np.ascontiguousarray(points, dtype="<f4").reshape(-1, 21, 3)
+        request_id = self.next_request
+        self.next_request += 1
+        self.writer.write(encode_message(CLASSIFY, CLASSIFY_HEADER.pack(request_id, len(points)) + points.tobytes()))
+        await self.writer.drain()
+        while True:
+            kind, payload = await self._receive()
+            if kind != CLASSIFIED:
+                continue
+            answered, n = CLASSIFY_HEADER.unpack_from(payload)
+            if answered != request_id:
+                continue
+            offset = CLASSIFY_HEADER.size
+            gestures = np.frombuffer(payload, np.int8, n, offset)
+            overlaps = np.frombuffer(payload, "<u4", n, offset + n)
+            return gestures, overlaps
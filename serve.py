@@ -0,0 +1,363 @@
+# serve.py
+"""
+Serving mode: one process, many video streams, a fixed pool of Hands graphs.
+
+Every source (camera index, video file, image directory, "-" for a frame feed
+on stdin or "tcp:PORT" for one on a local socket, see pipeline.open_source)
+gets a capture thread that keeps only its latest frame. A fixed number of
+inference workers, each owning one MediaPipe Hands graph, take frames from a
+Scheduler that serves the streams round-robin, at most one frame of a stream
+in flight at a time, so a fast camera cannot starve a slow one and no stream
+needs a graph of its own.
+
+Each stream keeps its own TrackedHands (landmark filters and inference stride)
+and runs it on whichever worker's graph is free. The shared graphs therefore
+run with static_image_mode=True, as MediaPipe's own tracking cannot follow
+interleaved streams.
+
+Every hand in every frame yields one result dict, tagged with the stream and
+hand index, with its gesture (gestures.py) and finger overlaps (overlap.py).
+Each stream tracks its capture-to-result latency against an SLO. With --ipc
+the results are also streamed to other processes by a results_server:
+
+    python serve.py 0 1 videos/kiosk3.mp4 tcp:5555 --workers 4 --slo-ms 100 --output results.jsonl
+    python serve.py 0 1 --ipc unix:/tmp/overlap.sock --output /dev/null
+"""
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+from frame_buffers import FrameBufferPool
+from gestures import classify_one
+from instrumentation import Histogram, metrics, session
+from overlap import describe_overlaps, finger_overlap_matrix, pack_overlap_matrix
+from pipeline import ImageFolderSource, open_source
+from tracking import TrackedHands
+
+DEFAULT_SLO_MS = 100.0
+# Playback rate for video files and image directories, which stand in for cameras.
+DEFAULT_SOURCE_FPS = 30.0
+# A live source that fails to deliver is retried with exponential backoff from
+# CAPTURE_RETRY_DELAY up to CAPTURE_RETRY_MAX_DELAY seconds, and given up on
+# after MAX_CAPTURE_MISSES consecutive failed reads (e.g. an unplugged camera).
+CAPTURE_RETRY_DELAY = 0.01
+CAPTURE_RETRY_MAX_DELAY = 1.0
+MAX_CAPTURE_MISSES = 50
+
+class Stream:
+    """One source: its capture thread, latest-frame slot, tracker and SLO statistics."""
+    def __init__(self, name, source, scheduler, tracker, slo_ms=DEFAULT_SLO_MS, paced=True, index=0):
+        self.name = name
+        self.index = index
+        self.capture, self.live = open_source(source)
+        self.scheduler = scheduler
+        self.tracker = tracker
+        self.slo = slo_ms / 1000
+        # Live cameras deliver at their own rate; files are played back at theirs.
+        fps = self._source_fps() if paced and not self.live else 0.0
+        self.interval = 1.0 / fps if fps else 0.0
+        # Frame buffers that are neither in the slot nor on a worker. The
+        # scheduler hands back a buffer when its frame is dropped or processed,
+        # so capture never reads into a frame a worker may still be using.
+        self.free_buffers = []
+        self.allocations = 0
+        self.pending = None             # (frame index, frame, capture time) or None
+        self.busy = False
+        self.finished = False
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.within_slo = 0
+        self.latency = Histogram()
+        self._thread = threading.Thread(target=self._capture_loop, name=f"capture:{name}", daemon=True)
+
+    def _source_fps(self):
+        if isinstance(self.capture, ImageFolderSource):
+            return DEFAULT_SOURCE_FPS
+        get = getattr(self.capture, "get", None)
+        if get is None:
+            return 0.0
+        import cv2
+        return get(cv2.CAP_PROP_FPS) or DEFAULT_SOURCE_FPS
+
+    def start(self):
+        self._thread.start()
+
+    def _buffer(self, shape):
+        """A free frame buffer of the given shape; allocates only when none is free."""
+        with self.scheduler.condition:
+            while self.free_buffers:
+                buffer = self.free_buffers.pop()
+                if buffer.shape == shape:
+                    return buffer
+        self.allocations += 1
+        return np.empty(shape, np.uint8)
+
+    def _capture_loop(self):
+        shape = None
+        misses = 0
+        next_time = time.perf_counter()
+        try:
+            while not self.scheduler.stopped:
+                if shape is None:
+                    ok, frame = self.capture.read()
+                else:
+                    ok, frame = self.capture.read(self._buffer(shape))
+                if not ok:
+                    metrics.count(f"{self.name}.capture.misses")
+                    misses += 1
+                    if self.live and misses < MAX_CAPTURE_MISSES:
+                        time.sleep(min(CAPTURE_RETRY_MAX_DELAY, CAPTURE_RETRY_DELAY * 2 ** (misses - 1)))
+                        continue
+                    break
+                misses = 0
+                shape = frame.shape
+                self.scheduler.submit(self, frame, time.perf_counter())
+                if self.interval:
+                    next_time = max(next_time + self.interval, time.perf_counter())
+                    time.sleep(max(0.0, next_time - time.perf_counter()))
+        finally:
+            self.capture.release()
+            self.scheduler.finish(self)
+
+    def record(self, seconds):
+        """Account one processed frame with the given capture-to-result latency."""
+        self.processed += 1
+        self.latency.observe(seconds)
+        self.within_slo += seconds <= self.slo
+        metrics.observe(f"{self.name}.latency", seconds)
+
+    def report(self):
+        report = self.latency.summary()
+        report.update({
+            "captured": self.captured,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "buffer_allocations": self.allocations,
+            "slo_ms": 1000 * self.slo,
+            "slo_attainment": self.within_slo / self.processed if self.processed else 0.0,
+            "inference_ratio": self.tracker.inference_ratio,
+        })
+        report["slo_met"] = report["p95_ms"] <= report["slo_ms"]
+        return report
+
+class Scheduler:
+    """
+    Hands out the latest frame of each stream to workers, round-robin over the
+    streams and never two frames of one stream at once (its tracker is
+    sequential). A frame that is replaced before a worker takes it is dropped
+    and its buffer returned to the stream, like a processed frame's on release.
+    """
+    def __init__(self):
+        self.streams = []
+        self.condition = threading.Condition()
+        self.cursor = 0
+        self.stopped = False
+
+    def add(self, stream):
+        self.streams.append(stream)
+
+    def submit(self, stream, frame, captured_at):
+        with self.condition:
+            stream.captured += 1
+            if stream.pending is not None:
+                stream.dropped += 1
+                metrics.count(f"{stream.name}.dropped")
+                stream.free_buffers.append(stream.pending[1])
+            stream.pending = (stream.captured - 1, frame, captured_at)
+            self.condition.notify()
+
+    def finish(self, stream):
+        with self.condition:
+            stream.finished = True
+            self.condition.notify_all()
+
+    def _done(self):
+        return all(s.finished and s.pending is None and not s.busy for s in self.streams)
+
+    def next(self):
+        """Block until a frame is ready: returns (stream, index, frame, captured_at), or None when all streams ended."""
+        with self.condition:
+            while not self.stopped:
+                for offset in range(len(self.streams)):
+                    stream = self.streams[(self.cursor + offset) % len(self.streams)]
+                    if stream.pending is not None and not stream.busy:
+                        self.cursor = (self.cursor + offset + 1) % len(self.streams)
+                        stream.busy = True
+                        index, frame, captured_at = stream.pending
+                        stream.pending = None
+                        return stream, index, frame, captured_at
+                if self._done():
+                    return None
+                self.condition.wait(0.1)
+            return None
+
+    def release(self, stream, frame=None):
+        """Mark the stream's frame as processed and take its buffer back."""
+        with self.condition:
+            stream.busy = False
+            if frame is not None:
+                stream.free_buffers.append(frame)
+            self.condition.notify_all()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+def hand_results(stream, index, results):
+    """One result dict per detected hand, tagged by stream and hand."""
+    tagged = []
+    for hand, points in enumerate(results.points):
+        handedness = None
+        if results.multi_handedness and hand < len(results.multi_handedness):
+            handedness = results.multi_handedness[hand].classification[0].label
+        matrix = finger_overlap_matrix(points)
+        tagged.append({
+            "stream": stream.name,
+            "stream_id": stream.index,
+            "frame": index,
+            "hand": hand,
+            "handedness": handedness,
+            "inferred": results.inferred,
+            "gesture": classify_one(points),
+            "overlaps": [{"fingers": [f1, f2], "top": top} for f1, f2, top in describe_overlaps(matrix)],
+            "overlap_code": int(pack_overlap_matrix(matrix)),
+            "landmarks": points.tolist(),
+        })
+    return tagged
+
+class Server:
+    """
+    Serve `sources` with `workers` shared Hands graphs. on_result is called
+    with every hand result dict and on_frame with the list of them for each
+    frame (e.g. ResultServer.publish), from the worker threads.
+    """
+    def __init__(self, sources, workers=None, max_num_hands=2, slo_ms=DEFAULT_SLO_MS,
+                 stride=2, paced=True, on_result=None, on_frame=None):
+        self.scheduler = Scheduler()
+        self.max_num_hands = max_num_hands
+        self.on_result = on_result or (lambda result: None)
+        self.on_frame = on_frame or (lambda results: None)
+        self.streams = []
+        for i, source in enumerate(sources):
+            # The tracker's own graph is never used: every inference runs on a worker's graph.
+            tracker = TrackedHands(None, stride=stride)
+            stream = Stream(f"stream{i}", source, self.scheduler, tracker, slo_ms, paced, i)
+            self.scheduler.add(stream)
+            self.streams.append(stream)
+        self.workers = workers or min(len(self.streams), os.cpu_count() or 1)
+        self._threads = [threading.Thread(target=self._worker, name=f"inference{i}", daemon=True)
+                         for i in range(self.workers)]
+        self.started = None
+
+    def _make_hands(self):
+        import mediapipe as mp
+        return mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=self.max_num_hands,
+                                        min_detection_confidence=0.5)
+
+    def _worker(self):
+        import cv2
+        hands = self._make_hands()
+        buffers = FrameBufferPool()
+        try:
+            while True:
+                job = self.scheduler.next()
+                if job is None:
+                    break
+                stream, index, frame, captured_at = job
+                try:
+                    with metrics.timer("cvt_color"):
+                        frame_rgb = buffers.cvt_color(frame, cv2.COLOR_BGR2RGB)
+                    with metrics.timer("hands"):
+                        results = stream.tracker.process(frame_rgb, hands)
+                    buffers.release("rgb", frame_rgb)
+                    metrics.count("detections" if results.points else "misses")
+                    with metrics.timer("classify"):
+                        tagged = hand_results(stream, index, results)
+                    stream.record(time.perf_counter() - captured_at)
+                finally:
+                    self.scheduler.release(stream, frame)
+                for result in tagged:
+                    self.on_result(result)
+                self.on_frame(tagged)
+        finally:
+            hands.close()
+
+    def start(self):
+        self.started = time.perf_counter()
+        for thread in self._threads:
+            thread.start()
+        for stream in self.streams:
+            stream.start()
+        return self
+
+    def wait(self):
+        """Block until every stream has ended and its last frame is processed."""
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+
+    def stop(self):
+        self.scheduler.stop()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        streams = {stream.name: stream.report() for stream in self.streams}
+        for stream, report in zip(self.streams, streams.values()):
+            report["fps"] = stream.processed / elapsed if elapsed else 0.0
+        return {
+            "workers": self.workers,
+            "elapsed_seconds": elapsed,
+            "streams": streams,
+            "slo_met": all(report["slo_met"] for report in streams.values()),
+        }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve hand overlap and gesture results for several video streams.")
+    parser.add_argument("sources", nargs="+", help="Camera indices, video files, image directories, - (stdin feed) or tcp:PORT")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Hands graphs / inference threads (default: one per stream, up to the core count)")
+    parser.add_argument("--max-hands", type=int, default=2)
+    parser.add_argument("--stride", type=int, default=2, help="Run full inference every STRIDE frames of a stream")
+    parser.add_argument("--slo-ms", type=float, default=DEFAULT_SLO_MS, help="Per-stream p95 latency objective")
+    parser.add_argument("--unpaced", action="store_true", help="Read video files as fast as possible instead of at their frame rate")
+    parser.add_argument("--output", default=None, help="Append results as JSON Lines to this file (default: stdout)")
+    parser.add_argument("--ipc", default=None, help="Also stream results on unix:PATH, tcp:PORT or ws:PORT (see results_server.py)")
+    parser.add_argument("--metrics", default=None,
+                        help="Export stage metrics to this file (.prom for Prometheus text, else JSON Lines)")
+    parser.add_argument("--profile", default=None, help="Write sampling profiler stacks to this file")
+    args = parser.parse_args()
+
+    out = open(args.output, "a") if args.output else sys.stdout
+    out_lock = threading.Lock()
+    def write_result(result):
+        with out_lock:
+            out.write(json.dumps(result) + "\n")
+
+    results_server = None
+    if args.ipc:
+        from results_server import ResultServer
+        results_server = ResultServer(args.ipc).start()
+
+    with session(args.metrics, args.profile):
+        server = Server(args.sources, args.workers, args.max_hands, args.slo_ms, args.stride,
+                        paced=not args.unpaced, on_result=write_result,
+                        on_frame=results_server.publish if results_server else None).start()
+        try:
+            server.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            if results_server:
+                results_server.stop()
+            out.flush()
+            if args.output:
+                out.close()
+    print(json.dumps(server.report(), indent=2), file=sys.stderr)
@@ -0,0 +1,199 @@
+# session_writer.py
+"""
+Append-only JSON Lines storage for data collection sessions.
+
+Each sample is written as one compact JSON object terminated by a newline and
+flushed immediately, with an fsync every `fsync_every` samples. A record only
+counts once its newline is on disk, so a crash can at most leave one partial
+trailing line, which recover_session() trims before a session is resumed. A
+complete line that was later damaged is skipped by the readers on its own.
+"""
+import json
+import os
+import time
+
+SESSION_SUFFIX = ".jsonl"
+
+class SessionWriter:
+    """
+    Streaming writer for one session file.
+
+    Usage:
+        with SessionWriter(path) as writer:
+            writer.write(sample)
+    """
+    def __init__(self, path, fsync_every=10):
+        self.path = path
+        self.fsync_every = fsync_every
+        # Drop any partial record left by a crash so new records start on a clean line.
+        self.count = recover_session(path) if os.path.exists(path) else 0
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+
+    def write(self, sample):
+        """Append one sample and flush it to the OS."""
+        self._file.write(json.dumps(sample, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.count += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Force written samples to stable storage."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def _iter_lines(f):
+    """
+    Yield (start_offset, end_offset, sample) for each complete line, with
+    sample None for a line that is not valid JSON. Stops at a trailing line
+    without its newline: the partial record a crash can leave.
+    """
+    offset = 0
+    for line in f:
+        if not line.endswith(b"\n"):
+            break
+        try:
+            sample = json.loads(line)
+        except ValueError:
+            sample = None
+        yield offset, offset + len(line), sample
+        offset += len(line)
+
+def _iter_records(f):
+    """
+    Yield (start_offset, end_offset, sample) for each good record. A complete
+    line that does not parse was damaged on disk after it was written (the
+    writer only ever appends whole lines), so it is skipped on its own and the
+    records after it are kept.
+    """
+    for start, end, sample in _iter_lines(f):
+        if sample is not None:
+            yield start, end, sample
+
+def read_session(path):
+    """Yield the good samples of a session file, up to its last complete line."""
+    with open(path, "rb") as f:
+        for _, _, sample in _iter_records(f):
+            yield sample
+
+def recover_session(path):
+    """
+    Truncate a partial trailing record left by a crash.
+    Returns the number of good records, i.e. where a resumed session continues.
+    """
+    count = 0
+    complete = 0
+    with open(path, "rb") as f:
+        for _, complete, sample in _iter_lines(f):
+            count += sample is not None
+    if os.path.getsize(path) != complete:
+        with open(path, "r+b") as f:
+            f.truncate(complete)
+    return count
+
+def tail_session(path, poll_interval=0.5, stop=None):
+    """
+    Follow a session file while it is being recorded, yielding new samples.
+
+    Partial lines are held back until the writer completes them. The
+    generator ends once `stop()` returns True, or runs forever if stop is None.
+    """
+    buffer = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read()
+            if chunk:
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+            elif stop is not None and stop():
+                return
+            else:
+                time.sleep(poll_interval)
+
+def iter_session(path, chunk_size=1 << 16):
+    """
+    Yield the samples of a session one at a time without loading the whole
+    file: JSON Lines records, or the elements of a JSON list (or a single
+    sample) decoded from a buffer of at most a few chunks.
+    """
+    if path.endswith(SESSION_SUFFIX):
+        yield from read_session(path)
+        return
+    for _, _, sample in iter_session_records(path, chunk_size):
+        yield sample
+
+def iter_session_records(path, chunk_size=1 << 16, start=0):
+    """
+    Like iter_session, but yield (start, end, sample) with the byte range of
+    every record in the file, so it can be read back alone with read_record.
+    JSON Lines sessions can be read from a record boundary `start` onwards.
+    """
+    if path.endswith(SESSION_SUFFIX):
+        with open(path, "rb") as f:
+            f.seek(start)
+            for record_start, record_end, sample in _iter_records(f):
+                yield start + record_start, start + record_end, sample
+        return
+    decoder = json.JSONDecoder()
+    # newline="" keeps line endings as they are, so decoded text maps back to byte offsets.
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        # offset is the byte offset of buffer[pos] in the file.
+        buffer, pos, offset, eof = "", 0, 0, False
+        while True:
+            # Skip whitespace and the list punctuation between samples (all single-byte).
+            skipped = pos
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+                pos += 1
+            offset += pos - skipped
+            if pos < len(buffer):
+                try:
+                    sample, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                else:
+                    size = len(buffer[pos:end].encode("utf-8"))
+                    yield offset, offset + size, sample
+                    pos, offset = end, offset + size
+                    continue
+            elif eof:
+                return
+            # The next sample is incomplete: keep the unread tail and read another chunk.
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+def read_record(f, start, end):
+    """Read back one record from a session file opened in binary mode."""
+    f.seek(start)
+    return json.loads(f.read(end - start))
+
+def load_session(path):
+    """
+    Load all samples of a session as a list, from either a JSON Lines session
+    or a JSON file holding a list of samples (or a single sample).
+    """
+    if path.endswith(SESSION_SUFFIX):
+        return list(read_session(path))
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    return data
@@ -1,58 +1,84 @@
+import sys
 import cv2
 import mediapipe as mp
+from frame_buffers import FrameBufferPool
+from instrumentation import metrics, session
+from pipeline import Pipeline
+from tracking import TrackedHands
+from overlap import finger_overlap_matrix, describe_overlaps
 
 # 初始化MediaPipe Hands模块
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 mp_hands = mp.solutions.hands
 
-# 打开摄像头
-cap = cv2.VideoCapture(0)
+# 视频源：默认摄像头0，也可传入视频文件或图片目录（无摄像头时可离线测试）
+source = sys.argv[1] if len(sys.argv) > 1 else 0
 
-with mp_hands.Hands(
+# 设置 OVERLAP_METRICS / OVERLAP_PROFILE 环境变量可导出各阶段指标和采样分析结果
+with session(), mp_hands.Hands(
     model_complexity=0,
     min_detection_confidence=0.5,
     min_tracking_confidence=0.5,
     max_num_hands=2
-) as hands:
+) as raw_hands:
     
-    while cap.isOpened():
-        success, image = cap.read()
+    # 每2帧运行一次完整推理，中间帧用滤波器跟踪关键点
+    hands = TrackedHands(raw_hands, stride=2)
+    
+    # 复用预分配的帧缓冲区，避免每帧分配新数组
+    buffers = FrameBufferPool()
+    
+    def process(image):
+        # 推理线程：转换颜色空间 BGR to RGB（写入复用缓冲区）并处理手势检测
+        with metrics.timer("cvt_color"):
+            image_rgb = buffers.cvt_color(image, cv2.COLOR_BGR2RGB)
+        image_rgb.flags.writeable = False
+        with metrics.timer("hands"):
+            results = hands.process(image_rgb)
+        buffers.release("rgb", image_rgb)
+        metrics.count("detections" if results.multi_hand_landmarks else "misses")
+        return results
+    
+    # 采集、推理在后台线程运行，显示在主线程
+    pipeline = Pipeline(source, process, buffers=buffers).start()
+    
+    while not pipeline.finished:
+        success, image, results = pipeline.read()
         if not success:
-            print("忽略空摄像头帧")
             continue
         
-        # 转换颜色空间 BGR to RGB
-        image.flags.writeable = False
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # 处理手势检测
-        results = hands.process(image)
-        
-        # 绘制检测结果
-        image.flags.writeable = True
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                # 绘制手部关键点和连接线
-                mp_drawing.draw_landmarks(
-                    image,
-                    hand_landmarks,
-                    mp_hands.HAND_CONNECTIONS,
-                    mp_drawing_styles.get_default_hand_landmarks_style(),
-                    mp_drawing_styles.get_default_hand_connections_style()
-                )
-        
-        # 水平翻转图像以获得自拍视图
-        image = cv2.flip(image, 1)
-        
-        # 显示提示信息
-        cv2.putText(image, "按 'P' 打印坐标 | ESC退出", (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        
-        # 显示结果
-        cv2.imshow('MediaPipe Hands', image)
+        with pipeline.timed("render"):
+            # 绘制检测结果（原始BGR帧，无需再转换回来）
+            if results.multi_hand_landmarks:
+                for hand_landmarks in results.multi_hand_landmarks:
+                    # 绘制手部关键点和连接线
+                    mp_drawing.draw_landmarks(
+                        image,
+                        hand_landmarks,
+                        mp_hands.HAND_CONNECTIONS,
+                        mp_drawing_styles.get_default_hand_landmarks_style(),
+                        mp_drawing_styles.get_default_hand_connections_style()
+                    )
+            
+            # 水平翻转图像以获得自拍视图（写入复用缓冲区）
+            image = buffers.flip(image, 1)
+            
+            # 显示提示信息
+            cv2.putText(image, "按 'P' 打印坐标 | ESC退出", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            
+            # 显示每只手所有手指对的重叠情况（上方手指）
+            for hand_idx, points in enumerate(results.points):
+                with metrics.timer("overlap"):
+                    overlaps = describe_overlaps(finger_overlap_matrix(points))
+                text = ", ".join(f"{f1}-{f2}: {top} on top" for f1, f2, top in overlaps) or "No overlap"
+                cv2.putText(image, f"Hand {hand_idx + 1}: {text}", (10, 60 + 30 * hand_idx), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+            
+            # 显示结果
+            cv2.imshow('MediaPipe Hands', image)
+            buffers.release("flip", image)
         
         key = cv2.waitKey(5)
         # 按ESC退出
@@ -69,7 +95,10 @@ with mp_hands.Hands(
                 print("=====================\n")
             else:
                 print("当前帧未检测到手部！")
+    
+    # 释放资源并打印各阶段耗时、丢帧数与每帧内存分配
+    pipeline.stop()
+    print(pipeline.report())
+    print(f"推理帧比例: {hands.inference_ratio:.2f}")
 
-# 释放资源
-cap.release()
 cv2.destroyAllWindows()
\ No newline at end of file
@@ -0,0 +1,187 @@
+# tracking.py
+"""
+Temporal landmark tracking and smoothing for the live loops.
+
+TrackedHands wraps a MediaPipe Hands instance (created with
+static_image_mode=False so MediaPipe itself only re-runs palm detection when
+its tracking confidence drops) and additionally skips inference on frames in
+between, carrying every landmark forward with a One-Euro filter. It is a
+drop-in replacement for Hands.process, so classifiers and drawing code still
+get a landmark set on every frame:
+
+    hands = TrackedHands(mp_hands.Hands(static_image_mode=False), stride=2)
+    results = hands.process(image_rgb)
+"""
+import math
+import time
+import numpy as np
+
+_landmark_pb2 = None
+
+# A hand whose wrist moved further than this (normalized image units) since
+# the last inference is treated as a new hand and gets a fresh filter.
+MAX_MATCH_DISTANCE = 0.2
+
+class OneEuroFilter:
+    """
+    One-Euro low-pass filter over an array of values (e.g. a (21, 3) hand).
+
+    min_cutoff controls jitter at low speed, beta how quickly the filter
+    follows fast motion. See Casiez et al., "1 Euro Filter", CHI 2012.
+    """
+    def __init__(self, min_cutoff=1.0, beta=0.007, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        """Filter a new measurement x taken at time t (seconds)."""
+        x = np.asarray(x, dtype=np.float64)
+        if self.x_prev is None:
+            self.x_prev, self.dx_prev, self.t_prev = x, np.zeros_like(x), t
+            return x
+        dt = max(t - self.t_prev, 1e-6)
+
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = a_d * (x - self.x_prev) / dt + (1 - a_d) * self.dx_prev
+
+        a = self._alpha(self.min_cutoff + self.beta * np.abs(dx_hat), dt)
+        x_hat = a * x + (1 - a) * self.x_prev
+
+        self.x_prev, self.dx_prev, self.t_prev = x_hat, dx_hat, t
+        return x_hat
+
+    def predict(self, t):
+        """Extrapolate the filtered value to time t at the current filtered velocity."""
+        return self.x_prev + self.dx_prev * (t - self.t_prev)
+
+def _to_landmark_list(points):
+    """Build a MediaPipe NormalizedLandmarkList from a (21, 3) array so drawing utils accept it."""
+    global _landmark_pb2
+    if _landmark_pb2 is None:
+        from mediapipe.framework.formats import landmark_pb2
+        _landmark_pb2 = landmark_pb2
+    return _landmark_pb2.NormalizedLandmarkList(landmark=[
+        _landmark_pb2.NormalizedLandmark(x=x, y=y, z=z) for x, y, z in points.tolist()
+    ])
+
+class TrackedResults:
+    """Result object shaped like Hands.process output, plus tracking details."""
+    def __init__(self, multi_hand_landmarks, multi_handedness, points, inferred):
+        self.multi_hand_landmarks = multi_hand_landmarks
+        self.multi_handedness = multi_handedness
+        self.points = points        # list of (21, 3) arrays, one per hand
+        self.inferred = inferred    # False when landmarks were carried forward
+
+class TrackedHands:
+    """
+    Run hand inference every `stride` frames and track landmarks in between.
+
+    Inference is forced on the next frame whenever the last inference found
+    no hand. (The handedness score MediaPipe reports measures left/right
+    certainty, not landmark quality, so it does not gate inference; MediaPipe's
+    own min_tracking_confidence covers tracking quality.) Each detected hand
+    keeps its filter across inferences, matched by handedness and nearest
+    wrist, so two hands that swap places in the results are not mixed. With
+    smoothing enabled every inferred landmark set also passes through the
+    filter, which reduces frame-to-frame jitter in z-based top/bottom decisions.
+    """
+    def __init__(self, hands, stride=2, smoothing=True, min_cutoff=1.0, beta=0.007, clock=time.perf_counter):
+        self.hands = hands
+        self.stride = max(1, stride)
+        self.smoothing = smoothing
+        self.filter_params = (min_cutoff, beta)
+        self.clock = clock
+        self.filters = []
+        self.labels = []
+        self.handedness = None
+        self.frames_since_inference = 0
+        self.frame_count = 0
+        self.inference_count = 0
+
+    def _needs_inference(self):
+        return not self.filters or self.frames_since_inference + 1 >= self.stride
+
+    def _match_filters(self, points, labels):
+        """Reorder the filters so filters[i] tracks points[i]; unmatched hands get new filters."""
+        unused = list(range(len(self.filters)))
+        matched = []
+        for p, label in zip(points, labels):
+            best, best_distance = None, MAX_MATCH_DISTANCE
+            for i in unused:
+                if label and self.labels[i] and label != self.labels[i]:
+                    continue
+                distance = np.linalg.norm(self.filters[i].x_prev[0, :2] - p[0, :2])
+                if distance <= best_distance:
+                    best, best_distance = i, distance
+            if best is None:
+                matched.append(OneEuroFilter(*self.filter_params))
+            else:
+                unused.remove(best)
+                matched.append(self.filters[best])
+        self.filters = matched
+        self.labels = labels
+
+    def process(self, image_rgb, hands=None):
+        """
+        Landmarks for one frame. `hands` overrides the wrapped graph for this
+        call, so a pool of graphs can serve many tracked streams (serve.py); such
+        shared graphs must run with static_image_mode=True.
+        """
+        t = self.clock()
+        self.frame_count += 1
+
+        if not self._needs_inference():
+            self.frames_since_inference += 1
+            points = [f.predict(t) for f in self.filters]
+            return TrackedResults([_to_landmark_list(p) for p in points], self.handedness, points, False)
+
+        results = (hands or self.hands).process(image_rgb)
+        self.inference_count += 1
+        self.frames_since_inference = 0
+        if not results.multi_hand_landmarks:
+            self.filters = []
+            self.labels = []
+            self.handedness = None
+            return TrackedResults(None, None, [], True)
+
+        detected = results.multi_hand_landmarks
+        self.handedness = results.multi_handedness
+        points = [np.array([[lm.x, lm.y, lm.z] for lm in hand.landmark]) for hand in detected]
+        labels = [None] * len(points)
+        for i, h in enumerate((self.handedness or [])[:len(points)]):
+            labels[i] = h.classification[0].label
+        self._match_filters(points, labels)
+
+        if not self.smoothing:
+            for f, p in zip(self.filters, points):
+                f(p, t)
+            return TrackedResults(detected, self.handedness, points, True)
+
+        points = [f(p, t) for f, p in zip(self.filters, points)]
+        return TrackedResults([_to_landmark_list(p) for p in points], self.handedness, points, True)
+
+    @property
+    def inference_ratio(self):
+        """Fraction of processed frames that ran full inference."""
+        return self.inference_count / self.frame_count if self.frame_count else 0.0
+
+    def close(self):
+        self.hands.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,19 +2,32 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
+from feature_cache import load_cached_features
+from forest_export import export_forest, save_forest
+from instrumentation import metrics, session
 
-# Example: X is an array of feature vectors, y is the corresponding labels.
-# You must create these from your 500 samples.
-X = np.load('features.npy')  # shape (500, num_features)
-y = np.load('labels.npy')    # binary labels: 1 if overlap, 0 otherwise
+# OVERLAP_METRICS / OVERLAP_PROFILE in the environment record how long each step takes.
+with session():
+    # X is an array of feature vectors, y the corresponding labels, built from every
+    # session in overlap_dataset/. Features come from the on-disk feature cache, so
+    # only samples added since the last run are extracted.
+    with metrics.timer("load_features"):
+        X, y = load_cached_features("overlap_dataset")  # y: binary labels, 1 if overlap, 0 otherwise
+    metrics.count("samples", len(y))
 
-# Split into training and testing sets.
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Split into training and testing sets.
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Train a classifier
-clf = RandomForestClassifier(n_estimators=100, random_state=42)
-clf.fit(X_train, y_train)
+    # Train a classifier
+    clf = RandomForestClassifier(n_estimators=100, random_state=42)
+    with metrics.timer("fit"):
+        clf.fit(X_train, y_train)
 
-# Evaluate
-y_pred = clf.predict(X_test)
-print(classification_report(y_test, y_pred))
+    # Evaluate
+    with metrics.timer("predict"):
+        y_pred = clf.predict(X_test)
+    print(classification_report(y_test, y_pred))
+
+    # Export a compact copy of the forest for per-frame classification in the live loops.
+    with metrics.timer("export"):
+        save_forest("overlap_forest.npz", export_forest(clf))
@@ -0,0 +1,165 @@
+# train_search.py
+"""
+Grouped cross-validation and parallel hyperparameter search for the forest.
+
+Folds are grouped by session file, so near-duplicate consecutive frames of one
+session never end up on both sides of a split. With fewer sessions than folds,
+each session is cut into contiguous blocks of frames that are grouped instead.
+
+Every (configuration, fold) pair is fitted in a pool of worker processes. The
+feature matrix and labels are written once to .npy files and memory-mapped
+read-only by every worker, so no worker gets its own copy of the data.
+
+    python train_search.py --target top_finger -j 8
+"""
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from feature_cache import load_cached_dataset
+from feature_extraction import feature_columns
+from instrumentation import metrics, session
+
+# Feature subsets to try, as lists of feature_extraction.FEATURE_GROUPS names.
+FEATURE_SETS = {
+    "all": ["angle", "tip_distances", "ranges"],
+    "distances+ranges": ["tip_distances", "ranges"],
+    "distances": ["tip_distances"],
+}
+
+PARAM_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 5, 10],
+    "max_features": ["sqrt", None],
+    "feature_set": list(FEATURE_SETS),
+}
+
+RANDOM_STATE = 42
+
+# Read-only arrays of the current worker process, mapped by _init_worker.
+_shared = {}
+
+def param_grid(grid=PARAM_GRID):
+    """Expand a dict of lists into a list of parameter dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def make_groups(sessions, n_splits, block_size=None):
+    """
+    Group labels for GroupKFold: the session index, or contiguous frame blocks
+    within sessions when there are fewer sessions than folds.
+    """
+    if len(np.unique(sessions)) >= n_splits:
+        return sessions
+    block_size = block_size or max(1, len(sessions) // (n_splits * 4))
+    order = np.arange(len(sessions))
+    # Consecutive samples of a session stay in the same block.
+    starts = np.r_[0, np.flatnonzero(np.diff(sessions)) + 1]
+    within = order - np.repeat(starts, np.diff(np.r_[starts, len(sessions)]))
+    return sessions.astype(np.int64) * len(sessions) + within // block_size
+
+def _init_worker(x_path, y_path):
+    _shared["X"] = np.load(x_path, mmap_mode="r")
+    _shared["y"] = np.load(y_path, mmap_mode="r")
+
+def _fit_fold(task):
+    """Fit one configuration on one fold; returns (config_index, fold, accuracy, cpu_seconds)."""
+    config_index, params, fold, train_idx, test_idx = task
+    from sklearn.ensemble import RandomForestClassifier
+    # CPU time, so workers competing for fewer cores do not inflate the speedup.
+    start = time.process_time()
+    columns = feature_columns(FEATURE_SETS[params["feature_set"]])
+    X, y = _shared["X"], _shared["y"]
+    clf = RandomForestClassifier(
+        n_estimators=params["n_estimators"],
+        max_depth=params["max_depth"],
+        max_features=params["max_features"],
+        random_state=RANDOM_STATE,
+        n_jobs=1,
+    )
+    clf.fit(X[train_idx][:, columns], y[train_idx])
+    accuracy = float((clf.predict(X[test_idx][:, columns]) == y[test_idx]).mean())
+    return config_index, fold, accuracy, time.process_time() - start
+
+def search(X, y, sessions, grid=PARAM_GRID, n_splits=5, workers=None):
+    """
+    Cross-validate every configuration of grid in parallel.
+    Returns (results sorted by mean accuracy, timing report).
+    """
+    from sklearn.model_selection import GroupKFold
+    workers = workers or os.cpu_count() or 1
+    groups = make_groups(np.asarray(sessions), n_splits)
+    n_splits = min(n_splits, len(np.unique(groups)))
+    folds = list(GroupKFold(n_splits=n_splits).split(X, y, groups))
+    configs = param_grid(grid)
+    tasks = [(c, params, f, train_idx, test_idx)
+             for c, params in enumerate(configs)
+             for f, (train_idx, test_idx) in enumerate(folds)]
+
+    scores = [[] for _ in configs]
+    fit_seconds = [0.0 for _ in configs]
+    with tempfile.TemporaryDirectory() as tmp:
+        x_path, y_path = os.path.join(tmp, "X.npy"), os.path.join(tmp, "y.npy")
+        np.save(x_path, np.ascontiguousarray(X))
+        np.save(y_path, np.ascontiguousarray(y))
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(x_path, y_path)) as pool:
+            for config_index, fold, accuracy, seconds in pool.map(_fit_fold, tasks):
+                scores[config_index].append(accuracy)
+                fit_seconds[config_index] += seconds
+        wall = time.perf_counter() - start
+
+    results = sorted(
+        ({"params": params, "mean_accuracy": float(np.mean(s)), "std_accuracy": float(np.std(s)),
+          "fit_seconds": fit_seconds[c]} for c, (params, s) in enumerate(zip(configs, scores))),
+        key=lambda r: -r["mean_accuracy"])
+    busy = sum(fit_seconds)
+    timing = {
+        "workers": workers,
+        "folds": n_splits,
+        "fits": len(tasks),
+        "wall_seconds": wall,
+        "fit_seconds": busy,
+        # Speedup over running the same fits back to back on one core.
+        "speedup": busy / wall if wall else 0.0,
+        "efficiency_per_core": busy / wall / workers if wall else 0.0,
+    }
+    return results, timing
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Grouped k-fold hyperparameter search for the overlap forest.")
+    parser.add_argument("data_dir", nargs="?", default="overlap_dataset")
+    parser.add_argument("--target", default="overlap", choices=["overlap", "top_finger", "bottom_finger"])
+    parser.add_argument("-k", "--folds", type=int, default=5)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--grid", default=None, help="JSON file overriding PARAM_GRID")
+    parser.add_argument("--top", type=int, default=5, help="Number of configurations to print")
+    parser.add_argument("--metrics", default=None,
+                        help="Export stage metrics to this file (.prom for Prometheus text, else JSON Lines)")
+    parser.add_argument("--profile", default=None, help="Write sampling profiler stacks to this file")
+    args = parser.parse_args()
+
+    grid = PARAM_GRID
+    if args.grid:
+        with open(args.grid, "r") as f:
+            grid = json.load(f)
+
+    with session(args.metrics, args.profile):
+        with metrics.timer("load_features"):
+            dataset = load_cached_dataset(args.data_dir)
+        print(f"{len(dataset['X'])} samples from {len(dataset['sessions'])} sessions, target {args.target}")
+        with metrics.timer("search"):
+            results, timing = search(dataset["X"], dataset[args.target], dataset["session"], grid, args.folds, args.workers)
+        metrics.count("fits", timing["fits"])
+
+    for result in results[:args.top]:
+        print(f"{result['mean_accuracy']:.4f} +/- {result['std_accuracy']:.4f}  {result['params']}")
+    print(f"{timing['fits']} fits ({timing['folds']} folds) in {timing['wall_seconds']:.1f}s wall, "
+          f"{timing['fit_seconds']:.1f}s CPU fitting: speedup x{timing['speedup']:.2f} on {timing['workers']} workers, "
+          f"efficiency {timing['efficiency_per_core']:.0%} per core")